@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 响度标准化和静音裁剪
+功能：构建 silenceremove（静音裁剪）和 EBU R128 两遍 loudnorm（响度标准化）滤镜；
+      第一遍的测量结果按源文件缓存在元数据缓存中，同一源文件以不同格式或码率重新编码时不再重复分析；
+      LoudnessAnalyzer 在后台为即将转换的任务提前完成第一遍分析，与其他任务的编码同时进行
+说明：不依赖Qt
+"""
+
+import json
+import math
+import re
+import subprocess
+import threading
+from collections import deque
+
+# 播客常用的响度目标：综合响度（LUFS）、真峰值（dBTP）、响度范围（LU）
+DEFAULT_TARGET_I = -16.0
+DEFAULT_TARGET_TP = -1.5
+DEFAULT_TARGET_LRA = 11.0
+
+# 静音裁剪：低于该电平（dB）视为静音，超过该时长（秒）的停顿缩短到这个长度
+DEFAULT_SILENCE_THRESHOLD = -50.0
+DEFAULT_SILENCE_DURATION = 1.0
+
+# 后台分析提前处理的任务数
+DEFAULT_ANALYSIS_AHEAD = 4
+
+# loudnorm 第一遍输出中第二遍需要的测量值
+MEASURED_KEYS = ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")
+
+# loudnorm 内部以192kHz处理，输出前重采样回源采样率（未知时用48kHz）
+FALLBACK_SAMPLE_RATE = 48000
+
+
+# 每个 loudnorm 实例结束时输出的JSON块，前面一行是实例名（带滤镜图中的序号）
+_LOUDNORM_BLOCK = re.compile(r"\[Parsed_loudnorm_(\d+) @ [^\]]*\]\s*(\{[^{}]*\})")
+
+
+def _parse_measurement(text):
+    try:
+        data = json.loads(text)
+        measured = {key: float(data[key]) for key in MEASURED_KEYS}
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not all(math.isfinite(value) for value in measured.values()):
+        return None
+    return measured
+
+
+def parse_loudnorm_output(stderr):
+    """从 loudnorm 第一遍的错误输出中取出测量值，按滤镜在命令中的顺序返回列表
+
+    多个音轨一起分析时各实例的输出顺序不固定，按实例序号排序；测量失败或无效（如全是静音）的音轨为None。
+    """
+    blocks = sorted((int(index), block) for index, block in _LOUDNORM_BLOCK.findall(stderr))
+    return [_parse_measurement(block) for _, block in blocks]
+
+
+class AudioProcessing:
+    """转换时对音频做的处理
+
+    loudnorm 为True时按 target_i / target_tp / target_lra 做两遍响度标准化，
+    trim_silence 为True时去掉开头的静音，并把超过 silence_duration 秒的停顿（包括结尾）缩短到该长度。
+    静音裁剪在响度分析之前进行，测量的是裁剪后的音频。开启任何处理时输出都要重新编码，不再直接复制音轨。
+    """
+
+    __slots__ = ("loudnorm", "target_i", "target_tp", "target_lra",
+                 "trim_silence", "silence_threshold", "silence_duration")
+
+    def __init__(self, loudnorm=False, target_i=DEFAULT_TARGET_I, target_tp=DEFAULT_TARGET_TP,
+                 target_lra=DEFAULT_TARGET_LRA, trim_silence=False, silence_threshold=DEFAULT_SILENCE_THRESHOLD,
+                 silence_duration=DEFAULT_SILENCE_DURATION):
+        self.loudnorm = loudnorm
+        self.target_i = target_i
+        self.target_tp = target_tp
+        self.target_lra = target_lra
+        self.trim_silence = trim_silence
+        self.silence_threshold = silence_threshold
+        self.silence_duration = silence_duration
+
+    @property
+    def enabled(self):
+        return self.loudnorm or self.trim_silence
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{name: values[name] for name in cls.__slots__ if name in values})
+
+    def silence_key(self):
+        return f"silence={self.silence_threshold:g}/{self.silence_duration:g}" if self.trim_silence else ""
+
+    def analysis_key(self, track=None):
+        """第一遍测量结果的缓存键：只与静音裁剪、响度目标和音轨有关，与输出格式和码率无关"""
+        key = f"loudnorm={self.target_i:g}/{self.target_tp:g}/{self.target_lra:g}|{self.silence_key()}"
+        return key if track is None else f"{key}|track={track}"
+
+    def cache_key(self):
+        """转换缓存设置键中的处理部分，不做处理时为空"""
+        if not self.enabled:
+            return ""
+        return self.analysis_key() if self.loudnorm else self.silence_key()
+
+    def describe(self):
+        parts = []
+        if self.trim_silence:
+            parts.append(f"静音裁剪（{self.silence_threshold:g} dB，停顿最长 {self.silence_duration:g} 秒）")
+        if self.loudnorm:
+            parts.append(f"响度标准化（{self.target_i:g} LUFS，真峰值 {self.target_tp:g} dBTP）")
+        return "、".join(parts)
+
+    def _silence_filter(self):
+        threshold = f"{self.silence_threshold:g}dB"
+        return (f"silenceremove=start_periods=1:start_threshold={threshold}:"
+                f"stop_periods=-1:stop_duration={self.silence_duration:g}:stop_threshold={threshold}")
+
+    def _loudnorm_targets(self):
+        return f"loudnorm=I={self.target_i:g}:TP={self.target_tp:g}:LRA={self.target_lra:g}"
+
+    def analysis_command(self, ffmpeg_path, input_path, tracks=None):
+        """第一遍：只解码和测量，不写输出
+
+        tracks 为空时测量第一个音频流（与不指定音轨的转换选择同一个流）；
+        为音频流序号列表时在同一次读取中分别测量这些音轨。
+        """
+        filters = [self._loudnorm_targets() + ":print_format=json"]
+        if self.trim_silence:
+            filters.insert(0, self._silence_filter())
+        chain = ",".join(filters)
+        cmd = [ffmpeg_path, "-hide_banner", "-nostdin", "-nostats", "-i", input_path]
+        if not tracks:
+            return cmd + ["-vn", "-map", "0:a:0", "-af", chain, "-f", "null", "-"]
+        cmd += ["-filter_complex", ";".join(f"[0:a:{track}]{chain}[m{i}]" for i, track in enumerate(tracks))]
+        for i in range(len(tracks)):
+            cmd += ["-map", f"[m{i}]", "-f", "null", "-"]
+        return cmd
+
+    def filter_chain(self, measured=None, sample_rate=0):
+        """第二遍（实际编码）使用的滤镜；没有测量值时退回单遍的动态响度标准化"""
+        filters = []
+        if self.trim_silence:
+            filters.append(self._silence_filter())
+        if self.loudnorm:
+            loudnorm = self._loudnorm_targets()
+            if measured:
+                loudnorm += (f":measured_I={measured['input_i']:.2f}:measured_TP={measured['input_tp']:.2f}"
+                             f":measured_LRA={measured['input_lra']:.2f}"
+                             f":measured_thresh={measured['input_thresh']:.2f}"
+                             f":offset={measured['target_offset']:.2f}:linear=true")
+            filters += [loudnorm, f"aresample={sample_rate or FALLBACK_SAMPLE_RATE}"]
+        return ",".join(filters)
+
+
+class _Analysis:
+    """一个文件的后台分析"""
+
+    __slots__ = ("done", "measured")
+
+    def __init__(self):
+        self.done = False
+        self.measured = None
+
+
+class LoudnessAnalyzer:
+    """后台响度分析
+
+    prefetch(路径列表) 指定接下来要转换的文件，workers 个线程对其中前 ahead 个提前运行第一遍分析
+    （元数据缓存中已有结果的跳过），分析不占用调度器的槽位，与其他任务的编码同时进行。
+    任务需要测量值时调用 take()：正在分析时等待结果；尚未开始的文件从预读列表中移除并返回None，
+    由任务自己分析。分析结果写入元数据缓存。
+    没有被取走的结果（任务被取消、或不需要重新编码而没有调用 take()）在之后的 prefetch() 中丢弃。
+    """
+
+    def __init__(self, ffmpeg_path, processing, metadata_cache=None, workers=1, ahead=DEFAULT_ANALYSIS_AHEAD):
+        self.ffmpeg_path = ffmpeg_path
+        self.processing = processing
+        self.metadata_cache = metadata_cache
+        self.ahead = ahead
+        self.queue = deque()
+        self.entries = {}  # 源路径 -> _Analysis（分析中或已完成、尚未被任务取走）
+        self.needed = None  # 最近一次 prefetch() 的 needed
+        self.processes = set()
+        self.closed = False
+        self.condition = threading.Condition()
+        self.threads = [threading.Thread(target=self._analysis_loop, name="loudnorm", daemon=True)
+                        for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def prefetch(self, paths, keep=(), needed=None):
+        """设置接下来要转换的文件，替换之前尚未开始分析的预读列表
+
+        已完成的结果只保留仍在 paths 或 keep（已开始转换、可能还会来取的文件）中的，其余丢弃。
+        needed(路径) 为False的文件（如输出已由转换缓存满足）不分析，在分析线程中调用。
+        """
+        paths = list(paths)[:self.ahead]
+        with self.condition:
+            wanted = set(paths).union(keep)
+            for path in [path for path, entry in self.entries.items() if entry.done and path not in wanted]:
+                del self.entries[path]
+            self.queue = deque(path for path in paths if path not in self.entries)
+            self.needed = needed
+            self.condition.notify_all()
+
+    def take(self, path):
+        """取走该文件的后台分析结果：正在分析时等待完成；没有在后台分析时返回None"""
+        with self.condition:
+            try:
+                self.queue.remove(path)
+            except ValueError:
+                pass
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            self.condition.wait_for(lambda: entry.done)
+            self.entries.pop(path, None)
+            return entry.measured
+
+    def close(self):
+        """停止后台分析，结束正在运行的ffmpeg"""
+        with self.condition:
+            self.closed = True
+            self.queue.clear()
+            processes = list(self.processes)
+            self.condition.notify_all()
+        for process in processes:
+            process.kill()
+        for thread in self.threads:
+            thread.join()
+
+    def _analysis_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or self.closed)
+                if self.closed:
+                    return
+                path = self.queue.popleft()
+                if path in self.entries:
+                    continue
+                entry = self.entries[path] = _Analysis()
+                needed = self.needed
+            measured = None
+            try:
+                if needed is None or needed(path):
+                    measured = self._measure(path)
+            finally:
+                with self.condition:
+                    entry.measured = measured
+                    entry.done = True
+                    self.condition.notify_all()
+
+    def _measure(self, path):
+        key = self.processing.analysis_key()
+        if self.metadata_cache is not None:
+            measured = self.metadata_cache.get_analysis(path, key)
+            if measured is not None:
+                return measured
+        try:
+            process = subprocess.Popen(self.processing.analysis_command(self.ffmpeg_path, path),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+        except OSError:
+            return None
+        with self.condition:
+            self.processes.add(process)
+            if self.closed:
+                process.kill()
+        try:
+            _, stderr = process.communicate()
+        finally:
+            with self.condition:
+                self.processes.discard(process)
+        measured = (parse_loudnorm_output(stderr) or [None])[0] if process.returncode == 0 else None
+        if measured is not None and self.metadata_cache is not None:
+            try:
+                self.metadata_cache.put_analysis(path, key, measured)
+            except Exception:
+                pass
+        return measured
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 波形和音频指纹附属文件
+功能：转换时让同一个ffmpeg进程额外输出一路单声道PCM，经本机TCP连接读入，用NumPy边读边计算
+      波形峰值（audiowaveform JSON格式，网页播放器可直接使用）和紧凑的音频指纹（按频带能量变化的32位子指纹）；
+      批量内的指纹索引在读完文件开头后比较指纹，内容相同的源文件在编码完成前停止，不再重复输出
+说明：需要NumPy（pip install numpy），没有安装时不能启用；不依赖Qt
+"""
+
+import base64
+import json
+import os
+import socket
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 附属文件使用的PCM：单声道、11025Hz、16位
+SAMPLE_RATE = 11025
+
+# 波形：每个峰值对（最小值、最大值）对应的采样数，11025Hz 下约每秒43个
+SAMPLES_PER_PIXEL = 256
+
+# 指纹：每帧4096个采样（约0.37秒），帧移1024个采样；300-2000Hz 按对数分为33个频带，每帧得到32位
+FRAME_SIZE = 4096
+FRAME_HOP = 1024
+BAND_COUNT = 33
+BAND_LOW, BAND_HIGH = 300.0, 2000.0
+
+# 比较文件开头这么多秒的指纹（与 chromaprint 的 fpcalc 默认长度相同），时长较短的文件比较其90%
+MATCH_SECONDS = 120.0
+
+# 两段指纹不同的位数比例不超过该值、时长相差不超过 DURATION_TOLERANCE 秒时视为相同内容
+# （同一内容经两次有损编码、起点错开几十毫秒时约为0.2，不同内容在0.35以上）
+MATCH_THRESHOLD = 0.25
+DURATION_TOLERANCE = 1.5
+
+# 比较时允许的最大帧错位（不同封装的起始位置可能相差几十毫秒）
+MAX_OFFSET = 3
+
+# 至少要有这么多帧才比较
+MIN_FRAMES = 10
+
+# 开头的子指纹中非零（非静音）的至少要占这个比例才参与判断重复
+MIN_SIGNAL = 0.5
+
+WAVEFORM_SUFFIX = ".waveform.json"
+FINGERPRINT_SUFFIX = ".fingerprint.json"
+
+FINGERPRINT_ALGORITHM = f"band-energy-{BAND_COUNT}x{FRAME_SIZE}/{FRAME_HOP}"
+
+
+def available():
+    """是否安装了NumPy"""
+    return np is not None
+
+
+def sidecar_paths(output_path):
+    """输出文件对应的 (波形文件, 指纹文件) 路径：与输出同名，扩展名替换为附属文件后缀"""
+    stem = os.path.splitext(output_path)[0]
+    return stem + WAVEFORM_SUFFIX, stem + FINGERPRINT_SUFFIX
+
+
+def _band_edges():
+    # 频带边界对应的FFT频点，各频带至少一个频点
+    frequencies = np.geomspace(BAND_LOW, BAND_HIGH, BAND_COUNT + 1)
+    edges = np.round(frequencies * FRAME_SIZE / SAMPLE_RATE).astype(int)
+    for i in range(1, len(edges)):
+        edges[i] = max(edges[i], edges[i - 1] + 1)
+    return edges
+
+
+def encode_fingerprint(fingerprint):
+    return base64.b64encode(fingerprint.astype("<u4").tobytes()).decode("ascii")
+
+
+def decode_fingerprint(text):
+    return np.frombuffer(base64.b64decode(text), dtype="<u4").astype(np.uint32)
+
+
+def compare(first, second, max_offset=MAX_OFFSET):
+    """两段指纹在最佳对齐位置上不同的位数比例（0为完全相同），可比较的帧数不够时返回1.0"""
+    best = 1.0
+    for offset in range(-max_offset, max_offset + 1):
+        a = first[max(0, offset):]
+        b = second[max(0, -offset):]
+        count = min(len(a), len(b))
+        if count < MIN_FRAMES:
+            continue
+        differing = np.unpackbits(np.bitwise_xor(a[:count], b[:count]).view(np.uint8)).sum()
+        best = min(best, differing / (32 * count))
+    return best
+
+
+class PcmReducer:
+    """把16位单声道PCM数据块逐步归约为波形峰值和音频指纹
+
+    feed() 可以接收任意长度的数据块，finish() 处理剩余不满一个峰值块的采样；内存占用与文件长度无关
+    （只保留峰值和子指纹，每秒约86字节和43字节）。
+    """
+
+    def __init__(self, samples_per_pixel=SAMPLES_PER_PIXEL):
+        self.samples_per_pixel = samples_per_pixel
+        self.samples = 0
+        self.pending = b""  # 上一块末尾不满一个采样的字节
+        self.peak_buffer = np.empty(0, np.int16)
+        self.peaks = []
+        self.frame_buffer = np.empty(0, np.float32)
+        self.previous = None  # 上一帧相邻频带的能量差
+        self.subprints = []
+        self.frames = 0  # 已计算的子指纹数
+        self.window = np.hanning(FRAME_SIZE).astype(np.float32)
+        self.edges = _band_edges()
+        self._fingerprint = None
+
+    @property
+    def seconds(self):
+        return self.samples / SAMPLE_RATE
+
+    def feed(self, data):
+        data = self.pending + data
+        cut = len(data) - len(data) % 2
+        self.pending = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype="<i2")
+        if not len(samples):
+            return
+        self.samples += len(samples)
+        self._reduce_peaks(samples)
+        self._reduce_frames(samples)
+        self._fingerprint = None
+
+    def finish(self):
+        if len(self.peak_buffer):
+            self.peaks.append(np.array([self.peak_buffer.min() >> 8, self.peak_buffer.max() >> 8], np.int8))
+            self.peak_buffer = np.empty(0, np.int16)
+
+    def _reduce_peaks(self, samples):
+        buffer = np.concatenate((self.peak_buffer, samples))
+        count = len(buffer) // self.samples_per_pixel * self.samples_per_pixel
+        if count:
+            blocks = buffer[:count].reshape(-1, self.samples_per_pixel)
+            pairs = np.empty((len(blocks), 2), np.int8)
+            # 16位采样缩到8位（audiowaveform 的 bits=8）
+            pairs[:, 0] = blocks.min(axis=1) >> 8
+            pairs[:, 1] = blocks.max(axis=1) >> 8
+            self.peaks.append(pairs.ravel())
+        self.peak_buffer = buffer[count:]
+
+    def _reduce_frames(self, samples):
+        buffer = np.concatenate((self.frame_buffer, samples.astype(np.float32)))
+        if len(buffer) < FRAME_SIZE:
+            self.frame_buffer = buffer
+            return
+        count = (len(buffer) - FRAME_SIZE) // FRAME_HOP + 1
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, FRAME_SIZE)[::FRAME_HOP][:count]
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        energy = np.add.reduceat(spectrum[:, :self.edges[-1]], self.edges[:-1], axis=1)
+        differences = energy[:, :-1] - energy[:, 1:]
+        if self.previous is not None:
+            differences = np.vstack((self.previous, differences))
+        if len(differences) > 1:
+            # 第 m 位：相邻频带的能量差比上一帧增大
+            bits = (differences[1:] - differences[:-1]) > 0
+            self.subprints.append(np.packbits(bits, axis=1, bitorder="little").view("<u4").ravel())
+            self.frames += len(bits)
+        self.previous = differences[-1]
+        self.frame_buffer = buffer[count * FRAME_HOP:]
+
+    def fingerprint(self):
+        """目前为止的指纹（uint32 数组，每帧一个子指纹）"""
+        if self._fingerprint is None:
+            self._fingerprint = (np.concatenate(self.subprints) if self.subprints else np.empty(0, np.uint32))
+        return self._fingerprint
+
+    def waveform(self):
+        """audiowaveform JSON格式的波形数据"""
+        data = np.concatenate(self.peaks) if self.peaks else np.empty(0, np.int8)
+        return {"version": 2, "channels": 1, "sample_rate": SAMPLE_RATE, "samples_per_pixel": self.samples_per_pixel,
+                "bits": 8, "length": len(data) // 2, "data": data.tolist()}
+
+    def fingerprint_document(self):
+        return {"version": 1, "algorithm": FINGERPRINT_ALGORITHM, "sample_rate": SAMPLE_RATE,
+                "duration": round(self.seconds, 3), "fingerprint": encode_fingerprint(self.fingerprint())}
+
+
+def write_sidecars(reducer, output_path, waveform=True, fingerprint=True):
+    """写出附属文件（先写临时文件再改名），返回写出的路径列表"""
+    written = []
+    waveform_path, fingerprint_path = sidecar_paths(output_path)
+    for enabled, path, document in ((waveform, waveform_path, reducer.waveform),
+                                    (fingerprint, fingerprint_path, reducer.fingerprint_document)):
+        if not enabled:
+            continue
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(document(), f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        written.append(path)
+    return written
+
+
+def read_fingerprint(output_path):
+    """读取输出文件旁已有的指纹文件，返回 (指纹, 时长)；没有或格式不符时返回None"""
+    try:
+        with open(sidecar_paths(output_path)[1], encoding="utf-8") as f:
+            document = json.load(f)
+        if document.get("algorithm") != FINGERPRINT_ALGORITHM:
+            return None
+        return decode_fingerprint(document["fingerprint"]), float(document.get("duration", 0.0))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def match_frames(duration):
+    """比较重复内容时使用的开头帧数；时长未知时为 MATCH_SECONDS 对应的帧数"""
+    seconds = min(MATCH_SECONDS, duration * 0.9) if duration > 0 else MATCH_SECONDS
+    return max(MIN_FRAMES, int(seconds * SAMPLE_RATE) // FRAME_HOP)
+
+
+class FingerprintIndex:
+    """批量内的指纹索引（只在内存中），按时长分桶，只与时长相近的文件比较指纹。可在多个线程中使用"""
+
+    def __init__(self, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = {}  # 四舍五入的时长（秒） -> [(源文件路径, 开头的指纹, 时长)]
+        self.lock = threading.Lock()
+
+    def check(self, path, fingerprint, duration):
+        """与已登记的文件比较：有内容相同的文件时返回其路径，否则登记该文件并返回None
+
+        比较和登记在同一把锁内完成，同时转换的两个相同文件只有后一个会被认为是重复的。
+        """
+        fingerprint = fingerprint[:match_frames(duration)]
+        if np.count_nonzero(fingerprint) < len(fingerprint) * MIN_SIGNAL:
+            # 开头几乎全是静音（子指纹为0），不能据此判断内容相同
+            return None
+        bucket = int(round(duration))
+        with self.lock:
+            for key in (bucket - 1, bucket, bucket + 1):
+                for other, prints, other_duration in self.buckets.get(key, ()):
+                    if (other != path and abs(other_duration - duration) <= DURATION_TOLERANCE and
+                            compare(fingerprint, prints) <= self.threshold):
+                        return other
+            entries = self.buckets.setdefault(bucket, [])
+            entries[:] = [entry for entry in entries if entry[0] != path]
+            entries.append((path, fingerprint, duration))
+        return None
+
+    def discard(self, path):
+        """移除某个源文件（转换失败时，之后相同内容的文件不再被跳过）"""
+        with self.lock:
+            for entries in self.buckets.values():
+                entries[:] = [entry for entry in entries if entry[0] != path]
+
+
+class AudioSidecars:
+    """附属文件设置和批量内共用的指纹索引
+
+    waveform / fingerprint 控制写出哪些附属文件；skip_duplicates 为True时，读完开头后指纹与本批量中
+    已转换（或正在转换）的文件相同的源文件停止转换，不写输出。附属文件写在第一个输出旁边，按音轨输出时不生成。
+    """
+
+    __slots__ = ("waveform", "fingerprint", "skip_duplicates", "samples_per_pixel", "index")
+
+    def __init__(self, waveform=True, fingerprint=True, skip_duplicates=False, samples_per_pixel=SAMPLES_PER_PIXEL):
+        self.waveform = waveform
+        self.fingerprint = fingerprint
+        self.skip_duplicates = skip_duplicates
+        self.samples_per_pixel = samples_per_pixel
+        self.index = FingerprintIndex()
+
+    @property
+    def writes_files(self):
+        return self.waveform or self.fingerprint
+
+    def describe(self):
+        parts = [name for enabled, name in ((self.waveform, "波形"), (self.fingerprint, "指纹")) if enabled]
+        text = "、".join(parts) + "附属文件" if parts else ""
+        if self.skip_duplicates:
+            text += ("，" if text else "") + "跳过内容重复的文件"
+        return text
+
+
+class PcmTap:
+    """接收ffmpeg额外输出的PCM流
+
+    在本机回环地址上监听一个临时端口，output_args() 为ffmpeg命令增加一路输出到该端口，后台线程边读边交给
+    PcmReducer；每读到一块数据调用一次 on_data(reducer)。ffmpeg的标准输出已用于进度，另开TCP连接在各系统上都可用。
+    """
+
+    def __init__(self, reducer, on_data=None):
+        self.reducer = reducer
+        self.on_data = on_data or (lambda reducer: None)
+        self.error = None
+        self.connected = False
+        self.closed = threading.Event()
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.listener.settimeout(0.5)
+        self.thread = threading.Thread(target=self._read, name="pcm-tap", daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"tcp://127.0.0.1:{self.listener.getsockname()[1]}"
+
+    def output_args(self, filters=""):
+        """附加到ffmpeg命令末尾的输出参数；filters 为与音频输出相同的处理滤镜，波形与输出的时间轴一致"""
+        args = ["-vn", "-map", "0:a:0"]  # 与不指定音轨的音频输出使用同一个流
+        if filters:
+            args += ["-af", filters]
+        return args + ["-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_s16le", "-f", "s16le", self.url]
+
+    def _read(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+                break
+            except socket.timeout:
+                if self.closed.is_set():
+                    return
+            except OSError:
+                return
+        self.connected = True
+        with connection:
+            while True:
+                try:
+                    data = connection.recv(1 << 16)
+                except OSError as e:
+                    self.error = e
+                    return
+                if not data:
+                    break
+                if self.error is not None:
+                    # 归约出错后继续读空数据，不让ffmpeg因写不出而阻塞
+                    continue
+                try:
+                    self.reducer.feed(data)
+                    self.on_data(self.reducer)
+                except Exception as e:
+                    self.error = e
+        if self.error is None:
+            self.reducer.finish()
+
+    def close(self):
+        """ffmpeg退出后调用：等待读完剩余数据并关闭监听"""
+        self.closed.set()
+        self.thread.join()
+        self.listener.close()
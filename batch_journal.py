@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 批量任务日志
+功能：以追加写入的JSONL记录批量转换中每个文件的状态（排队、运行、完成、失败、取消），
+      程序意外退出后可以从日志恢复，只继续未完成的文件
+说明：每次状态变化都会fsync；读取时忽略崩溃时写了一半的最后一行；不依赖Qt
+"""
+
+import json
+import os
+import threading
+import time
+
+from converter_core import user_cache_dir
+
+# 日志中的任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def default_journal_path():
+    """默认的批量任务日志路径（只保留最近一次批量转换）"""
+    return os.path.join(user_cache_dir(), "batch_journal.jsonl")
+
+
+class BatchJournal:
+    """批量任务日志写入器
+
+    start() 清空旧日志并写入本次批量的设置；之后每个事件追加一行并同步到磁盘。
+    排队事件按块写入、每块只同步一次，避免大批量时产生大量fsync。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        self.lock = threading.Lock()
+        self.file = None
+
+    def start(self, settings, done_paths=(), cancelled_paths=()):
+        """开始新的批量：清空旧日志并记录设置
+
+        done_paths、cancelled_paths 为恢复时沿用的已完成和已取消的文件，写回新日志，再次中断后仍会跳过它们。
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.path, "w", encoding="utf-8")
+        self._write([{"event": "batch", "settings": settings}] +
+                    [{"event": DONE, "path": path} for path in done_paths] +
+                    [{"event": CANCELLED, "path": path} for path in cancelled_paths])
+
+    def queued(self, paths):
+        """记录一批排队的文件"""
+        self._write([{"event": QUEUED, "path": path} for path in paths])
+
+    def running(self, path):
+        self._write([{"event": RUNNING, "path": path}])
+
+    def done(self, path):
+        self._write([{"event": DONE, "path": path}])
+
+    def failed(self, path, message=""):
+        self._write([{"event": FAILED, "path": path, "message": message}])
+
+    def cancelled(self, path):
+        """用户取消的文件，恢复时不再转换"""
+        self._write([{"event": CANCELLED, "path": path}])
+
+    def scan_finished(self):
+        """目录扫描已结束：恢复时无需重新扫描，日志中的文件就是完整列表"""
+        self._write([{"event": "scanned"}])
+
+    def finish(self):
+        """批量正常结束，之后不再提示恢复"""
+        self._write([{"event": "finished"}])
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _write(self, records):
+        if not records:
+            return
+        now = round(time.time(), 3)
+        data = "".join(json.dumps(dict(record, time=now), ensure_ascii=False) + "\n" for record in records)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+
+class JournalState:
+    """从日志恢复的批量状态"""
+
+    def __init__(self):
+        self.settings = {}
+        self.states = {}  # 路径 -> 最后状态，保持排队顺序
+        self.messages = {}  # 路径 -> 失败原因
+        self.scan_complete = False
+        self.finished = False
+
+    def paths_in(self, *states):
+        """处于指定状态的文件路径（按排队顺序）"""
+        return [path for path, state in self.states.items() if state in states]
+
+    def pending_paths(self):
+        """尚未完成的文件：排队中，以及退出时正在转换的文件"""
+        return self.paths_in(QUEUED, RUNNING)
+
+    def resumable(self):
+        """是否有可以继续的未完成批量"""
+        return not self.finished and (bool(self.pending_paths()) or not self.scan_complete)
+
+
+def load_journal(path=None):
+    """读取批量任务日志，不存在或没有批量记录时返回None"""
+    path = path or default_journal_path()
+    try:
+        f = open(path, encoding="utf-8")
+    except OSError:
+        return None
+
+    state = None
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 崩溃时写了一半的行
+                continue
+            event = record.get("event")
+            if event == "batch":
+                state = JournalState()
+                state.settings = record.get("settings", {})
+            elif state is None:
+                continue
+            elif event in (QUEUED, RUNNING, DONE, FAILED, CANCELLED):
+                state.states[record["path"]] = event
+                if event == FAILED:
+                    state.messages[record["path"]] = record.get("message", "")
+            elif event == "scanned":
+                state.scan_complete = True
+            elif event == "finished":
+                state.finished = True
+    return state
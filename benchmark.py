@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 性能基准测试
+功能：用ffmpeg的lavfi信号源生成测试视频，测量单文件延迟、不同并发数下的批量吞吐、
+      复制音轨与重新编码、多格式一次解码与分别转换、大目录扫描耗时；
+      结果保存为JSON，可与上一次结果对比并按阈值判定性能回退
+用法：python benchmark.py --output 结果.json [--compare 基准.json --threshold 0.1] [--quick]
+说明：完全离线运行，不依赖PyQt5；测试视频缓存在工作目录中，重复运行不会重新生成
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from converter_core import (BatchRunner, ConversionJob, MediaConverter, ffmpeg_version,
+                            find_ffmpeg, iter_video_files)
+
+# 测试视频的音频编码：编码名 -> (ffmpeg编码器, 容器扩展名)
+FIXTURE_CODECS = {
+    "aac": ("aac", ".mp4"),
+    "mp3": ("libmp3lame", ".mp4"),
+    "opus": ("libopus", ".mkv"),
+    "flac": ("flac", ".mkv"),
+}
+
+# 结果文件格式版本，格式变化后旧结果不再参与对比
+RESULTS_VERSION = 1
+
+
+class Fixtures:
+    """测试视频生成器，文件已存在时直接复用"""
+
+    def __init__(self, ffmpeg_path, work_dir):
+        self.ffmpeg_path = ffmpeg_path
+        self.directory = os.path.join(work_dir, "fixtures")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def video(self, duration, codec="aac", silent=False, index=0):
+        """生成 (或复用) 一个测试视频：testsrc画面 + 正弦波或静音音轨"""
+        encoder, extension = FIXTURE_CODECS[codec]
+        name = f"{codec}_{duration}s{'_silent' if silent else ''}_{index}{extension}"
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            return path
+
+        audio_source = "anullsrc=r=44100:cl=stereo" if silent else f"sine=frequency={440 + index}:sample_rate=44100"
+        cmd = [self.ffmpeg_path, "-v", "error", "-y",
+               "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25",
+               "-f", "lavfi", "-i", audio_source,
+               "-t", str(duration), "-c:v", "mpeg4", "-c:a", encoder]
+        if codec not in ("flac",):
+            cmd += ["-b:a", "128k"]
+        tmp_path = os.path.join(self.directory, ".part" + extension)
+        result = subprocess.run(cmd + [tmp_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"生成测试视频失败 ({name}): {result.stderr.strip()}")
+        os.replace(tmp_path, path)
+        return path
+
+    def batch(self, count, duration, codecs=("aac", "mp3", "flac")):
+        """生成一批混合规格的测试视频：编码轮换，时长为 duration 的1~3倍，每4个中有1个静音"""
+        return [self.video(duration * (1 + i % 3), codecs[i % len(codecs)], silent=i % 4 == 3, index=i)
+                for i in range(count)]
+
+    def scan_tree(self, file_count, files_per_dir=100, fanout=10):
+        """生成用于扫描测试的目录树（空文件，扩展名混合视频和其他文件）"""
+        root = os.path.join(os.path.dirname(self.directory), f"scan_tree_{file_count}")
+        marker = os.path.join(root, ".complete")
+        if os.path.exists(marker):
+            return root
+        shutil.rmtree(root, ignore_errors=True)
+        for i in range(0, file_count, files_per_dir):
+            block = i // files_per_dir
+            directory = os.path.join(root, f"d{block % fanout}", f"d{block // fanout % fanout}", f"b{block}")
+            os.makedirs(directory, exist_ok=True)
+            for j in range(i, min(i + files_per_dir, file_count)):
+                extension = ".mp4" if j % 4 else ".txt"
+                open(os.path.join(directory, f"f{j}{extension}"), "wb").close()
+        open(marker, "w").close()
+        return root
+
+
+class Benchmark:
+    """各项基准测试，每项返回包含 seconds（中位数耗时，越小越好）的结果字典"""
+
+    def __init__(self, ffmpeg_path, ffprobe_path, work_dir, repeat=3, quick=False):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.repeat = max(1, repeat)
+        self.quick = quick
+        self.fixtures = Fixtures(ffmpeg_path, work_dir)
+        self.output_dir = os.path.join(work_dir, "output")
+
+    def timed(self, func):
+        """重复执行 func，返回 (耗时中位数, 每次耗时列表)"""
+        runs = []
+        for _ in range(self.repeat):
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            os.makedirs(self.output_dir)
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+        return statistics.median(runs), [round(r, 4) for r in runs]
+
+    def convert(self, path, quality="192k", fast_mode=False, outputs=None):
+        converter = MediaConverter(path, self.output_dir, "mp3", quality, self.ffmpeg_path, self.ffprobe_path,
+                                   fast_mode, outputs=outputs)
+        success, message = converter.run()
+        if not success:
+            raise RuntimeError(f"{os.path.basename(path)}: {message}")
+
+    def single(self):
+        """单文件延迟：一个中等长度的视频重新编码为MP3"""
+        duration = 10 if self.quick else 60
+        path = self.fixtures.video(duration)
+        seconds, runs = self.timed(lambda: self.convert(path))
+        return {"seconds": seconds, "runs": runs, "media_seconds": duration,
+                "speed": round(duration / seconds, 2)}
+
+    def copy_vs_encode(self):
+        """快速模式（直接复制MP3音轨）与重新编码的对比"""
+        duration = 10 if self.quick else 60
+        path = self.fixtures.video(duration, "mp3")
+        results = {}
+        for name, fast_mode in (("copy", True), ("encode", False)):
+            seconds, runs = self.timed(lambda: self.convert(path, "original", fast_mode))
+            results[f"copy_vs_encode.{name}"] = {"seconds": seconds, "runs": runs, "media_seconds": duration,
+                                                 "speed": round(duration / seconds, 2)}
+        return results
+
+    def multi_output(self):
+        """多格式输出：一次解码全部写出，与逐个格式分别转换对比"""
+        duration = 10 if self.quick else 30
+        path = self.fixtures.video(duration)
+        outputs = [("mp3", "128k"), ("mp3", "320k"), ("aac", "original"), ("flac", "original")]
+        if "libopus" in subprocess.run([self.ffmpeg_path, "-hide_banner", "-encoders"],
+                                       capture_output=True, text=True).stdout:
+            outputs.append(("opus", "original"))
+
+        def separately():
+            for fmt, quality in outputs:
+                self.convert(path, outputs=[(fmt, quality)])
+
+        results = {}
+        for name, func in (("single_pass", lambda: self.convert(path, outputs=outputs)),
+                           ("separate", separately)):
+            seconds, runs = self.timed(func)
+            results[f"multi_output.{name}"] = {"seconds": seconds, "runs": runs, "outputs": len(outputs)}
+        return results
+
+    def batch(self, worker_counts):
+        """批量吞吐：同一批短视频在不同并发数下的总耗时"""
+        count, duration = (8, 2) if self.quick else (32, 5)
+        paths = self.fixtures.batch(count, duration)
+        media_seconds = sum(duration * (1 + i % 3) for i in range(count))
+        results = {}
+        for workers in worker_counts:
+            def run():
+                jobs = [ConversionJob(i, path, self.output_dir, "mp3", "192k") for i, path in enumerate(paths)]
+                runner = BatchRunner(workers, ffmpeg_path=self.ffmpeg_path, ffprobe_path=self.ffprobe_path,
+                                     fast_mode=False)
+                succeeded, failed = runner.run(jobs)
+                if failed:
+                    raise RuntimeError(f"批量转换中 {failed} 个文件失败")
+            seconds, runs = self.timed(run)
+            results[f"batch.workers_{workers}"] = {
+                "seconds": seconds, "runs": runs, "files": count,
+                "files_per_second": round(count / seconds, 2),
+                "media_seconds_per_second": round(media_seconds / seconds, 2)}
+        return results
+
+    def scan(self):
+        """大目录扫描耗时"""
+        file_count = 5000 if self.quick else 50000
+        root = self.fixtures.scan_tree(file_count)
+        found = []
+
+        def run():
+            found[:] = [sum(1 for _ in iter_video_files(root))]
+        seconds, runs = self.timed(run)
+        return {"seconds": seconds, "runs": runs, "files": file_count, "videos": found[0],
+                "files_per_second": round(file_count / seconds)}
+
+
+def parse_worker_counts(text):
+    """解析 1,2,4 形式的并发数列表"""
+    try:
+        counts = sorted({int(part) for part in text.split(",") if part.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的并发数列表: {text}")
+    if not counts or counts[0] < 1:
+        raise argparse.ArgumentTypeError(f"无效的并发数列表: {text}")
+    return counts
+
+
+def compare_results(results, baseline, threshold):
+    """与基准结果对比，打印变化并返回回退的测试项列表"""
+    if baseline.get("version") != RESULTS_VERSION:
+        print("基准结果格式版本不同，跳过对比", file=sys.stderr)
+        return []
+    for key in ("ffmpeg", "cpu_count"):
+        if baseline.get(key) != results.get(key):
+            print(f"注意: 运行环境不同（{key}），对比结果仅供参考", file=sys.stderr)
+
+    regressions = []
+    print(f"\n{'测试项':<32}{'基准(秒)':>10}{'本次(秒)':>10}{'变化':>9}")
+    for name, result in results["results"].items():
+        old = baseline.get("results", {}).get(name, {}).get("seconds")
+        if not old:
+            continue
+        change = result["seconds"] / old - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  ← 回退"
+        print(f"{name:<32}{old:>10.3f}{result['seconds']:>10.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="python benchmark.py", description="视频转音频工具性能基准测试")
+    parser.add_argument("--output", help="结果JSON文件路径（默认只打印）")
+    parser.add_argument("--compare", metavar="JSON", help="与之前保存的基准结果对比")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="判定为性能回退的耗时增加比例（默认 0.10，即慢10%%）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取中位数（默认3）")
+    parser.add_argument("--workers", type=parse_worker_counts,
+                        default=parse_worker_counts(f"1,2,4,{os.cpu_count() or 1}"),
+                        help="批量吞吐测试的并发数列表（默认 1,2,4,CPU核心数）")
+    parser.add_argument("--only", action="append", choices=["single", "copy", "multi", "batch", "scan"],
+                        help="只运行指定的测试项（可多次指定）")
+    parser.add_argument("--quick", action="store_true", help="使用更短、更少的测试视频，快速检查")
+    parser.add_argument("--work-dir", help="测试视频和输出的工作目录（默认位于系统临时目录，可复用）")
+    parser.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认自动查找）")
+    parser.add_argument("--ffprobe", help="ffprobe可执行文件路径（默认自动查找）")
+    return parser
+
+
+def main(argv=None):
+    """基准测试主函数，返回退出码：有回退时返回1"""
+    args = build_parser().parse_args(argv)
+
+    ffmpeg_path, ffprobe_path = args.ffmpeg, args.ffprobe
+    if not ffmpeg_path:
+        ffmpeg_path, found_ffprobe, _ = find_ffmpeg()
+        if not ffmpeg_path:
+            print("FFmpeg 未安装，请先安装 FFmpeg 或通过 --ffmpeg 指定路径", file=sys.stderr)
+            return 2
+        ffprobe_path = ffprobe_path or found_ffprobe
+    ffprobe_path = ffprobe_path or "ffprobe"
+
+    work_dir = args.work_dir or os.path.join(tempfile.gettempdir(), "video-converter-benchmark")
+    bench = Benchmark(ffmpeg_path, ffprobe_path, work_dir, args.repeat, args.quick)
+    selected = set(args.only or ["single", "copy", "multi", "batch", "scan"])
+
+    steps = [
+        ("single", lambda: {"single": bench.single()}),
+        ("copy", bench.copy_vs_encode),
+        ("multi", bench.multi_output),
+        ("batch", lambda: bench.batch(args.workers)),
+        ("scan", lambda: {"scan": bench.scan()}),
+    ]
+    results = {}
+    for name, step in steps:
+        if name not in selected:
+            continue
+        print(f"正在测试: {name} ...", flush=True)
+        for key, result in step().items():
+            results[key] = result
+            extra = "  ".join(f"{k}={v}" for k, v in result.items() if k not in ("seconds", "runs"))
+            print(f"  {key:<30}{result['seconds']:>9.3f} 秒  {extra}", flush=True)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "quick": args.quick,
+        "repeat": bench.repeat,
+        "ffmpeg": ffmpeg_version(ffmpeg_path),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("注意: 基准结果与本次的 --quick 设置不同，对比结果仅供参考", file=sys.stderr)
+        regressions = compare_results(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n性能回退（超过 {args.threshold:.0%}）: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+        print("\n未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 自适应并发
+功能：定时读取系统负载（/proc/stat 的CPU占用和iowait、/proc/meminfo 的可用内存、/proc/pressure/memory 的内存压力）
+      和运行中任务报告的实时倍速，逐步增减同时运行的ffmpeg进程数，使每秒转换的媒体时长最大；
+      每次决定都附带原因，供界面和指标显示
+说明：读不到 /proc 时（非Linux系统）只按转换速度调整；不依赖Qt
+"""
+
+import os
+import threading
+import time
+
+# 两次调整之间的采样间隔（秒）
+DEFAULT_INTERVAL = 5.0
+
+# 没有指定上限时，自适应并发最多为CPU核心数的这么多倍（直接复制音轨等受读取限制的任务可以多于核心数）
+ADAPTIVE_MAX_FACTOR = 2
+
+# 调整后先丢弃的采样次数（新任务刚启动时倍速还不稳定），以及用于比较的采样次数
+SETTLE_STEPS = 1
+MEASURE_STEPS = 3
+
+# 增加一个进程后吞吐量至少要提高这么多才保留，否则退回
+MIN_GAIN = 0.05
+
+# 退回后这么多秒内不再尝试同一并发数（负载类型可能随输入变化，之后再试）
+RETRY_AFTER = 120.0
+
+# 负载阈值：CPU占用、iowait、可用内存比例、内存压力（/proc/pressure/memory 的 some avg10，百分比）
+CPU_SATURATED = 0.95
+IOWAIT_HIGH = 0.30
+MEMORY_LOW = 0.10
+MEMORY_PRESSURE_HIGH = 10.0
+
+# 调整的原因
+HEADROOM, NO_GAIN, CPU_FULL, IO_BOUND, MEMORY, LIMITED, IDLE, MEASURING = (
+    "headroom", "no_gain", "cpu_full", "io_bound", "memory", "limited", "idle", "measuring")
+
+
+class LoadSample:
+    """一次系统负载采样；读不到的项为None"""
+
+    __slots__ = ("cpu", "iowait", "memory_available", "memory_pressure")
+
+    def __init__(self, cpu=None, iowait=None, memory_available=None, memory_pressure=None):
+        self.cpu = cpu  # CPU占用比例（0-1）
+        self.iowait = iowait  # 等待I/O的CPU时间比例（0-1）
+        self.memory_available = memory_available  # 可用内存占总内存的比例（0-1）
+        self.memory_pressure = memory_pressure  # 最近10秒有任务因内存不足而等待的时间百分比
+
+    def describe(self):
+        parts = []
+        if self.cpu is not None:
+            parts.append(f"CPU {self.cpu:.0%}")
+        if self.iowait is not None:
+            parts.append(f"iowait {self.iowait:.0%}")
+        if self.memory_available is not None:
+            parts.append(f"可用内存 {self.memory_available:.0%}")
+        return "，".join(parts)
+
+
+class SystemSampler:
+    """读取 /proc 中的系统负载；CPU和iowait按两次采样之间的差值计算"""
+
+    def __init__(self, proc="/proc"):
+        self.proc = proc
+        self.previous = None
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.proc, name), encoding="ascii", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _cpu_times(self):
+        text = self._read("stat")
+        if not text or not text.startswith("cpu "):
+            return None
+        # user nice system idle iowait irq softirq steal（guest 已计入 user）
+        values = [int(value) for value in text.split("\n", 1)[0].split()[1:9]]
+        return sum(values), values[3], values[4]
+
+    def _memory(self):
+        text = self._read("meminfo")
+        if not text:
+            return None
+        fields = {}
+        for line in text.splitlines():
+            name, _, value = line.partition(":")
+            if value.strip():
+                fields[name] = int(value.split()[0])
+        if not fields.get("MemTotal") or "MemAvailable" not in fields:
+            return None
+        return fields["MemAvailable"] / fields["MemTotal"]
+
+    def _memory_pressure(self):
+        text = self._read("pressure/memory")
+        if not text:
+            return None
+        for line in text.splitlines():
+            if line.startswith("some "):
+                for item in line.split()[1:]:
+                    key, _, value = item.partition("=")
+                    if key == "avg10":
+                        return float(value)
+        return None
+
+    def sample(self):
+        cpu = iowait = None
+        times = self._cpu_times()
+        if times is not None and self.previous is not None:
+            total = times[0] - self.previous[0]
+            if total > 0:
+                idle = times[1] - self.previous[1]
+                waiting = times[2] - self.previous[2]
+                cpu = max(0.0, min(1.0, (total - idle - waiting) / total))
+                iowait = max(0.0, min(1.0, waiting / total))
+        self.previous = times
+        return LoadSample(cpu, iowait, self._memory(), self._memory_pressure())
+
+
+class ConcurrencyDecision:
+    """一次调整的结果：并发数、原因（cause 为简短的代码，reason 为说明）和当时的负载"""
+
+    __slots__ = ("level", "previous", "cause", "reason", "throughput", "sample", "time")
+
+    def __init__(self, level, previous, cause, reason, throughput, sample):
+        self.level = level
+        self.previous = previous
+        self.cause = cause
+        self.reason = reason
+        self.throughput = throughput  # 运行中任务的倍速之和，即每秒转换的媒体秒数
+        self.sample = sample
+        self.time = time.time()
+
+    @property
+    def changed(self):
+        return self.level != self.previous
+
+
+class ConcurrencyController:
+    """按系统负载和转换速度调整 JobScheduler 的并发数
+
+    每 interval 秒调用一次 step()（start() 在后台线程中定时调用，界面也可以用自己的定时器调用）：
+    内存不足时立即减少；任务数达到当前上限且CPU、iowait都有余量时增加一个，iowait很高时减少一个，
+    稳定后比较调整前后的吞吐量（throughput() 返回运行中任务的倍速之和）：增加后没有明显提高、
+    或减少后明显下降就退回，并在 RETRY_AFTER 秒内不再尝试同一个并发数。并发数在 minimum 到 maximum 之间，
+    maximum 不超过调度器原来的 max_workers。并发数同时作为总任务数和重新编码任务数的上限，
+    后者不超过调度器原来的 cpu_workers（用户设置的重新编码任务数）。
+    on_decision(ConcurrencyDecision) 在每次采样后调用。
+    """
+
+    def __init__(self, scheduler, throughput, minimum=1, maximum=None, initial=None, interval=DEFAULT_INTERVAL,
+                 on_decision=None, sampler=None):
+        self.scheduler = scheduler
+        self.throughput = throughput
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, min(maximum or scheduler.max_workers, scheduler.max_workers))
+        self.cpu_limit = scheduler.cpu_workers
+        cpu_count = os.cpu_count() or 1
+        self.level = max(self.minimum, min(self.maximum, initial or max(1, cpu_count // 2)))
+        self.interval = interval
+        self.on_decision = on_decision or (lambda decision: None)
+        self.sampler = sampler or SystemSampler()
+        self.decision = None
+        self.samples = []  # 当前并发数下稳定后最近的吞吐量采样
+        self.settle = SETTLE_STEPS
+        self.trial = None  # 最近一次试探性调整：(调整前的并发数, 调整前的吞吐量)
+        self.blocked = {}  # 试过但效果不好的并发数 -> 可以再次尝试的时间
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sampler.sample()  # 第一次采样只作为CPU时间的起点
+        self._apply(self.level)
+
+    def start(self):
+        """在后台线程中定时调整"""
+        self.thread = threading.Thread(target=self._loop, name="concurrency", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            # 暂停派发期间吞吐量为0，不据此调整
+            if not self.scheduler.paused:
+                self.step()
+
+    def _apply(self, level):
+        self.scheduler.set_max_workers(min(level, self.maximum))
+        self.scheduler.set_cpu_workers(min(level, self.cpu_limit))
+
+    def set_cpu_limit(self, cpu_workers):
+        """修改用户设置的重新编码任务数上限，按当前并发数立即生效"""
+        self.cpu_limit = max(1, cpu_workers)
+        self._apply(self.level)
+
+    def step(self):
+        """采样一次并决定是否调整，返回 ConcurrencyDecision"""
+        sample = self.sampler.sample()
+        rate = self.throughput()
+        running, pending = self.scheduler.load()
+        previous = self.level
+        cause, reason, level = self._decide(sample, rate, running, pending)
+        if level != previous:
+            self.level = level
+            self.samples = []
+            self.settle = SETTLE_STEPS
+            self._apply(level)
+        load = sample.describe()
+        self.decision = ConcurrencyDecision(level, previous, cause, f"{reason}（{load}）" if load else reason,
+                                            rate, sample)
+        self.on_decision(self.decision)
+        return self.decision
+
+    def _decide(self, sample, rate, running, pending):
+        # 返回 (原因代码, 说明, 新的并发数)
+        level = self.level
+        memory_low = sample.memory_available is not None and sample.memory_available < MEMORY_LOW
+        pressure = sample.memory_pressure is not None and sample.memory_pressure > MEMORY_PRESSURE_HIGH
+        if memory_low or pressure:
+            if level > self.minimum:
+                self.blocked[level] = time.monotonic() + RETRY_AFTER
+                self.trial = None
+                return MEMORY, f"内存不足，减少到 {level - 1}", level - 1
+            return MEMORY, f"内存不足，已是最少的 {level}", level
+        if running > level:
+            # 减少并发后要等多出来的任务结束
+            self.samples = []
+            return MEASURING, f"等待运行中的 {running} 个任务减少到 {level}", level
+        if running < level:
+            # 任务数没有达到上限，此时的吞吐量不能说明这个并发数的效果
+            self.samples = []
+            if pending:
+                return LIMITED, f"受重新编码或设备并发上限限制，只运行 {running} 个，保持 {level}", level
+            return IDLE, f"没有排队的任务，保持 {level}", level
+        if self.settle > 0:
+            self.settle -= 1
+            return MEASURING, f"等待新的任务稳定，保持 {level}", level
+        # 最近 MEASURE_STEPS 次采样的平均值；并发数改变后重新开始
+        self.samples = self.samples[1 - MEASURE_STEPS:] + [rate]
+        if len(self.samples) < MEASURE_STEPS:
+            return MEASURING, f"测量 {level} 个任务的吞吐量（{rate:.1f}x），保持", level
+        measured = sum(self.samples) / len(self.samples)
+
+        if self.trial is not None:
+            before, baseline = self.trial
+            self.trial = None
+            if before < level and measured < baseline * (1 + MIN_GAIN):
+                self.blocked[level] = time.monotonic() + RETRY_AFTER
+                return NO_GAIN, (f"增加到 {level} 后吞吐量 {baseline:.1f}x → {measured:.1f}x，没有明显提高，"
+                                 f"退回 {before}"), before
+            if before > level and measured < baseline * (1 - MIN_GAIN):
+                self.blocked[level] = time.monotonic() + RETRY_AFTER
+                return NO_GAIN, (f"减少到 {level} 后吞吐量 {baseline:.1f}x → {measured:.1f}x，明显下降，"
+                                 f"恢复 {before}"), before
+        if sample.iowait is not None and sample.iowait > IOWAIT_HIGH:
+            # 大部分时间在等待读写：存储可能已饱和，试着减少并发，吞吐量不降就保持较少的任务数
+            if level > self.minimum and not self._blocked(level - 1):
+                self.trial = (level, measured)
+                return IO_BOUND, f"主要在等待读写，吞吐量 {measured:.1f}x，试着减少到 {level - 1}", level - 1
+            return IO_BOUND, f"主要在等待读写，吞吐量 {measured:.1f}x，保持 {level}", level
+        if sample.cpu is not None and sample.cpu >= CPU_SATURATED:
+            return CPU_FULL, f"CPU已满，吞吐量 {measured:.1f}x，保持 {level}", level
+        if not pending:
+            return IDLE, f"没有排队的任务，吞吐量 {measured:.1f}x，保持 {level}", level
+        if level >= self.maximum:
+            return LIMITED, f"已达到上限 {level}，吞吐量 {measured:.1f}x", level
+        if self._blocked(level + 1):
+            return NO_GAIN, f"{level + 1} 个任务时吞吐量没有提高，吞吐量 {measured:.1f}x，保持 {level}", level
+        self.trial = (level, measured)
+        return HEADROOM, f"系统还有余量，吞吐量 {measured:.1f}x，增加到 {level + 1}", level + 1
+
+    def _blocked(self, level):
+        retry = self.blocked.get(level)
+        return retry is not None and time.monotonic() < retry
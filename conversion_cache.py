@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 转换缓存
+功能：记录已完成的转换结果，重新运行批量任务时跳过未变化的文件，
+      同一内容出现在其他路径时直接硬链接/复制已有结果
+说明：SQLite存储，默认位于用户缓存目录；不依赖Qt
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from converter_core import user_cache_dir
+
+# 部分内容哈希：读取文件开头和结尾各1MB，再加上文件大小
+PARTIAL_HASH_BLOCK = 1024 * 1024
+
+# 缓存条目上限，超出后按最近使用时间淘汰
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def default_cache_path():
+    """默认缓存数据库路径"""
+    return os.path.join(user_cache_dir(), "conversion_cache.sqlite3")
+
+
+def partial_content_hash(path, size=None):
+    """计算文件的快速部分内容哈希"""
+    if size is None:
+        size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BLOCK))
+        if size > PARTIAL_HASH_BLOCK * 2:
+            f.seek(size - PARTIAL_HASH_BLOCK)
+        digest.update(f.read(PARTIAL_HASH_BLOCK))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """转换结果缓存
+
+    sources 表按路径记住 (大小, 修改时间) 对应的内容哈希，文件未变化时无需重新读取；
+    outputs 表以 (内容哈希, 转换设置) 为键记录输出文件及其大小和修改时间，
+    输出被删除或改动后条目视为过期并自动清理。
+    """
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path or default_cache_path()
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS outputs (
+                    content_hash TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    output_size INTEGER NOT NULL,
+                    output_mtime_ns INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (content_hash, settings, output_path)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS outputs_last_used ON outputs (last_used)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def content_hash(self, path):
+        """获取源文件的内容哈希，大小和修改时间未变时直接使用记录值"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, content_hash FROM sources WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        content_hash = partial_content_hash(path, st.st_size)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                              (path, st.st_size, st.st_mtime_ns, content_hash))
+        return content_hash
+
+    def lookup(self, source_path, settings, preferred_output=None):
+        """查找可复用的输出文件，找不到返回None
+
+        有多个有效结果时优先返回 preferred_output（即本次的目标路径）。
+        """
+        content_hash = self.content_hash(source_path)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT output_path, output_size, output_mtime_ns FROM outputs "
+                "WHERE content_hash = ? AND settings = ?", (content_hash, settings)).fetchall()
+
+        valid = []
+        for output_path, size, mtime_ns in rows:
+            try:
+                st = os.stat(output_path)
+            except OSError:
+                st = None
+            if st is None or st.st_size != size or st.st_mtime_ns != mtime_ns:
+                # 输出已被删除或改动，条目过期
+                self._forget(content_hash, settings, output_path)
+            else:
+                valid.append(output_path)
+        if not valid:
+            return None
+
+        preferred = os.path.abspath(preferred_output) if preferred_output else None
+        found = preferred if preferred in valid else valid[0]
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE outputs SET last_used = ? WHERE content_hash = ? AND settings = ? AND output_path = ?",
+                (time.time(), content_hash, settings, found))
+        return found
+
+    def record(self, source_path, settings, output_path):
+        """记录一次成功的转换"""
+        content_hash = self.content_hash(source_path)
+        output_path = os.path.abspath(output_path)
+        st = os.stat(output_path)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                              (content_hash, settings, output_path, st.st_size, st.st_mtime_ns, time.time()))
+
+    def materialize(self, cached_output, output_path):
+        """把已有结果放到新的输出路径：优先硬链接，跨设备等失败时复制"""
+        tmp_path = output_path + ".part"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(cached_output, tmp_path)
+        except OSError:
+            shutil.copy2(cached_output, tmp_path)
+        os.replace(tmp_path, output_path)
+
+    def prune(self):
+        """清理过期条目，并按最近使用时间淘汰超出上限的条目"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT content_hash, settings, output_path, output_size, output_mtime_ns FROM outputs").fetchall()
+        for content_hash, settings, output_path, size, mtime_ns in rows:
+            try:
+                st = os.stat(output_path)
+            except OSError:
+                st = None
+            if st is None or st.st_size != size or st.st_mtime_ns != mtime_ns:
+                self._forget(content_hash, settings, output_path)
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM outputs WHERE rowid IN (SELECT rowid FROM outputs ORDER BY last_used DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self.conn.execute("DELETE FROM sources WHERE rowid IN (SELECT rowid FROM sources ORDER BY rowid DESC "
+                              "LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def _forget(self, content_hash, settings, output_path):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM outputs WHERE content_hash = ? AND settings = ? AND output_path = ?",
+                              (content_hash, settings, output_path))
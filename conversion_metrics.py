@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 转换指标
+功能：记录每个任务的结构化指标（排队等待、读取媒体信息耗时、响度分析耗时、转换耗时、实时倍速、读写字节数、
+      ffmpeg峰值内存、退出码、结束时的并发数），汇总批量的吞吐量、耗时分位数和自适应并发的当前决定，
+      导出为JSON Lines和Prometheus文本格式（可由 node_exporter 的 textfile 收集器读取）
+说明：单个任务的指标写入JSONL后只在内存中保留最近的少量任务和用于计算分位数的耗时数组；不依赖Qt
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from collections import deque
+
+# 统计页显示的最近任务数
+RECENT_JOBS = 200
+
+# Prometheus 文本文件最短重写间隔（秒）
+PROMETHEUS_INTERVAL = 5.0
+
+METRIC_PREFIX = "video_converter"
+
+
+class JobMetrics:
+    """单个任务的指标，时间单位为秒，大小单位为字节"""
+
+    FIELDS = ("path", "outcome", "success", "exit_code", "queue_wait", "probe_time", "analysis_time", "encode_time",
+              "wall_time", "media_seconds", "speed", "bytes_in", "bytes_out", "peak_rss", "concurrency", "finished_at")
+
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for name in self.FIELDS:
+            setattr(self, name, values.get(name, 0))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+def job_metrics(converter, success, queue_wait=0.0, wall_time=0.0, concurrency=0):
+    """根据结束后的 MediaConverter 生成任务指标
+
+    queue_wait 为提交到开始运行的等待时间，wall_time 为开始运行到结束的总耗时，concurrency 为任务结束时的并发数上限。
+    全部输出命中缓存时没有读取源文件，读取字节数记为0；还在输出缓冲区中等待写回的输出按缓冲区中的文件计算。
+    """
+    written = [path for path, result in converter.results.items() if result in ("encode", "copy", "reused")]
+    bytes_out = 0
+    for path in written:
+        for candidate in (path, converter.partials.get(path)):
+            try:
+                bytes_out += os.path.getsize(candidate)
+                break
+            except (OSError, TypeError):
+                continue
+    bytes_in = 0
+    if converter.outcome not in ("cached", "reused", "exists"):
+        try:
+            bytes_in = os.path.getsize(converter.video_path)
+        except OSError:
+            pass
+    encode_time = converter.encode_time
+    media_seconds = converter.duration if encode_time > 0 else 0.0
+    return JobMetrics(
+        path=converter.video_path,
+        outcome="cancelled" if converter.cancelled else converter.outcome,
+        success=success,
+        exit_code=converter.exit_code,
+        queue_wait=round(queue_wait, 3),
+        probe_time=round(converter.probe_time, 3),
+        analysis_time=round(converter.analysis_time, 3),
+        encode_time=round(encode_time, 3),
+        wall_time=round(wall_time, 3),
+        media_seconds=round(media_seconds, 3),
+        speed=round(media_seconds / encode_time, 2) if encode_time > 0 else 0.0,
+        bytes_in=bytes_in,
+        bytes_out=bytes_out,
+        peak_rss=converter.peak_rss,
+        concurrency=concurrency,
+        finished_at=round(time.time(), 3),
+    )
+
+
+def percentile(values, fraction):
+    """最近秩法分位数，values 为空时返回0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class MetricsRecorder:
+    """批量转换的指标汇总
+
+    record() 可在任意线程调用：累加计数、把任务指标追加到 jsonl_path，
+    并按 PROMETHEUS_INTERVAL 间隔重写 prometheus_path；close() 时写出最终结果。
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None, append=True):
+        self.prometheus_path = prometheus_path
+        self.started = time.time()
+        self.start_monotonic = time.monotonic()
+        self.lock = threading.Lock()
+        self.jobs = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.media_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_rss = 0
+        self.latencies = array('d')  # 每个任务从开始运行到结束的耗时
+        self.queue_waits = array('d')
+        self.recent = deque(maxlen=RECENT_JOBS)
+        self.concurrency = None  # 自适应并发最近一次的 ConcurrencyDecision
+        self.concurrency_changes = 0
+        self.last_prometheus = 0.0
+        self.file = None
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            self.file = open(jsonl_path, "a" if append else "w", encoding="utf-8")
+
+    def record(self, metrics):
+        """记录一个结束的任务"""
+        line = json.dumps(metrics.to_dict(), ensure_ascii=False) + "\n"
+        with self.lock:
+            self.jobs += 1
+            if metrics.outcome == "cancelled":
+                self.cancelled += 1
+            elif metrics.success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self.media_seconds += metrics.media_seconds
+            self.encode_seconds += metrics.encode_time
+            self.bytes_in += metrics.bytes_in
+            self.bytes_out += metrics.bytes_out
+            self.peak_rss = max(self.peak_rss, metrics.peak_rss)
+            self.latencies.append(metrics.wall_time)
+            self.queue_waits.append(metrics.queue_wait)
+            self.recent.append(metrics)
+            if self.file is not None:
+                self.file.write(line)
+                self.file.flush()
+            write_prometheus = (self.prometheus_path is not None and
+                                time.monotonic() - self.last_prometheus >= PROMETHEUS_INTERVAL)
+            if write_prometheus:
+                self.last_prometheus = time.monotonic()
+        if write_prometheus:
+            self.write_prometheus()
+
+    def record_concurrency(self, decision):
+        """记录自适应并发的决定（concurrency_control.ConcurrencyDecision）"""
+        with self.lock:
+            self.concurrency = decision
+            if decision.changed:
+                self.concurrency_changes += 1
+
+    def summary(self):
+        """批量汇总：吞吐量为每小时处理的媒体时长（小时），耗时取 p50/p95"""
+        with self.lock:
+            elapsed = time.monotonic() - self.start_monotonic
+            latencies = list(self.latencies)
+            queue_waits = list(self.queue_waits)
+            return {
+                "jobs": self.jobs,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "elapsed": round(elapsed, 3),
+                "media_seconds": round(self.media_seconds, 3),
+                "encode_seconds": round(self.encode_seconds, 3),
+                "media_hours_per_hour": round(self.media_seconds / elapsed, 3) if elapsed > 0 else 0.0,
+                "speed": round(self.media_seconds / self.encode_seconds, 2) if self.encode_seconds > 0 else 0.0,
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p95": percentile(latencies, 0.95),
+                "queue_wait_p50": percentile(queue_waits, 0.5),
+                "queue_wait_p95": percentile(queue_waits, 0.95),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "peak_rss": self.peak_rss,
+                "concurrency": self.concurrency.level if self.concurrency is not None else 0,
+                "concurrency_reason": self.concurrency.reason if self.concurrency is not None else "",
+            }
+
+    def recent_jobs(self):
+        """最近结束的任务指标（最新的在前）"""
+        with self.lock:
+            return list(reversed(self.recent))
+
+    def prometheus_text(self):
+        """Prometheus 文本格式的批量指标"""
+        summary = self.summary()
+        with self.lock:
+            latency_sum = sum(self.latencies)
+            queue_wait_sum = sum(self.queue_waits)
+            decision = self.concurrency
+            concurrency_changes = self.concurrency_changes
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = "{" + ",".join(f'{key}="{val}"' for key, val in labels) + "}" if labels else ""
+                lines.append(f"{full_name}{suffix}{label_text} {value}")
+
+        metric("jobs_total", "counter", "已结束的转换任务数",
+               [("", [("result", "succeeded")], summary["succeeded"]),
+                ("", [("result", "failed")], summary["failed"]),
+                ("", [("result", "cancelled")], summary["cancelled"])])
+        metric("media_seconds_total", "counter", "已转换的媒体时长（秒）", [("", [], summary["media_seconds"])])
+        metric("encode_seconds_total", "counter", "ffmpeg转换耗时合计（秒）", [("", [], summary["encode_seconds"])])
+        metric("read_bytes_total", "counter", "读取的源文件字节数", [("", [], summary["bytes_in"])])
+        metric("written_bytes_total", "counter", "写出的输出文件字节数", [("", [], summary["bytes_out"])])
+        metric("throughput_media_hours_per_hour", "gauge", "每小时处理的媒体时长（小时）",
+               [("", [], summary["media_hours_per_hour"])])
+        metric("ffmpeg_peak_rss_bytes", "gauge", "单个ffmpeg进程的最大峰值内存", [("", [], summary["peak_rss"])])
+        metric("job_latency_seconds", "summary", "任务从开始运行到结束的耗时",
+               [("", [("quantile", "0.5")], summary["latency_p50"]),
+                ("", [("quantile", "0.95")], summary["latency_p95"]),
+                ("_sum", [], round(latency_sum, 3)),
+                ("_count", [], summary["jobs"])])
+        metric("queue_wait_seconds", "summary", "任务在队列中的等待时间",
+               [("", [("quantile", "0.5")], summary["queue_wait_p50"]),
+                ("", [("quantile", "0.95")], summary["queue_wait_p95"]),
+                ("_sum", [], round(queue_wait_sum, 3)),
+                ("_count", [], summary["jobs"])])
+        if decision is not None:
+            metric("concurrency_level", "gauge", "自适应并发当前的任务数上限，cause 为最近一次决定的原因",
+                   [("", [("cause", decision.cause)], decision.level)])
+            metric("concurrency_changes_total", "counter", "自适应并发调整任务数的次数",
+                   [("", [], concurrency_changes)])
+            metric("concurrency_throughput", "gauge", "运行中任务的倍速之和（每秒转换的媒体秒数）",
+                   [("", [], round(decision.throughput, 3))])
+            sample = decision.sample
+            for name, value, help_text in (("system_cpu_ratio", sample.cpu, "CPU占用比例"),
+                                           ("system_iowait_ratio", sample.iowait, "等待I/O的CPU时间比例"),
+                                           ("system_memory_available_ratio", sample.memory_available, "可用内存比例")):
+                if value is not None:
+                    metric(name, "gauge", help_text, [("", [], round(value, 4))])
+        metric("batch_start_time_seconds", "gauge", "本次批量开始的时间戳", [("", [], round(self.started, 3))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """写出Prometheus文本文件：先写临时文件再改名，收集器不会读到写了一半的内容"""
+        path = path or self.prometheus_path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def close(self):
+        """写出最终的Prometheus文件并关闭JSONL"""
+        if self.prometheus_path is not None:
+            self.write_prometheus()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 命令行入口
+功能：无界面批量转换，适用于无显示器的服务器和定时任务
+用法：python -m converter_cli 视频文件或目录 [...] --jobs 4 --quality 192k --output-dir out
+      分布式：python -m converter_cli 目录 --serve 0.0.0.0:8765 --token 口令（协调进程），
+              python -m converter_cli --worker http://主机:8765（各主机上的工作进程）
+说明：不导入PyQt5
+"""
+
+import argparse
+import ipaddress
+import itertools
+import os
+import signal
+import sys
+import threading
+
+from converter_core import (LOG_WARNING, OUTPUT_FORMATS, QUALITY_CHOICES, VIDEO_EXTENSIONS, BatchRunner,
+                            ConversionJob, default_log_dir, iter_chunks, iter_video_files, job_is_cpu_bound,
+                            parse_output_spec, parse_track_spec, unique_outputs)
+from audio_processing import (DEFAULT_ANALYSIS_AHEAD, DEFAULT_SILENCE_DURATION, DEFAULT_SILENCE_THRESHOLD,
+                              DEFAULT_TARGET_I, DEFAULT_TARGET_LRA, DEFAULT_TARGET_TP, AudioProcessing)
+from concurrency_control import ADAPTIVE_MAX_FACTOR
+from conversion_metrics import MetricsRecorder
+from ffmpeg_discovery import discover_ffmpeg, profile_for
+from folder_watcher import DEFAULT_SETTLE_SECONDS, FolderWatcher
+from input_staging import DEFAULT_STAGING_AHEAD, DEFAULT_STAGING_BUDGET
+from job_server import DEFAULT_LEASE_SECONDS, DEFAULT_PORT
+from output_layout import COLLISION_POLICIES, DEFAULT_TEMPLATE, OVERWRITE, TEMPLATE_FIELDS, OutputLayout
+from output_spool import DEFAULT_FLUSH_BYTES
+
+# 分布式批量时由协调进程决定、工作进程照用的转换设置（对应命令行参数名）
+SHARED_OPTIONS = ("quality", "outputs", "tracks", "fast_mode", "name_template", "on_collision", "segments",
+                  "loudnorm", "target_lufs", "true_peak", "lra", "trim_silence", "silence_threshold",
+                  "silence_duration", "sidecars", "skip_duplicates")
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="python -m converter_cli", description="视频转MP3（无界面批量转换）")
+    parser.add_argument("inputs", nargs="*", help="视频文件或目录（目录会递归扫描；--worker 时不指定）")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="并发转换任务数（默认为CPU核心数；--adaptive 时为上限，默认为CPU核心数的2倍）")
+    parser.add_argument("--cpu-jobs", type=int, metavar="N",
+                        help="同时重新编码的任务数上限（默认为CPU核心数），其余槽位留给直接复制音轨的任务")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="自适应并发：根据CPU占用、iowait、内存压力和各任务的实时倍速自动增减同时运行的ffmpeg进程数，"
+                             "使每秒转换的媒体时长最大；-j 作为上限，调整及原因会输出并写入指标")
+    parser.add_argument("--device-jobs", action="append", default=[], metavar="MOUNT=N",
+                        help="限制某个存储设备（挂载点或盘符）同时读取的任务数，0 表示不限，可多次指定；"
+                             "默认机械硬盘和网络存储为 2，其余不限")
+    parser.add_argument("-q", "--quality", choices=QUALITY_CHOICES, default="original",
+                        help="MP3音质，original 表示保持原视频音质（默认）")
+    parser.add_argument("--output", action="append", default=[], dest="outputs", metavar="FORMAT[:QUALITY]",
+                        help="输出格式，可多次指定，一次解码同时写出全部输出，如 --output mp3:128k "
+                             f"--output mp3:320k --output flac（支持 {'/'.join(OUTPUT_FORMATS)}；"
+                             "指定后替代 --quality 的单个MP3输出）")
+    parser.add_argument("--tracks", metavar="SPEC",
+                        help="多音轨视频按音轨分别输出：all 为全部音轨，或逗号分隔的序号（从1开始）/语言代码，"
+                             "如 1,3 或 eng,jpn；只读取一次源文件，文件名加上音轨序号、语言和标题")
+    parser.add_argument("-o", "--output-dir",
+                        help="输出目录（默认与视频文件相同的目录）")
+    parser.add_argument("--mirror-tree", action="store_true",
+                        help="在 --output-dir 下保留视频相对于输入目录的子目录结构（默认全部输出放在同一目录）")
+    parser.add_argument("--name-template", default=DEFAULT_TEMPLATE, metavar="TEMPLATE",
+                        help="输出文件名模板（不含扩展名，可包含 / 放入子目录），可用字段 "
+                             f"{' '.join('{' + f + '}' for f in TEMPLATE_FIELDS)}（默认 %(default)s）")
+    parser.add_argument("--on-collision", choices=COLLISION_POLICIES, default=OVERWRITE,
+                        help="输出文件已存在时：overwrite 覆盖（默认）、skip 跳过、rename 自动编号为 名称 (2)；"
+                             "本次批量中不同视频得到相同的输出路径时总是自动编号")
+    parser.add_argument("--spool", action="store_true",
+                        help="输出先写到本地缓冲目录，累积后再按顺序整块写回输出目录，"
+                             "避免并发转换向慢速存储零散写入")
+    parser.add_argument("--spool-dir", metavar="DIR", help="本地缓冲目录所在位置（默认为系统临时目录）")
+    parser.add_argument("--spool-flush", type=int, default=DEFAULT_FLUSH_BYTES // 1024 ** 2, metavar="MB",
+                        help="缓冲的输出累积到多少MB时写回（默认 %(default)s；最早的输出等待超过30秒也会写回）")
+    parser.add_argument("--loudnorm", action="store_true",
+                        help="EBU R128 两遍响度标准化（第一遍测量结果按源文件缓存，换码率重新编码时不再分析）")
+    parser.add_argument("--target-lufs", type=float, default=DEFAULT_TARGET_I, metavar="LUFS",
+                        help="响度标准化的目标综合响度（默认 %(default)g）")
+    parser.add_argument("--true-peak", type=float, default=DEFAULT_TARGET_TP, metavar="DBTP",
+                        help="响度标准化的真峰值上限（默认 %(default)g）")
+    parser.add_argument("--lra", type=float, default=DEFAULT_TARGET_LRA, metavar="LU",
+                        help="响度标准化的目标响度范围（默认 %(default)g）")
+    parser.add_argument("--analysis-jobs", type=int, default=1, metavar="N",
+                        help="在其他任务编码的同时，用N个进程提前分析接下来的任务的响度（默认 %(default)s，0 表示不提前分析）")
+    parser.add_argument("--trim-silence", action="store_true",
+                        help="去掉开头的静音，并把较长的停顿（包括结尾）缩短到 --silence-duration 秒")
+    parser.add_argument("--silence-threshold", type=float, default=DEFAULT_SILENCE_THRESHOLD, metavar="DB",
+                        help="低于该电平视为静音（默认 %(default)g dB）")
+    parser.add_argument("--silence-duration", type=float, default=DEFAULT_SILENCE_DURATION, metavar="SECONDS",
+                        help="停顿保留的最长时长（默认 %(default)g 秒）")
+    parser.add_argument("--sidecars", action="store_true",
+                        help="在转换的同一次解码中生成波形峰值（名称.waveform.json，audiowaveform格式）和音频指纹"
+                             "（名称.fingerprint.json），写在输出文件旁边；需要NumPy")
+    parser.add_argument("--skip-duplicates", action="store_true",
+                        help="按音频指纹识别本次批量中内容相同的源文件（如重复导出的视频），读完开头后即停止转换，"
+                             "不再重复输出；需要NumPy")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="扫描目录时只包含匹配的文件（可多次指定）")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="扫描目录时排除匹配的文件或子目录（可多次指定）")
+    parser.add_argument("--max-depth", type=int, help="扫描目录的最大子目录深度（默认不限）")
+    parser.add_argument("--no-fast-mode", dest="fast_mode", action="store_false",
+                        help="关闭快速模式：即使源音频已是MP3也重新编码")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="不使用转换缓存，总是重新转换")
+    parser.add_argument("--cache-db", help="转换缓存数据库路径（默认位于用户缓存目录）")
+    parser.add_argument("--longest-first", action="store_true",
+                        help="先并行预读全部文件的时长，再按从长到短的顺序转换")
+    parser.add_argument("--no-metadata-cache", dest="use_metadata_cache", action="store_false",
+                        help="不使用媒体信息缓存，每次都调用ffprobe")
+    parser.add_argument("--segments", type=int, default=0, metavar="N",
+                        help="把长音频切成最多N段并行编码后无缝拼接（每段至少1分钟，适合单个很长的文件）")
+    parser.add_argument("--stage", nargs="?", const="network", choices=["network", "slow"],
+                        help="把接下来要转换的输入提前复制到本地暂存区，ffmpeg从本地副本读取，输出在本地写完后再写回；"
+                             "network 只暂存网络存储上的文件（默认），slow 同时暂存机械硬盘上的文件")
+    parser.add_argument("--stage-dir", metavar="DIR", help="暂存区所在目录（默认为系统临时目录）")
+    parser.add_argument("--stage-size", type=float, default=DEFAULT_STAGING_BUDGET / 1024 ** 3, metavar="GB",
+                        help="暂存区大小上限，超出时淘汰最久未使用的副本（默认 %(default)g GB）")
+    parser.add_argument("--stage-ahead", type=int, default=DEFAULT_STAGING_AHEAD, metavar="N",
+                        help="提前复制接下来的N个任务的输入（默认 %(default)s）")
+    parser.add_argument("--watch", action="store_true",
+                        help="转换完已有文件后继续监视输入目录，新加入或被修改的文件写入完成后自动转换，"
+                             "按 Ctrl+C 停止（Linux 使用 inotify，其他系统定时扫描）")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS, metavar="SECONDS",
+                        help="监视模式下文件大小保持不变多少秒后视为写入完成（默认 %(default)g）")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="批量任务日志文件：记录每个文件的状态，中断后可配合 --resume 继续")
+    parser.add_argument("--resume", action="store_true",
+                        help="从 --journal 指定的日志（或 --serve 的任务数据库）继续，跳过上次已完成的文件")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help=f"作为分布式批量的协调进程运行（如 --serve 0.0.0.0:{DEFAULT_PORT}）：把扫描到的文件放入任务数据库，通过HTTP租给各主机上的"
+                             "工作进程，本身不转换；输入和输出目录必须是各主机上路径相同的共享存储。只写端口时只监听本机（127.0.0.1），"
+                             "监听其他地址时必须指定 --token")
+    parser.add_argument("--server-db", metavar="FILE",
+                        help="协调进程的任务数据库（默认位于用户缓存目录），配合 --resume 在协调进程重启后继续")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, metavar="SECONDS",
+                        help="任务租约时长，工作进程超过这么久没有心跳时任务重新排队（默认 %(default)g）")
+    parser.add_argument("--worker", metavar="URL",
+                        help="作为工作进程连接协调进程（如 http://主机:8765），转换设置由协调进程决定，"
+                             "-j、缓存、暂存区等本机设置照常使用")
+    parser.add_argument("--token", help="协调进程和工作进程之间的共享令牌（协调进程指定后工作进程必须相同）")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="把每个任务的指标（排队等待、转换耗时、倍速、读写字节数、峰值内存、退出码）追加到JSON Lines文件")
+    parser.add_argument("--prometheus", metavar="FILE",
+                        help="批量汇总指标写为Prometheus文本文件（转换过程中定期更新，可由 node_exporter 读取）")
+    parser.add_argument("--log-dir", default=default_log_dir(), metavar="DIR",
+                        help="转换失败时ffmpeg完整错误输出的保存目录（默认 %(default)s）")
+    parser.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认自动查找）")
+    parser.add_argument("--ffprobe", help="ffprobe可执行文件路径（默认自动查找）")
+    return parser
+
+
+def parse_device_jobs(specs):
+    """解析 --device-jobs 的 MOUNT=N 列表"""
+    limits = {}
+    for spec in specs:
+        mount, sep, count = spec.rpartition("=")
+        if not sep or not mount or not count.isdigit():
+            raise ValueError(f"无效的设备并发设置: {spec}（应为 挂载点=任务数）")
+        if mount.endswith(":"):
+            mount += os.sep  # 只写盘符（如 D:）时补上根目录
+        limits[os.path.realpath(mount)] = int(count)
+    return limits
+
+
+def parse_serve_address(text):
+    """解析 --serve 的 [HOST:]PORT，返回 (主机, 端口)；只写端口时只监听本机"""
+    host, _, port = text.rpartition(":")
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"无效的监听地址: {text}（应为 [主机:]端口）")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+def is_loopback(host):
+    """监听地址是否只有本机可以访问"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def format_summary(summary):
+    """批量指标汇总的一行说明"""
+    return (f"吞吐量 {summary['media_hours_per_hour']:.2f} 媒体小时/小时，平均 {summary['speed']:.1f}x 实时，"
+            f"任务耗时 p50 {summary['latency_p50']:.1f}s / p95 {summary['latency_p95']:.1f}s，"
+            f"排队 p95 {summary['queue_wait_p95']:.1f}s")
+
+
+def collect_inputs(inputs, include=None, exclude=None, max_depth=None):
+    """展开命令行中的文件和目录（边扫描边产出）"""
+    for path in inputs:
+        if os.path.isdir(path):
+            yield from iter_video_files(path, include, exclude, max_depth)
+        elif os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+            yield path
+        else:
+            print(f"跳过不支持的文件: {path}", file=sys.stderr)
+
+
+def main(argv=None):
+    """命令行主函数，返回退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.worker:
+        if args.inputs or args.serve:
+            parser.error("--worker 的任务由协调进程分配，不能同时指定输入文件或 --serve")
+        if args.watch or args.journal or args.resume or args.longest_first:
+            parser.error("--watch、--journal、--resume、--longest-first 只能用于协调进程")
+        from job_server import JobClient
+        client = JobClient(args.worker, args.token)
+        try:
+            server = client.settings()
+        except OSError as e:
+            print(f"无法连接协调进程 {args.worker}: {str(e)}", file=sys.stderr)
+            return 2
+        # 转换设置以协调进程为准，各工作进程输出相同的文件
+        for name, value in server["settings"].items():
+            if name in SHARED_OPTIONS:
+                setattr(args, name, value)
+    elif not args.inputs:
+        parser.error("需要指定视频文件或目录")
+    if args.serve:
+        if args.journal:
+            parser.error("--serve 的任务状态保存在 --server-db 中，不能同时指定 --journal")
+        try:
+            serve_address = parse_serve_address(args.serve)
+        except ValueError as e:
+            parser.error(str(e))
+        if not args.token and not is_loopback(serve_address[0]):
+            parser.error(f"--serve 监听 {serve_address[0]} 时其他主机也能领取任务，必须同时指定 --token")
+    try:
+        outputs = unique_outputs(parse_output_spec(spec) for spec in args.outputs) or None
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        tracks = parse_track_spec(args.tracks)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.sidecars or args.skip_duplicates:
+        from audio_sidecars import available
+        if not available() and not args.serve:
+            parser.error("--sidecars 和 --skip-duplicates 需要 NumPy，请先运行 pip install numpy")
+        if tracks is not None:
+            parser.error("--sidecars 和 --skip-duplicates 不能与 --tracks 同时使用")
+    try:
+        device_limits = parse_device_jobs(args.device_jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.resume and not (args.journal or args.serve):
+        parser.error("--resume 需要同时指定 --journal 或 --serve")
+    watch_dirs = [path for path in args.inputs if os.path.isdir(path)]
+    if args.watch and not watch_dirs:
+        parser.error("--watch 需要至少指定一个目录")
+    if args.mirror_tree and not args.output_dir:
+        parser.error("--mirror-tree 需要同时指定 --output-dir")
+    try:
+        layout = OutputLayout(args.output_dir, args.name_template, args.on_collision, watch_dirs, args.mirror_tree)
+    except ValueError as e:
+        parser.error(str(e))
+
+    processing = AudioProcessing(args.loudnorm, args.target_lufs, args.true_peak, args.lra,
+                                 args.trim_silence, args.silence_threshold, args.silence_duration)
+
+    # 能力档案按可执行文件缓存，之后运行时不再启动ffmpeg检查
+    # 协调进程本身不转换，没有FFmpeg也可以运行（--longest-first 读取时长时才需要ffprobe）
+    if args.ffmpeg:
+        profile = profile_for(args.ffmpeg, args.ffprobe)
+        if profile is None:
+            print(f"无法运行指定的 FFmpeg: {args.ffmpeg}", file=sys.stderr)
+            return 2
+    else:
+        profile = discover_ffmpeg()
+        if profile is None and not args.serve:
+            print("FFmpeg 未安装，请先安装 FFmpeg 或通过 --ffmpeg 指定路径", file=sys.stderr)
+            return 2
+    ffmpeg_path = profile.ffmpeg_path if profile is not None else None
+    ffprobe_path = args.ffprobe or (profile.ffprobe_path if profile is not None else "ffprobe")
+    unsupported = [fmt for fmt, _ in outputs or [("mp3", args.quality)]
+                   if profile is not None and not profile.supports(fmt)]
+    if unsupported and not args.serve:
+        print(f"当前 FFmpeg 不支持输出格式: {', '.join(unsupported)}"
+              f"（缺少编码器 {', '.join(OUTPUT_FORMATS[fmt][0] for fmt in unsupported)}）", file=sys.stderr)
+        return 2
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    metadata_cache = None
+    if args.use_metadata_cache:
+        from media_probe import MetadataCache
+        metadata_cache = MetadataCache()
+
+    job_numbers = itertools.count()
+
+    def make_job(path, info=None):
+        output_dir = layout.output_dir(path)
+        info = info or {}
+        cpu_bound = job_is_cpu_bound(info, outputs or [("mp3", args.quality)], args.fast_mode, processing, tracks)
+        return ConversionJob(next(job_numbers), path, output_dir, "mp3", args.quality, info.get("duration", 0.0),
+                             outputs, cpu_bound)
+
+    paths = collect_inputs(args.inputs, args.include, args.exclude, args.max_depth)
+
+    journal = None
+    done_paths = []
+    cancelled_paths = []
+    if args.journal:
+        from batch_journal import CANCELLED, DONE, BatchJournal, load_journal
+        if args.resume:
+            state = load_journal(args.journal)
+            if state is not None:
+                done_paths = [os.path.abspath(path) for path in state.paths_in(DONE)]
+                cancelled_paths = [os.path.abspath(path) for path in state.paths_in(CANCELLED)]
+                print(f"从日志继续，跳过已完成的 {len(done_paths)} 个文件和已取消的 {len(cancelled_paths)} 个文件",
+                      flush=True)
+        skip = set(done_paths) | set(cancelled_paths)
+        paths = (path for path in paths if os.path.abspath(path) not in skip)
+        journal = BatchJournal(args.journal)
+        journal.start({"inputs": args.inputs, "outputs": outputs or [("mp3", args.quality)],
+                       "fast_mode": args.fast_mode, "processing": processing.to_dict(), "tracks": args.tracks,
+                       "sidecars": args.sidecars, "skip_duplicates": args.skip_duplicates},
+                      done_paths, cancelled_paths)
+    if args.longest_first:
+        # 需要先拿到全部时长才能排序：并行预读后按时长从长到短提交
+        from media_probe import prefetch_metadata
+        paths = list(paths)
+        print(f"正在读取 {len(paths)} 个文件的媒体信息...", flush=True)
+        metadata = prefetch_metadata(ffprobe_path, paths, metadata_cache)
+        jobs = [make_job(path, metadata.get(path)) for path in paths]
+        jobs.sort(key=lambda job: -job.duration)
+    else:
+        # 生成器：扫描到的第一个文件就开始转换，扫描与转换同时进行
+        jobs = (make_job(path) for path in paths)
+
+    if args.serve:
+        settings = {name: getattr(args, name) for name in SHARED_OPTIONS}
+        return serve_batch(args, serve_address, settings, jobs, make_job, watch_dirs)
+
+    print_lock = threading.Lock()
+    finished = [0]
+
+    def on_status(text, level):
+        # 只输出警告和错误，完整的ffmpeg错误输出在 --log-dir 的日志文件中
+        if level >= LOG_WARNING:
+            with print_lock:
+                print(text, file=sys.stderr, flush=True)
+
+    def on_job_finished(job, success, message):
+        with print_lock:
+            finished[0] += 1
+            print(f"[{finished[0]}] {os.path.basename(job.video_path)}: {message}", flush=True)
+
+    cache = None
+    if args.use_cache:
+        from conversion_cache import ConversionCache
+        cache = ConversionCache(args.cache_db)
+
+    staging = None
+    if args.stage:
+        from input_staging import StagingArea
+        from storage_devices import NETWORK, ROTATIONAL
+        kinds = (NETWORK,) if args.stage == "network" else (NETWORK, ROTATIONAL)
+        staging = StagingArea(args.stage_dir, int(args.stage_size * 1024 ** 3), max(1, args.stage_ahead), kinds)
+
+    spool = None
+    if args.spool:
+        from output_spool import OutputSpool
+        spool = OutputSpool(args.spool_dir, max(1, args.spool_flush) * 1024 ** 2, on_status=on_status)
+
+    analyzer = None
+    # 后台分析只测量默认音轨，按音轨输出时由任务自己一次测量全部选中的音轨
+    if processing.loudnorm and args.analysis_jobs > 0 and tracks is None:
+        from audio_processing import LoudnessAnalyzer
+        analyzer = LoudnessAnalyzer(ffmpeg_path, processing, metadata_cache, args.analysis_jobs,
+                                    max(DEFAULT_ANALYSIS_AHEAD, args.analysis_jobs))
+
+    sidecars = None
+    if args.sidecars or args.skip_duplicates:
+        from audio_sidecars import AudioSidecars
+        sidecars = AudioSidecars(args.sidecars, args.sidecars, args.skip_duplicates)
+
+    def on_concurrency(decision):
+        if decision.changed:
+            with print_lock:
+                print(f"并发数 {decision.previous} → {decision.level}: {decision.reason}", flush=True)
+
+    metrics = MetricsRecorder(args.metrics, args.prometheus)
+    cpu_count = os.cpu_count() or 1
+    max_jobs = args.jobs or (cpu_count * ADAPTIVE_MAX_FACTOR if args.adaptive else cpu_count)
+    runner_options = dict(cpu_workers=args.cpu_jobs, device_limits=device_limits, adaptive=args.adaptive,
+                          on_concurrency=on_concurrency,
+                          ffmpeg_path=ffmpeg_path, ffprobe_path=ffprobe_path, fast_mode=args.fast_mode,
+                          cache=cache, metadata_cache=metadata_cache, segments=args.segments, staging=staging,
+                          log_dir=args.log_dir, layout=layout, spool=spool,
+                          processing=processing if processing.enabled else None, analyzer=analyzer, tracks=tracks,
+                          sidecars=sidecars)
+    worker = None
+    if args.worker:
+        from job_server import JobWorker
+        worker = JobWorker(client, server["batch"], server["lease_seconds"], max_jobs, metrics=metrics,
+                           on_status=on_status, on_job_finished=on_job_finished, **runner_options)
+        runner = worker.runner
+        print(f"工作进程 {worker.name} 已连接协调进程 {args.worker}", flush=True)
+    else:
+        runner = BatchRunner(max_jobs, on_status=on_status, on_job_finished=on_job_finished,
+                             longest_first=args.longest_first, journal=journal, metrics=metrics, **runner_options)
+    if runner.controller is not None:
+        print(f"开始批量转换，自适应并发：从 {runner.controller.level} 个任务开始，最多 {runner.controller.maximum} 个",
+              flush=True)
+    else:
+        print(f"开始批量转换，并发任务数 {runner.scheduler.max_workers}"
+              f"（重新编码最多 {runner.scheduler.cpu_workers}）", flush=True)
+    if processing.enabled:
+        print(f"音频处理: {processing.describe()}", flush=True)
+    if sidecars is not None:
+        print(f"附属输出: {sidecars.describe()}", flush=True)
+    watch = watcher = None
+    if args.watch:
+        # 先记录目录中已有的文件再开始扫描，扫描期间新加入的文件不会漏掉；两边都报告的文件由 runner 去重
+        watch = threading.Event()
+        watcher = FolderWatcher(watch_dirs, lambda found: runner.submit([make_job(path) for path in found]),
+                                args.include, args.exclude, args.max_depth, args.settle, on_status=on_status)
+        watcher.start()
+        watcher.ready.wait()
+        print(f"正在监视 {len(watch_dirs)} 个目录（{watcher.mode}），按 Ctrl+C 停止", flush=True)
+        # 作为服务运行时按 Ctrl+C 的方式处理 SIGTERM，同样会停止ffmpeg子进程
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        succeeded, failed = worker.run() if worker is not None else runner.run(jobs, watch)
+    except KeyboardInterrupt:
+        # 停止排队和运行中的ffmpeg，等它们退出后再结束，不遗留子进程
+        # 工作进程的租约随后在协调进程上过期，任务由其他工作进程重新转换
+        print("正在取消...", file=sys.stderr, flush=True)
+        if worker is not None:
+            worker.cancel()
+        else:
+            runner.cancel()
+        runner.wait()
+        counter = worker if worker is not None else runner
+        print(f"已取消: 成功 {counter.succeeded} 个，失败 {counter.failed} 个，取消 {counter.cancelled} 个",
+              file=sys.stderr)
+        return 130
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if analyzer is not None:
+            analyzer.close()
+        if spool is not None:
+            # 先写回缓冲区中剩余的输出，写回后才会记入转换缓存
+            spool.close()
+        metrics.close()
+        if journal is not None:
+            journal.close()
+        if cache is not None:
+            cache.prune()
+            cache.close()
+        if metadata_cache is not None:
+            metadata_cache.close()
+        if staging is not None:
+            staging.close()
+    if succeeded + failed == 0 and done_paths:
+        print("上次的文件已全部完成")
+        return 0
+    if succeeded + failed == 0 and worker is not None:
+        print("协调进程没有分配任务")
+        return 0
+    if succeeded + failed == 0:
+        print("没有找到视频文件", file=sys.stderr)
+        return 1
+    cancelled = (worker if worker is not None else runner).cancelled
+    print(f"完成: 成功 {succeeded} 个，失败 {failed} 个" + (f"，取消 {cancelled} 个" if cancelled else ""))
+    print(format_summary(metrics.summary()))
+    return 1 if failed else 0
+
+
+def serve_batch(args, address, settings, jobs, make_job, watch_dirs):
+    """协调进程：任务放入任务数据库，等待工作进程全部完成，返回退出码"""
+    from job_server import DONE, FAILED, JobCoordinator, JobStore
+
+    print_lock = threading.Lock()
+    finished = [0]
+
+    def on_status(text, level):
+        with print_lock:
+            print(text, file=sys.stderr if level >= LOG_WARNING else sys.stdout, flush=True)
+
+    def on_job_finished(path, success, message, worker):
+        with print_lock:
+            finished[0] += 1
+            source = f"（{worker}）" if worker else ""
+            print(f"[{finished[0]}] {os.path.basename(path)}: {message}{source}", flush=True)
+
+    metrics = MetricsRecorder(args.metrics, args.prometheus)
+    store = JobStore(args.server_db)
+    try:
+        coordinator = JobCoordinator(store, settings, address[0], address[1], args.lease, args.token, args.resume,
+                                     args.longest_first, metrics, on_status, on_job_finished)
+    except OSError as e:
+        print(f"无法监听 {args.serve}: {str(e)}", file=sys.stderr)
+        store.close()
+        metrics.close()
+        return 2
+    coordinator.start()
+    print(f"协调进程已启动，工作进程用 --worker {coordinator.address} 连接", flush=True)
+    watch = watcher = None
+    if args.watch:
+        def on_found(found):
+            # 被修改的文件在上次完成后重新排队
+            for path in found:
+                coordinator.requeue(path)
+            coordinator.submit([make_job(path) for path in found])
+
+        watch = threading.Event()
+        watcher = FolderWatcher(watch_dirs, on_found, args.include, args.exclude, args.max_depth, args.settle,
+                                on_status=on_status)
+        watcher.start()
+        watcher.ready.wait()
+        print(f"正在监视 {len(watch_dirs)} 个目录（{watcher.mode}），按 Ctrl+C 停止", flush=True)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        added = sum(coordinator.submit(chunk) for chunk in iter_chunks(jobs))
+        coordinator.finish_scan()
+        counts = store.counts()
+        print(f"新加入 {added} 个任务，共 {sum(counts.values())} 个，其中已完成 {counts[DONE]} 个", flush=True)
+        counts = coordinator.wait(watch)
+    except KeyboardInterrupt:
+        print("已停止，未完成的任务保留在任务数据库中，可用 --resume 继续", file=sys.stderr)
+        return 130
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        coordinator.stop()
+        store.close()
+        metrics.close()
+    if not sum(counts.values()):
+        print("没有找到视频文件", file=sys.stderr)
+        return 1
+    print(f"完成: 成功 {counts[DONE]} 个，失败 {counts[FAILED]} 个")
+    if metrics.summary()["jobs"]:
+        print(format_summary(metrics.summary()))
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
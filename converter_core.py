@@ -0,0 +1,1818 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 转换核心
+功能：FFmpeg查找、媒体探测、命令构建、转换执行和批量调度
+说明：本模块不依赖Qt，图形界面（main.py）和命令行（converter_cli.py）共用
+"""
+
+import atexit
+import fnmatch
+import functools
+import heapq
+import math
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import deque
+from fractions import Fraction
+from pathlib import Path
+
+from conversion_metrics import job_metrics
+from storage_devices import device_for_path
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.rmvb', '.ts'}
+
+# 可选的MP3音质，"original" 表示保持原视频音质
+QUALITY_CHOICES = ["original", "128k", "192k", "320k"]
+
+# 输出格式：格式名 -> (编码器, 扩展名, 可直接复制的源编码, 保持原音质时的编码参数, 封装格式)
+# 无损格式（flac、wav）忽略音质设置；输出先写入 .part 临时文件，因此需要显式指定封装格式
+OUTPUT_FORMATS = {
+    "mp3": ("libmp3lame", ".mp3", "mp3", ["-q:a", "0"], "mp3"),
+    "aac": ("aac", ".m4a", "aac", ["-b:a", "256k"], "ipod"),
+    "opus": ("libopus", ".opus", "opus", ["-b:a", "192k"], "opus"),
+    "flac": ("flac", ".flac", "flac", [], "flac"),
+    "wav": ("pcm_s16le", ".wav", "pcm_s16le", [], "wav"),
+}
+
+# 转换中的输出文件后缀：完成后原子重命名为最终文件名，中断时不会留下写了一半的输出
+PARTIAL_SUFFIX = ".part"
+LOSSLESS_FORMATS = {"flac", "wav"}
+
+# 项目自带的FFmpeg目录
+BUNDLED_FFMPEG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "ffmpeg-7.1-essentials_build", "bin")
+
+
+# 取消时等待ffmpeg正常退出的秒数，超时后强制结束
+STOP_TIMEOUT = 3.0
+
+# 分段并行编码：每段的最短时长（秒），以及每段前后多编码、拼接时丢弃的帧数（让编码器预热）
+SEGMENT_MIN_SECONDS = 60
+SEGMENT_OVERLAP_FRAMES = 8
+# ffmpeg自带AAC编码器的前置延迟（采样数），拼接后需要重新写入m4a的编辑列表
+AAC_PRIMING_SAMPLES = 1024
+# 统计采样数：astats 结束时在错误输出中打印 "Number of samples: N"
+SAMPLE_COUNT_FILTER = "astats=measure_perchannel=none:measure_overall=Number_of_samples"
+_SAMPLE_COUNT = re.compile(r"Number of samples: (\d+)")
+
+# 状态消息的级别
+LOG_INFO, LOG_WARNING, LOG_ERROR = range(3)
+
+# 仍在运行的ffmpeg进程，程序退出时统一结束，避免遗留子进程
+_live_processes = weakref.WeakSet()
+
+
+def _noop(*args):
+    pass
+
+
+def suspend_process(process):
+    """暂停子进程：Linux/macOS 发送 SIGSTOP，Windows 调用 NtSuspendProcess"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            ctypes.windll.ntdll.NtSuspendProcess(ctypes.c_void_p(int(process._handle)))
+        else:
+            os.kill(process.pid, signal.SIGSTOP)
+    except OSError:
+        # 进程已经结束
+        pass
+
+
+def resume_process(process):
+    """继续被暂停的子进程"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            ctypes.windll.ntdll.NtResumeProcess(ctypes.c_void_p(int(process._handle)))
+        else:
+            os.kill(process.pid, signal.SIGCONT)
+    except OSError:
+        pass
+
+
+def process_peak_rss(process):
+    """子进程的峰值内存（字节），无法读取时返回0
+
+    Linux 读取 /proc/<pid>/status 中的 VmHWM，须在进程退出前读取；
+    Windows 调用 GetProcessMemoryInfo，进程退出后仍可读取。
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage",
+                        "PeakPagefileUsage")]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.c_void_p(int(process._handle)),
+                                                        ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+            return 0
+        with open(f"/proc/{process.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    return 0
+
+
+@atexit.register
+def _kill_live_processes():
+    for process in list(_live_processes):
+        if process.poll() is None:
+            resume_process(process)
+            process.kill()
+
+
+def segment_frame(fmt, sample_rate):
+    """分段编码时目标格式的 (每帧采样数, 输出采样率)，不能分段时返回None
+
+    只支持有损格式（编码是主要耗时，无损格式本身很快）；编码器会把采样率改成未知值时不分段。
+    """
+    if fmt == "mp3" and sample_rate in (32000, 44100, 48000):
+        return 1152, sample_rate
+    if fmt == "mp3" and sample_rate in (8000, 11025, 12000, 16000, 22050, 24000):
+        return 576, sample_rate
+    if fmt == "aac" and sample_rate in (7350, 8000, 11025, 12000, 16000, 22050, 24000,
+                                        32000, 44100, 48000, 64000, 88200, 96000):
+        return 1024, sample_rate
+    if fmt == "opus" and sample_rate in (8000, 12000, 16000, 24000, 48000, 44100):
+        # Opus 不支持44.1kHz，ffmpeg会重采样到48kHz；默认每帧20毫秒
+        rate = 48000 if sample_rate == 44100 else sample_rate
+        return rate // 50, rate
+    return None
+
+
+def sample_exact_time_base(time_base, sample_rate):
+    """时间基（如 1/44100）能否精确表示每个采样的位置
+
+    分段编码按采样数切分，只有这样 -ss 才能定位到准确的采样；MKV/WebM/FLV 等以毫秒为单位的时间戳
+    会偏差十几个采样，拼接处不再无缝。
+    """
+    numerator, _, denominator = time_base.partition("/")
+    return (numerator == "1" and denominator.isdigit() and sample_rate > 0
+            and int(denominator) % sample_rate == 0)
+
+
+def can_stream_copy(info, fmt, quality):
+    """媒体信息 info 中的音频能否直接复制为目标格式（编码相同且不高于目标比特率）"""
+    if info.get("audio_codec", "") != OUTPUT_FORMATS[fmt][2]:
+        return False
+    if quality == "original" or fmt in LOSSLESS_FORMATS:
+        return True
+    # 指定了比特率时，只有源码率不高于目标码率才复制，否则仍需重新编码降码率
+    target = int(quality.rstrip("k")) * 1000
+    return 0 < info.get("bit_rate", 0) <= target
+
+
+def job_is_cpu_bound(info, outputs, fast_mode, processing=None, tracks=None):
+    """批量任务是否需要重新编码（占用重新编码的槽位）
+
+    只有预读到媒体信息、且全部输出都能直接复制音轨的任务只受读取限制；
+    有音频处理或按音轨输出时（各音轨的编码要读取后才知道）按重新编码计。
+    """
+    if (processing is not None and processing.enabled) or tracks is not None or not fast_mode:
+        return True
+    return not all(can_stream_copy(info, *output) for output in outputs)
+
+
+def find_ffmpeg(configured=None):
+    """查找可用的FFmpeg
+
+    依次检查 configured（或用户在界面中指定过的路径）、项目目录中自带的FFmpeg、系统PATH中的FFmpeg，
+    结果按可执行文件缓存（见 ffmpeg_discovery）。
+    返回 (ffmpeg路径, ffprobe路径, 来源)，来源为 "configured" / "local" / "system"；
+    找不到时返回 (None, None, None)。
+    """
+    from ffmpeg_discovery import discover_ffmpeg
+
+    profile = discover_ffmpeg(configured)
+    if profile is None:
+        return None, None, None
+    return profile.ffmpeg_path, profile.ffprobe_path, profile.source
+
+
+def user_cache_dir():
+    """用户缓存目录（转换缓存、元数据缓存等）"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "video-converter")
+
+
+def default_log_dir():
+    """转换失败时ffmpeg完整错误输出的默认保存目录"""
+    return os.path.join(user_cache_dir(), "logs")
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version(ffmpeg_path):
+    """ffmpeg版本号（-version 输出的第一行），失败返回空字符串；取自缓存的能力档案"""
+    from ffmpeg_discovery import profile_for
+
+    profile = profile_for(ffmpeg_path)
+    return profile.version if profile is not None else ""
+
+
+def parse_quality(text):
+    """将界面上的音质文本转换为内部音质值"""
+    if text in ("原视频音质", "original"):
+        return "original"
+    return text if text in QUALITY_CHOICES else "192k"
+
+
+def parse_output_spec(text):
+    """解析输出格式说明，如 mp3:128k、aac、flac，返回 (格式, 音质)
+
+    格式不支持或音质不是 original / 数字k 时抛出 ValueError。
+    """
+    fmt, _, quality = text.strip().lower().partition(":")
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}")
+    quality = quality or "original"
+    if fmt in LOSSLESS_FORMATS:
+        quality = "original"
+    elif quality != "original" and not (quality.endswith("k") and quality[:-1].isdigit()):
+        raise ValueError(f"无效的音质: {quality}")
+    return fmt, quality
+
+
+def parse_track_spec(text):
+    """解析音轨选择，如 all、1,3、eng,jpn（序号从1开始，也可以是语言代码）
+
+    返回选择项列表：all 为空列表（全部音轨），序号转换为从0开始的整数，语言代码为小写字符串。
+    text 为空时返回None（只转换默认音轨）；格式错误时抛出 ValueError。
+    """
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    if text == "all":
+        return []
+    selection = []
+    for item in (part.strip() for part in text.split(",")):
+        if item.isdigit() and int(item) > 0:
+            selection.append(int(item) - 1)
+        elif item.isalpha():
+            selection.append(item)
+        else:
+            raise ValueError(f"无效的音轨选择: {item}（应为 all、从1开始的序号或语言代码）")
+    return list(dict.fromkeys(selection))
+
+
+def select_tracks(audio_streams, selection):
+    """按选择项返回要输出的音频流序号（从0开始，按流的顺序）"""
+    if not selection:
+        return list(range(len(audio_streams)))
+    return [n for n, stream in enumerate(audio_streams)
+            if n in selection or stream.get("language", "").lower() in selection]
+
+
+def unique_outputs(outputs):
+    """去掉重复的 (格式, 音质)，保持原有顺序"""
+    return list(dict.fromkeys(outputs))
+
+
+def format_eta(seconds):
+    """将秒数格式化为 时:分:秒"""
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def _matches_any(rel_path, name, patterns):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def wanted_video_file(rel_path, include=None, exclude=None):
+    """相对路径（/ 分隔）对应的文件是否符合扫描条件：视频扩展名，且满足包含/排除通配符"""
+    name = rel_path.rsplit("/", 1)[-1]
+    if os.path.splitext(name)[1].lower() not in VIDEO_EXTENSIONS:
+        return False
+    if include and not _matches_any(rel_path, name, include):
+        return False
+    return not (exclude and _matches_any(rel_path, name, exclude))
+
+
+def wanted_subdir(rel_path, depth, exclude=None, max_depth=None):
+    """深度为 depth（顶层目录下的子目录为1）的子目录是否需要扫描"""
+    if max_depth is not None and depth > max_depth:
+        return False
+    return not (exclude and _matches_any(rel_path, rel_path.rsplit("/", 1)[-1], exclude))
+
+
+def iter_video_files(directory, include=None, exclude=None, max_depth=None, cancel_event=None):
+    """递归列出目录中的视频文件（生成器，边扫描边产出）
+
+    include / exclude 为通配符列表，匹配相对路径或文件名；exclude 同样作用于子目录。
+    max_depth 为最大子目录深度（0 表示只扫描顶层），None 表示不限。
+    cancel_event 被设置后尽快停止扫描。
+    """
+    include = list(include or [])
+    exclude = list(exclude or [])
+    # 用显式栈代替递归，并使用 os.scandir 复用目录项自带的类型信息，避免逐个 stat
+    stack = [(directory, "", 0)]
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        current, rel_dir, depth = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                subdirs = []
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                        if is_dir and entry.is_symlink():
+                            # 与 Path.rglob 一致：不进入符号链接目录，避免循环
+                            continue
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if wanted_subdir(rel_path, depth + 1, exclude, max_depth):
+                            subdirs.append((entry.path, rel_path, depth + 1))
+                        continue
+                    if wanted_video_file(rel_path, include, exclude):
+                        yield entry.path
+        except OSError:
+            # 无权限或扫描过程中被删除的目录直接跳过
+            continue
+        # 逆序入栈，保证按目录内顺序深度优先遍历
+        stack.extend(reversed(subdirs))
+
+
+def _heap_smallest(heap, count):
+    """按顺序返回调度堆中最小的 count 个条目，只访问约 count 个节点，不必排序整个堆"""
+    result = []
+    frontier = [(heap[0][:2], 0)] if heap else []
+    while frontier and len(result) < count:
+        _, i = heapq.heappop(frontier)
+        result.append(heap[i])
+        for child in (2 * i + 1, 2 * i + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child][:2], child))
+    return result
+
+
+def iter_chunks(iterable, size=500, interval=0.2):
+    """把可迭代对象按块输出：达到 size 个或距上一块超过 interval 秒时产出一块"""
+    chunk = []
+    last = time.monotonic()
+    for item in iterable:
+        chunk.append(item)
+        now = time.monotonic()
+        if len(chunk) >= size or now - last >= interval:
+            yield chunk
+            chunk = []
+            last = now
+    if chunk:
+        yield chunk
+
+
+class MediaConverter:
+    """单个文件的转换过程
+
+    outputs 为 (格式, 音质) 列表，全部输出在同一次ffmpeg调用中写出，源文件只解码一次。
+    可选的 staging、spool、layout、processing、analyzer、sidecars 见各自的类，tracks 见 parse_track_spec。
+    """
+
+    # 进度回调最短间隔（秒），避免大量任务同时刷新界面
+    PROGRESS_INTERVAL = 0.5
+
+    # 各种完成方式对应的结果说明
+    OUTCOME_MESSAGES = {
+        "encode": "转换完成（重新编码）",
+        "copy": "转换完成（直接复制音轨）",
+        "cached": "已是最新，跳过转换",
+        "reused": "转换完成（复用已有结果）",
+        "exists": "输出文件已存在，跳过转换",
+        "duplicate": "与已转换的文件内容相同，跳过转换",
+    }
+
+    # 多个输出时，每个输出的结果说明
+    OUTPUT_LABELS = {
+        "encode": "重新编码",
+        "copy": "直接复制音轨",
+        "cached": "已是最新",
+        "reused": "复用已有结果",
+        "exists": "已存在，跳过",
+        "duplicate": "内容重复，跳过",
+        "failed": "失败",
+        "cancelled": "已取消",
+    }
+
+    def __init__(self, video_path, output_dir, conversion_type="mp3", quality="original",
+                 ffmpeg_path="ffmpeg", ffprobe_path="ffprobe", fast_mode=True,
+                 on_status=None, on_progress=None, on_duration=None, cache=None, metadata_cache=None,
+                 outputs=None, segments=0, staging=None, log_dir=None, layout=None, spool=None,
+                 processing=None, analyzer=None, tracks=None, sidecars=None):
+        self.video_path = video_path
+        self.input_path = video_path  # ffmpeg实际读取的路径，使用暂存副本时与 video_path 不同
+        self.output_dir = output_dir
+        self.conversion_type = conversion_type
+        self.quality = quality
+        self.outputs = unique_outputs(outputs or [(conversion_type, quality)])
+        self.tracks = tracks
+        # 实际要写出的 (格式, 音质, 音轨) 列表；多音轨模式下读到媒体信息后按选中的音轨展开
+        self.keys = [(fmt, quality, None) for fmt, quality in self.outputs]
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.fast_mode = fast_mode
+        self.segments = segments
+        self.staging = staging
+        self.log_dir = log_dir
+        self.layout = layout
+        self.spool = spool
+        self.processing = processing if processing is not None and processing.enabled else None
+        self.analyzer = analyzer
+        self.measured = {}  # 音轨 -> loudnorm 第一遍的测量值（默认音轨为None）
+        self.sidecars = sidecars if tracks is None else None
+        self.sidecars_written = False
+        self.duplicate_checked = False
+        self.duplicate_of = None  # 内容相同的源文件路径（跳过重复时）
+        self.resolved = {}  # (格式, 音质, 音轨) -> 按重名处理方式确定的输出路径
+        self.partials = {}  # 输出路径 -> 写入中的临时文件路径
+        self.on_status = on_status or _noop
+        self.on_progress = on_progress or _noop
+        self.on_duration = on_duration or _noop
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        self.media_info = {}
+        self.duration = 0.0
+        self.stream_copy = False
+        self.audio_codec = ""
+        self.speed = 0.0  # ffmpeg最近报告的实时倍速，自适应并发按运行中任务的倍速之和计算吞吐量
+        self.outcome = "encode"
+        # 指标：读取媒体信息和ffmpeg转换的耗时（秒）、ffmpeg峰值内存（字节）、最后一次转换的退出码
+        self.probe_time = 0.0
+        self.analysis_time = 0.0
+        self.encode_time = 0.0
+        self.peak_rss = 0
+        self.exit_code = None
+        self.results = {}  # 输出路径 -> 结果（encode/copy/cached/reused/failed/cancelled）
+        # 运行中的ffmpeg进程（分段编码时有多个）；cancel()/pause() 可能在其他线程调用，用锁保护
+        self.processes = []
+        self.process_lock = threading.Lock()
+        self.cancelled = False
+        self.paused = False
+        self.uncommitted = 0  # 已交给输出缓冲区、尚未写回输出目录的输出数
+        self.on_all_committed = None  # when_committed() 登记的回调
+        self.write_back_failed = False  # 有输出没能从缓冲区写回输出目录
+
+    def run(self):
+        """执行转换，返回 (是否成功, 结果说明)"""
+        try:
+            if any(fmt not in OUTPUT_FORMATS for fmt, _ in self.outputs):
+                return False, "不支持的转换类型"
+            success = self.convert()
+
+            if self.cancelled:
+                return False, "已取消"
+            if self.outcome == "duplicate":
+                return True, f"与 {os.path.basename(self.duplicate_of)} 内容相同，跳过转换"
+            if len(self.keys) > 1:
+                return success, self.summary(success)
+            if success:
+                return True, self.OUTCOME_MESSAGES[self.outcome]
+            return False, "转换失败"
+        except Exception as e:
+            return False, f"转换出错: {str(e)}"
+
+    def output_path(self, fmt, quality, track=None):
+        """输出文件路径；同一格式有多个音质时，除第一个外文件名中加上音质，
+        多音轨模式下加上音轨说明（文件名模板已包含这些字段时除外）"""
+        if (fmt, quality, track) in self.resolved:
+            return self.resolved[(fmt, quality, track)]
+        label = self.track_label(track) if track is not None else ""
+        if self.layout is None:
+            name = Path(self.video_path).stem
+        else:
+            name = self.layout.file_name(self.video_path, fmt, quality, label)
+        if ((fmt, quality) != next(output for output in self.outputs if output[0] == fmt) and
+                (self.layout is None or "{quality}" not in self.layout.template)):
+            name = f"{name}.{quality}"
+        if track is not None and (self.layout is None or "{track}" not in self.layout.template):
+            name = f"{name}.{label}"
+        return os.path.join(self.output_dir, name + OUTPUT_FORMATS[fmt][1])
+
+    def audio_stream(self, track):
+        """第 track 个音频流的媒体信息（序号从0开始）"""
+        streams = self.media_info.get("audio_streams", [])
+        return streams[track] if track is not None and track < len(streams) else {}
+
+    def track_label(self, track):
+        """音轨在文件名中的说明：序号（从1开始）、语言和标题"""
+        from output_layout import safe_file_name
+
+        stream = self.audio_stream(track)
+        parts = [str(track + 1)] + [stream[key] for key in ("language", "title") if stream.get(key)]
+        return safe_file_name("-".join(parts))
+
+    def output_keys(self):
+        """要写出的 (格式, 音质, 音轨) 列表；多音轨模式下先读取媒体信息，按选中的音轨展开
+
+        每个选中的音轨、每个输出格式各写一个文件，仍然只读取一次源文件；是否直接复制按每个音轨的编码分别决定。
+        """
+        if self.tracks is None:
+            return self.keys
+        self.probe()
+        tracks = select_tracks(self.media_info.get("audio_streams", []), self.tracks)
+        self.keys = [(fmt, quality, track) for track in tracks for fmt, quality in self.outputs]
+        return self.keys
+
+    def convert(self):
+        """转换全部输出：命中缓存的输出直接跳过，其余输出一次解码同时编码"""
+        try:
+            keys = self.output_keys()
+            if not keys:
+                self.log(f"{Path(self.video_path).stem}: 没有符合选择的音轨", LOG_ERROR)
+                return False
+            targets = []
+            for fmt, quality, track in keys:
+                output_path = self.output_path(fmt, quality, track)
+                lookup = self.cache_lookup(fmt, quality, track)
+                if self.layout is not None:
+                    claimed = self.layout.claim(output_path, self.video_path,
+                                                lambda path: lookup(path) == os.path.abspath(path))
+                    if claimed is None:
+                        self.log(f"{os.path.basename(output_path)}: 输出文件已存在，跳过")
+                        self.results[output_path] = "exists"
+                        continue
+                    output_path = self.resolved[(fmt, quality, track)] = claimed
+                cached = lookup(output_path)
+                if cached is not None and cached == os.path.abspath(output_path):
+                    self.log(f"{os.path.basename(output_path)}: 输出已是最新，跳过")
+                    self.results[output_path] = "cached"
+                    continue
+                if cached is not None:
+                    try:
+                        self.reuse_cached_output(fmt, quality, cached, output_path, track)
+                        self.results[output_path] = "reused"
+                        continue
+                    except Exception as e:
+                        self.log(f"转换缓存不可用: {str(e)}", LOG_WARNING)
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                targets.append((fmt, quality, output_path, track))
+
+            if targets:
+                if self.tracks is None:
+                    self.probe()
+                self.on_duration(self.duration)
+                targets = [(fmt, quality, path, self.fast_mode and self.can_stream_copy(fmt, quality, track), track)
+                           for fmt, quality, path, track in targets]
+                self.stream_copy = all(target[3] for target in targets)
+                if self.staging is not None:
+                    self.input_path = self.staging.acquire(self.video_path)
+                    if self.input_path != self.video_path:
+                        self.log(f"{Path(self.video_path).stem}: 从本地暂存副本读取")
+                started = time.monotonic()
+                try:
+                    if self.processing is not None and self.processing.loudnorm:
+                        self.measured = self.loudness_measurement(
+                            list(dict.fromkeys(target[4] for target in targets)))
+                        started = time.monotonic()
+                    if not self.cancelled:
+                        self.encode(targets)
+                finally:
+                    self.encode_time = time.monotonic() - started
+                    if self.staging is not None:
+                        self.staging.release(self.video_path)
+            elif self.sidecars is not None and not self.cancelled:
+                self.existing_sidecars(self.output_path(*keys[0]))
+
+            self.outcome = self.overall_outcome()
+            if self.sidecars is not None and self.outcome != "duplicate" and "failed" in self.results.values():
+                # 失败的文件不作为判断重复的依据
+                self.sidecars.index.discard(self.video_path)
+            return all(result != "failed" for result in self.results.values())
+
+        except Exception as e:
+            self.log(f"转换出错: {str(e)}", LOG_ERROR)
+            return False
+
+    def encode(self, targets):
+        """用一次ffmpeg调用写出全部目标，记录每个输出的结果
+
+        各输出先写入临时文件，成功后再原子重命名为最终文件名。
+        多个目标一起失败时（例如某个编码器不可用）逐个重试，不让一个输出拖累其他输出。
+        """
+        video_name = Path(self.video_path).stem
+        if len(targets) == 1:
+            fmt, _, _, copy, _ = targets[0]
+            if copy:
+                self.log(f"{video_name}: 音频已是{fmt.upper()}，直接复制音轨（快速模式）")
+            else:
+                self.log(f"{video_name}: 正在转换{fmt.upper()}（重新编码）...")
+        else:
+            names = "、".join(os.path.basename(target[2]) for target in targets)
+            self.log(f"{video_name}: 一次解码输出 {len(targets)} 个文件: {names}")
+
+        plan = self.segment_plan(targets) if self.segments > 1 else None
+        tap = None
+        if plan:
+            returncode, stderr = self.run_segments(targets, *plan)
+            if returncode != 0 and not self.cancelled:
+                self.log(f"{video_name}: 分段编码失败，改为单进程转换", LOG_WARNING)
+                returncode, stderr = self.run_ffmpeg(self.build_command(targets))
+        else:
+            tap = self.open_tap()
+            try:
+                returncode, stderr = self.run_ffmpeg(self.build_command(targets, tap))
+            finally:
+                if tap is not None:
+                    tap.close()
+        self.exit_code = returncode
+
+        if self.cancelled:
+            for _, _, output_path, _, _ in targets:
+                self.remove_partial(output_path)
+                self.results[output_path] = "cancelled"
+            return
+        if tap is not None and returncode == 0 and not self.duplicate_checked:
+            # 文件比比较长度短（或时长未知）时读完才比较；已经编码完成，同样不写输出
+            self.check_duplicate(tap.reducer, force=True)
+        if self.duplicate_of is not None:
+            for _, _, output_path, _, _ in targets:
+                self.remove_partial(output_path)
+                self.results[output_path] = "duplicate"
+            return
+        if returncode != 0 and len(targets) > 1:
+            self.log(f"{video_name}: 多路输出失败，改为逐个输出重试", LOG_WARNING)
+            for target in targets:
+                self.encode([target])
+            return
+
+        if returncode != 0:
+            error = self.error_summary(returncode, stderr)
+        for fmt, quality, output_path, copy, track in targets:
+            if returncode != 0:
+                self.remove_partial(output_path)
+                self.results[output_path] = "failed"
+                self.log(f"{os.path.basename(output_path)}: {fmt.upper()}转换失败（{error}）", LOG_ERROR)
+                continue
+            try:
+                self.commit_output(output_path, lambda fmt=fmt, quality=quality, output_path=output_path, track=track:
+                                   self.record_output(fmt, quality, output_path, track))
+            except OSError as e:
+                self.remove_partial(output_path)
+                self.results[output_path] = "failed"
+                self.log(f"{os.path.basename(output_path)}: 写入输出失败: {str(e)}", LOG_ERROR)
+                continue
+            self.results[output_path] = "copy" if copy else "encode"
+            self.log(f"{os.path.basename(output_path)}: {fmt.upper()}转换完成")
+        if tap is not None and returncode == 0:
+            self.finish_sidecars(tap, targets[0][2])
+
+    def open_tap(self):
+        """需要生成附属文件或判断重复时，开始接收额外输出的PCM流；不需要时返回None"""
+        if self.sidecars is None or self.sidecars_written:
+            return None
+        if not (self.sidecars.writes_files or self.sidecars.skip_duplicates):
+            return None
+        from audio_sidecars import PcmReducer, PcmTap
+
+        return PcmTap(PcmReducer(self.sidecars.samples_per_pixel),
+                      self.check_duplicate if self.sidecars.skip_duplicates else None)
+
+    def tap_filters(self):
+        """PCM输出使用与音频输出相同的处理，波形的时间轴与输出一致"""
+        if self.processing is None:
+            return ""
+        return self.processing.filter_chain(self.measured.get(None), self.media_info.get("sample_rate", 0))
+
+    def check_duplicate(self, reducer, force=False):
+        """读完开头（force 为True时不论长度）后在批量的指纹索引中查找内容相同的文件，找到时停止ffmpeg"""
+        from audio_sidecars import match_frames
+
+        if self.duplicate_checked or not self.sidecars.skip_duplicates:
+            return
+        if not force and reducer.frames < match_frames(self.duration):
+            return
+        self.duplicate_checked = True
+        if not reducer.frames:
+            return
+        match = self.sidecars.index.check(self.video_path, reducer.fingerprint(), self.duration)
+        if match is not None:
+            self.duplicate_of = match
+            self.log(f"{Path(self.video_path).stem}: 内容与 {os.path.basename(match)} 相同，跳过", LOG_WARNING)
+            self.stop_processes()
+
+    def finish_sidecars(self, tap, output_path):
+        """写出附属文件；PCM读取或计算出错时只给出警告，不影响音频输出"""
+        if tap.error is not None or not tap.connected:
+            self.log(f"{os.path.basename(output_path)}: 附属文件生成失败: {tap.error or '没有收到音频数据'}",
+                     LOG_WARNING)
+            return
+        self.sidecars_written = True
+        if not self.sidecars.writes_files:
+            return
+        from audio_sidecars import write_sidecars
+
+        try:
+            write_sidecars(tap.reducer, output_path, self.sidecars.waveform, self.sidecars.fingerprint)
+        except OSError as e:
+            self.log(f"{os.path.basename(output_path)}: 附属文件写入失败: {str(e)}", LOG_WARNING)
+
+    def existing_sidecars(self, output_path):
+        """输出都不需要重新转换时：附属文件已存在则把指纹登记到批量索引，缺少时只解码一次补上"""
+        from audio_sidecars import read_fingerprint, sidecar_paths
+
+        if not os.path.exists(output_path):
+            return
+        if not self.media_info:
+            self.probe()
+        paths = [path for enabled, path in zip((self.sidecars.waveform, self.sidecars.fingerprint),
+                                               sidecar_paths(output_path)) if enabled]
+        if not paths:
+            # 只判断重复、不写附属文件时，不为已有输出单独解码（相同内容的新文件由转换缓存复用结果）
+            return
+        if all(os.path.exists(path) for path in paths):
+            existing = read_fingerprint(output_path) if self.sidecars.skip_duplicates else None
+            if existing is not None:
+                self.sidecars.index.check(self.video_path, existing[0], self.duration)
+            return
+        tap = self.open_tap()
+        self.duplicate_checked = True  # 输出已存在，不再按重复跳过
+        try:
+            returncode, _ = self.run_ffmpeg([self.ffmpeg_path, "-y", "-i", self.input_path] +
+                                            tap.output_args(self.tap_filters()))
+        finally:
+            tap.close()
+        if returncode == 0 and not self.cancelled:
+            self.finish_sidecars(tap, output_path)
+            if self.sidecars.skip_duplicates and tap.reducer.frames:
+                self.sidecars.index.check(self.video_path, tap.reducer.fingerprint(), self.duration)
+            self.log(f"{os.path.basename(output_path)}: 已补上附属文件")
+
+    def loudness_measurement(self, tracks=(None,)):
+        """loudnorm 第一遍的测量值，返回 {音轨: 测量值}
+
+        先取后台分析（只分析默认音轨）和元数据缓存中的结果，缺少的音轨在本任务中用一次读取一起分析。
+        """
+        from audio_processing import parse_loudnorm_output
+
+        started = time.monotonic()
+        measured = {}
+        if self.analyzer is not None and None in tracks:
+            measured[None] = self.analyzer.take(self.video_path)
+        for track in tracks:
+            if measured.get(track) is None and self.metadata_cache is not None:
+                try:
+                    measured[track] = self.metadata_cache.get_analysis(
+                        self.video_path, self.processing.analysis_key(track))
+                except Exception:
+                    measured[track] = None
+        missing = [track for track in tracks if measured.get(track) is None]
+        if missing:
+            self.log(f"{Path(self.video_path).stem}: 第一遍响度分析...")
+            track_numbers = [track for track in missing if track is not None]
+            returncode, stderr = self.run_ffmpeg(
+                self.processing.analysis_command(self.ffmpeg_path, self.input_path, track_numbers))
+            results = parse_loudnorm_output(stderr) if returncode == 0 else []
+            for track, result in zip(missing, results):
+                measured[track] = result
+                if result is not None and self.metadata_cache is not None:
+                    try:
+                        self.metadata_cache.put_analysis(self.video_path, self.processing.analysis_key(track), result)
+                    except Exception:
+                        pass
+            self.analysis_time = time.monotonic() - started
+        failed = [track for track in tracks if measured.get(track) is None]
+        if failed and not self.cancelled:
+            which = "" if failed == [None] else f"（音轨 {', '.join(str(track + 1) for track in failed)}）"
+            self.log(f"{Path(self.video_path).stem}: 响度分析失败{which}，改用单遍响度标准化", LOG_WARNING)
+        return measured
+
+    def record_output(self, fmt, quality, output_path, track=None):
+        """输出已写到最终位置，记入转换缓存"""
+        if self.cache is not None:
+            try:
+                self.cache.record(self.video_path, self.cache_settings(fmt, quality, track), output_path)
+            except Exception as e:
+                self.log(f"转换缓存写入失败: {str(e)}", LOG_WARNING)
+
+    def log(self, text, level=LOG_INFO):
+        self.on_status(text, level)
+
+    def error_summary(self, returncode, stderr):
+        """ffmpeg失败的简短说明；设置了 log_dir 时把完整错误输出写入日志文件并附上路径"""
+        lines = [line.strip() for line in stderr.splitlines() if line.strip()]
+        summary = f"退出码 {returncode}" + (f": {lines[-1]}" if lines else "")
+        if not self.log_dir:
+            return summary
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            prefix = f"{Path(self.video_path).stem}-{time.strftime('%Y%m%d-%H%M%S')}-"
+            fd, log_path = tempfile.mkstemp(prefix=prefix, suffix=".log", dir=self.log_dir)
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(f"输入: {self.video_path}\n退出码: {returncode}\n\n{stderr}")
+        except OSError:
+            return summary
+        return f"{summary}；完整输出见 {log_path}"
+
+    def partial_path(self, output_path):
+        """输出写入中的临时文件：通常与输出文件在同一目录，使用输出缓冲区或输出目录需要暂存时写在本地"""
+        if output_path not in self.partials:
+            if self.spool is not None:
+                self.partials[output_path] = self.spool.scratch_path(output_path)
+            elif self.staging is not None and self.staging.should_stage(output_path):
+                self.partials[output_path] = self.staging.scratch_path(output_path)
+            else:
+                self.partials[output_path] = output_path + PARTIAL_SUFFIX
+        return self.partials[output_path]
+
+    def commit_output(self, output_path, on_committed=_noop):
+        """临时文件写完后改名为最终文件（在本地暂存区时整块复制回输出目录）
+
+        输出在缓冲区中时交给缓冲区稍后写回；on_committed 在文件到达最终位置后调用。
+        """
+        partial_path = self.partial_path(output_path)
+        if self.spool is not None:
+            with self.process_lock:
+                self.uncommitted += 1
+            try:
+                self.spool.commit(partial_path, output_path, lambda: self.output_committed(on_committed),
+                                  lambda: self.output_committed(_noop, lost=True))
+            except OSError:
+                self.output_committed(_noop)
+                raise
+            return
+        if partial_path == output_path + PARTIAL_SUFFIX:
+            os.replace(partial_path, output_path)
+        else:
+            self.staging.write_back(partial_path, output_path)
+        on_committed()
+
+    def output_committed(self, on_committed, lost=False):
+        """缓冲区中的一个输出已写回输出目录、写回失败（lost）或没能交给缓冲区"""
+        try:
+            on_committed()
+        finally:
+            with self.process_lock:
+                self.uncommitted -= 1
+                self.write_back_failed = self.write_back_failed or lost
+                callback = self.on_all_committed if not self.uncommitted else None
+                if callback is not None:
+                    self.on_all_committed = None
+            if callback is not None:
+                callback(not self.write_back_failed)
+
+    def when_committed(self, callback):
+        """缓冲区中的输出全部写回（或写回失败）后调用 callback(是否全部到达最终位置)
+
+        没有等待写回的输出时立即调用，否则在缓冲区的写回线程中调用。
+        """
+        with self.process_lock:
+            if self.uncommitted:
+                self.on_all_committed = callback
+                return
+        callback(not self.write_back_failed)
+
+    def remove_partial(self, output_path):
+        """删除失败转换留下的临时文件"""
+        try:
+            os.remove(self.partial_path(output_path))
+        except OSError:
+            pass
+
+    def overall_outcome(self):
+        """汇总各输出的结果：全部命中缓存才算 cached，有任何重新编码即为 encode"""
+        outcomes = set(self.results.values())
+        if "duplicate" in outcomes:
+            return "duplicate"
+        if outcomes == {"exists"}:
+            return "exists"
+        if outcomes <= {"cached", "exists"}:
+            return "cached"
+        if outcomes <= {"cached", "reused", "exists"}:
+            return "reused"
+        return "encode" if "encode" in outcomes else "copy"
+
+    def summary(self, success):
+        """多个输出时的结果说明，逐个列出每个输出的状态"""
+        parts = []
+        for fmt, quality, track in self.keys:
+            path = self.output_path(fmt, quality, track)
+            parts.append(f"{os.path.basename(path)} {self.OUTPUT_LABELS[self.results.get(path, 'failed')]}")
+        return ("转换完成: " if success else "部分输出失败: ") + "，".join(parts)
+
+    def probe(self):
+        """读取媒体信息（时长、音频编码等），有元数据缓存时优先使用缓存"""
+        from media_probe import probe_media
+
+        started = time.monotonic()
+        info = None
+        if self.metadata_cache is not None:
+            info = self.metadata_cache.probe(self.ffprobe_path, self.video_path)
+        else:
+            info = probe_media(self.ffprobe_path, self.video_path)
+        self.probe_time = time.monotonic() - started
+        self.media_info = info or {}
+        self.duration = self.media_info.get("duration", 0.0)
+        self.audio_codec = self.media_info.get("audio_codec", "")
+
+    def cache_settings(self, fmt, quality, track=None):
+        """转换缓存的设置键：设置或ffmpeg版本变化后，旧结果不再复用"""
+        settings = f"{fmt}|{quality}|fast={int(self.fast_mode)}|{ffmpeg_version(self.ffmpeg_path)}"
+        if self.processing is not None:
+            settings += f"|{self.processing.cache_key()}"
+        if track is not None:
+            settings += f"|track={track}"
+        return settings
+
+    def cache_lookup(self, fmt, quality, track=None):
+        """返回 lookup(输出路径)：转换缓存中该源文件可复用的输出（优先为该路径本身），结果按路径记住"""
+        settings = self.cache_settings(fmt, quality, track) if self.cache is not None else None
+        results = {}
+
+        def lookup(path):
+            if path not in results:
+                results[path] = None
+                if self.cache is not None:
+                    try:
+                        results[path] = self.cache.lookup(self.video_path, settings, path)
+                    except Exception as e:
+                        # 缓存只是加速手段，出错时照常转换
+                        self.log(f"转换缓存不可用: {str(e)}", LOG_WARNING)
+            return results[path]
+        return lookup
+
+    def outputs_cached(self):
+        """转换缓存是否已能满足全部输出（已是最新或可复用），即不需要解码源文件
+
+        只用于提前判断（如后台响度分析跳过这样的文件），不确定输出路径；按音轨输出时按不满足计。
+        """
+        if self.cache is None or self.tracks is not None:
+            return False
+        return all(self.cache_lookup(fmt, quality, track)(self.output_path(fmt, quality, track)) is not None
+                   for fmt, quality, track in self.keys)
+
+    def reuse_cached_output(self, fmt, quality, cached, output_path, track=None):
+        """相同内容曾在其他路径转换过，直接链接/复制已有结果"""
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self.cache.materialize(cached, output_path)
+        self.cache.record(self.video_path, self.cache_settings(fmt, quality, track), output_path)
+        self.log(f"{os.path.basename(output_path)}: 复用已有结果 {cached}")
+
+    def build_command(self, targets, tap=None):
+        """构建ffmpeg命令：一个输入，每个目标一组输出参数，写入临时文件；tap 不为None时再加一路PCM输出"""
+        cmd = [self.ffmpeg_path, "-y", "-i", self.input_path]
+        for fmt, quality, output_path, copy, track in targets:
+            cmd += self.output_args(fmt, quality, copy, track) + ["-f", OUTPUT_FORMATS[fmt][4],
+                                                                  self.partial_path(output_path)]
+        if tap is not None:
+            cmd += tap.output_args(self.tap_filters())
+        return cmd
+
+    def output_args(self, fmt, quality, copy=False, track=None):
+        """单个输出的编码参数；track 为音频流序号时只输出该音轨，并保留其语言标记
+
+        不指定音轨时固定使用第一个音频流（而不是ffmpeg默认选择的“最佳”流），
+        同一任务的各个输出、是否直接复制的判断和响度分析都基于同一个流。
+        """
+        args = ["-vn", "-map", f"0:a:{track or 0}"]
+        if track is not None:
+            language = self.audio_stream(track).get("language")
+            if language:
+                args += ["-metadata:s:a:0", f"language={language}"]
+        if copy:
+            # 源音频编码与目标相同：只做重新封装，不解码也不编码
+            return args + ["-c:a", "copy"]
+        encoder, _, _, original_args, _ = OUTPUT_FORMATS[fmt]
+        if self.processing is not None:
+            sample_rate = (self.audio_stream(track) if track is not None else self.media_info).get("sample_rate", 0)
+            args += ["-af", self.processing.filter_chain(self.measured.get(track), sample_rate)]
+        if quality == "original" or fmt in LOSSLESS_FORMATS:
+            # 保持原音质（无损格式不需要码率）
+            return args + ["-c:a", encoder] + original_args
+        # 指定比特率
+        return args + ["-c:a", encoder, "-b:a", quality]
+
+    def can_stream_copy(self, fmt="mp3", quality=None, track=None):
+        """源音频编码与目标格式相同且不高于目标比特率时，可以直接复制音轨（需要处理音频时不能复制）
+
+        track 为音频流序号时按该音轨自己的编码和码率判断。
+        """
+        info = self.media_info
+        if track is not None:
+            stream = self.audio_stream(track)
+            info = {"audio_codec": stream.get("codec", ""), "bit_rate": stream.get("bit_rate", 0)}
+        return self.processing is None and can_stream_copy(info, fmt, quality or self.quality)
+
+    def segment_plan(self, targets):
+        """分段并行编码的切分方案，不适用时返回None
+
+        返回 (各段起点, 重叠采样数, 输入采样率, {格式: (每帧采样数, 输出采样率)})，位置均以输入采样计。
+        切分点同时落在所有目标格式的帧边界上，各段编码出的帧与整段编码时一一对应。
+        """
+        rate = self.media_info.get("sample_rate", 0)
+        count = min(self.segments, int(self.duration // SEGMENT_MIN_SECONDS))
+        # 静音裁剪会改变时间轴，单遍响度标准化依赖整段的历史，都不能分段编码；按音轨输出时一次读取更划算
+        # 附属文件需要按顺序读到整段PCM
+        if self.processing is not None or self.tracks is not None or self.sidecars is not None:
+            return None
+        if count < 2 or not rate or any(target[3] for target in targets):
+            return None
+        if not sample_exact_time_base(self.media_info.get("audio_time_base", ""), rate):
+            return None
+        frames = {}
+        step = 1
+        for fmt, *_ in targets:
+            frame = segment_frame(fmt, rate)
+            if frame is None:
+                return None
+            frames[fmt] = frame
+            # 一帧对应的输入采样数可能不是整数（如44.1kHz转48kHz），取能整除的最小帧数
+            frame_input = Fraction(frame[0] * rate, frame[1]).numerator
+            step = step * frame_input // math.gcd(step, frame_input)
+        overlap = max(Fraction(size * rate, out_rate) for size, out_rate in frames.values())
+        overlap = math.ceil(overlap * SEGMENT_OVERLAP_FRAMES / step) * step
+        length = int(self.duration * rate) // count // step * step
+        return [i * length for i in range(count)], overlap, rate, frames
+
+    def run_segments(self, targets, starts, overlap, rate, frames):
+        """分段并行编码，再用concat分离器按目标拼接，返回 (退出码, 错误输出)
+
+        每段向前、向后多编码 overlap 个采样，让编码器在切分点处已经预热；
+        多出的帧由 noise 比特流过滤器按帧序号丢弃，拼接时只做复制，不再重新编码。
+        MP3 关闭比特池，使每帧数据都在本帧内，拼接处不会引用另一段的数据。
+        同时统计源文件的采样数，拼接后的输出长度不一致时（定位不准，如时间戳带有毫秒级的起始偏移）返回失败，
+        由调用方改为单进程转换。
+        """
+        video_name = Path(self.video_path).stem
+        self.log(f"{video_name}: 分 {len(starts)} 段并行编码")
+        audio_start = self.media_info.get("audio_start", 0.0)
+        # 各段的中间文件与输出的临时文件放在同一位置（输出目录或本地暂存区）
+        workdir = tempfile.mkdtemp(prefix=".segments-", dir=os.path.dirname(self.partial_path(targets[0][2])))
+        try:
+            commands = []
+            for i, start in enumerate(starts):
+                begin = start - overlap if i else 0
+                end = starts[i + 1] if i + 1 < len(starts) else None
+                cmd = [self.ffmpeg_path, "-y"]
+                if begin:
+                    cmd += ["-ss", f"{audio_start + begin / rate:.6f}"]
+                if end is not None:
+                    cmd += ["-t", f"{(end + overlap - begin) / rate:.6f}"]
+                cmd += ["-i", self.input_path]
+                for fmt, quality, *_ in targets:
+                    size, out_rate = frames[fmt]
+                    # 保留的帧：从本段起点到下一段起点（按帧序号）
+                    drop = f"lt(n\\,{(start - begin) * out_rate // (size * rate)})"
+                    if end is not None:
+                        drop += f"+gte(n\\,{(end - begin) * out_rate // (size * rate)})"
+                    cmd += self.output_args(fmt, quality)
+                    if fmt == "mp3":
+                        cmd += ["-reservoir", "0"]
+                    cmd += ["-bsf:a", f"noise=drop={drop}", "-f", OUTPUT_FORMATS[fmt][4],
+                            os.path.join(workdir, f"{fmt}-{quality}-{i}")]
+                commands.append(cmd)
+
+            # 汇总各段进度：已处理时长和速度倍率分别相加
+            progress = [(0.0, 0.0)] * len(commands)
+            progress_lock = threading.Lock()
+            last_report = [0.0]
+
+            def on_segment_progress(i, out_time, speed, done):
+                with progress_lock:
+                    progress[i] = (out_time, speed)
+                    now = time.monotonic()
+                    if now - last_report[0] < self.PROGRESS_INTERVAL:
+                        return
+                    last_report[0] = now
+                    total = [sum(values) for values in zip(*progress)]
+                self.report_progress(total[0], total[1], False)
+
+            results = [None] * len(commands)
+            source_samples = []
+
+            def run_segment(i):
+                results[i] = self.run_ffmpeg(commands[i], functools.partial(on_segment_progress, i))
+
+            threads = [threading.Thread(target=run_segment, args=(i,), daemon=True) for i in range(len(commands))]
+            # 只解码不编码，与各段同时进行
+            threads.append(threading.Thread(target=lambda: source_samples.append(self.count_samples(self.input_path)),
+                                            daemon=True))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for returncode, stderr in results:
+                if returncode != 0:
+                    return returncode, stderr
+
+            for fmt, quality, output_path, *_ in targets:
+                list_path = os.path.join(workdir, f"{fmt}-{quality}.txt")
+                lines = []
+                for i, start in enumerate(starts):
+                    lines.append(f"file '{fmt}-{quality}-{i}'")
+                    if fmt == "aac" and i == 0:
+                        # 保留第一段开头的编码器延迟帧，播放器据此跳过前置静音
+                        lines.append(f"inpoint -{AAC_PRIMING_SAMPLES / frames[fmt][1]:.6f}")
+                    if i + 1 < len(starts):
+                        lines.append(f"duration {(starts[i + 1] - start) / rate:.6f}")
+                with open(list_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                cmd = [self.ffmpeg_path, "-y", "-f", "concat", "-i", list_path, "-c", "copy"]
+                if fmt == "aac":
+                    cmd += ["-output_ts_offset", f"-{AAC_PRIMING_SAMPLES / frames[fmt][1]:.6f}"]
+                cmd += ["-f", OUTPUT_FORMATS[fmt][4], self.partial_path(output_path)]
+                returncode, stderr = self.run_ffmpeg(cmd, _noop)
+                if returncode != 0:
+                    return returncode, stderr
+                # 重采样的输出（如Opus）按比例换算，允许取整带来的1个采样误差
+                out_rate = frames[fmt][1]
+                joined = self.count_samples(self.partial_path(output_path))
+                if source_samples[0] is None or joined is None:
+                    return 1, "无法统计分段拼接后的采样数"
+                difference = joined - Fraction(source_samples[0] * out_rate, rate)
+                if abs(difference) > (0 if out_rate == rate else 1):
+                    self.log(f"{video_name}: {fmt.upper()}分段拼接后比源文件{'长' if difference > 0 else '短'} "
+                             f"{abs(float(difference)):g} 个采样", LOG_WARNING)
+                    return 1, "分段拼接后的长度与源文件不一致"
+            self.report_progress(self.duration, 0.0, True)
+            return 0, ""
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def count_samples(self, path):
+        """解码 path 中（与转换相同的）音频流，返回每声道的采样数；失败或被取消时返回None"""
+        returncode, stderr = self.run_ffmpeg([self.ffmpeg_path, "-y", "-i", path, "-vn", "-af", SAMPLE_COUNT_FILTER,
+                                              "-f", "null", "-"], _noop)
+        counts = _SAMPLE_COUNT.findall(stderr) if returncode == 0 else []
+        return int(counts[-1]) if counts else None
+
+    def cancel(self):
+        """取消转换：先向ffmpeg的stdin写入 q 让它正常退出，超时后强制结束
+
+        可以在任意线程调用，立即返回。
+        """
+        with self.process_lock:
+            self.cancelled = True
+        self.stop_processes()
+
+    def stop_processes(self):
+        """让运行中的ffmpeg正常退出，超时后强制结束（跳过重复内容时使用，不记为取消）"""
+        with self.process_lock:
+            processes = list(self.processes)
+            if self.paused:
+                for process in processes:
+                    resume_process(process)
+        for process in processes:
+            try:
+                process.stdin.write("q")
+                process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            threading.Thread(target=self._kill_after_timeout, args=(process,), daemon=True).start()
+
+    @staticmethod
+    def _kill_after_timeout(process):
+        try:
+            process.wait(timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def pause(self):
+        """暂停转换（暂停ffmpeg进程本身，不占用CPU）"""
+        with self.process_lock:
+            if self.paused or self.cancelled:
+                return
+            self.paused = True
+            for process in self.processes:
+                suspend_process(process)
+
+    def resume(self):
+        """继续已暂停的转换"""
+        with self.process_lock:
+            if not self.paused:
+                return
+            self.paused = False
+            for process in self.processes:
+                resume_process(process)
+
+    def run_ffmpeg(self, cmd, on_progress=None):
+        """运行ffmpeg并解析 -progress 输出流，返回 (退出码, 错误输出)
+
+        on_progress(已处理秒数, 速度倍率, 是否结束) 默认为 report_progress。
+        """
+        on_progress = on_progress or self.report_progress
+        # -progress 输出 key=value 行，每个进度块以 progress=continue/end 结束
+        cmd = cmd[:1] + ["-nostats", "-progress", "pipe:1"] + cmd[1:]
+        with self.process_lock:
+            if self.cancelled:
+                return -1, "已取消"
+            # stdin 保持为管道：取消时写入 q 让ffmpeg正常收尾
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+            _live_processes.add(process)
+            self.processes.append(process)
+            if self.paused:
+                suspend_process(process)
+
+        # 单独线程读取stderr，防止管道写满导致ffmpeg阻塞
+        stderr_lines = deque(maxlen=200)
+        stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+        stderr_thread.start()
+
+        block = {}
+        last_report = 0.0
+        peak_rss = 0
+        for line in process.stdout:
+            key, sep, value = line.strip().partition("=")
+            if not sep:
+                continue
+            if key != "progress":
+                block[key] = value
+                continue
+
+            # 每个进度块（约0.5秒）采样一次峰值内存，最后一块在进程退出前输出
+            peak_rss = max(peak_rss, process_peak_rss(process))
+            now = time.monotonic()
+            if value != "end" and now - last_report < self.PROGRESS_INTERVAL:
+                continue
+            last_report = now
+            try:
+                out_time = int(block.get("out_time_us", "0")) / 1000000
+            except ValueError:
+                out_time = 0.0
+            try:
+                speed = float(block.get("speed", "0").rstrip("x"))
+            except ValueError:
+                speed = 0.0
+            on_progress(out_time, speed, value == "end")
+
+        process.wait()
+        stderr_thread.join()
+        if sys.platform == "win32":
+            peak_rss = max(peak_rss, process_peak_rss(process))
+        with self.process_lock:
+            self.processes.remove(process)
+            self.peak_rss = max(self.peak_rss, peak_rss)
+        process.stdin.close()
+        return process.returncode, "".join(stderr_lines)
+
+    def report_progress(self, out_time, speed, done):
+        """根据已处理时长和速度回调进度和剩余时间"""
+        if done:
+            out_time = max(out_time, self.duration)
+        if self.duration > 0:
+            percent = min(100, int(out_time * 100 / self.duration))
+            eta = max(0.0, self.duration - out_time) / speed if speed > 0 else -1.0
+        else:
+            percent = 100 if done else 0
+            eta = -1.0
+
+        self.speed = 0.0 if done else speed
+        self.on_progress(percent, out_time, speed, eta)
+
+
+class ConversionJob:
+    """批量转换中的单个任务"""
+
+    __slots__ = ("index", "video_path", "output_dir", "conversion_type", "quality", "duration", "outputs",
+                 "cpu_bound", "device", "submitted")
+
+    def __init__(self, index, video_path, output_dir, conversion_type, quality="original", duration=0.0,
+                 outputs=None, cpu_bound=True):
+        self.index = index
+        self.video_path = video_path
+        self.output_dir = output_dir
+        self.conversion_type = conversion_type
+        self.quality = quality
+        self.duration = duration  # 预读得到的媒体时长，0 表示未知
+        self.outputs = outputs  # 多个输出时的 (格式, 音质) 列表，一次解码全部写出
+        # 是否需要重新编码；预读到媒体信息、确定全部输出都能直接复制音轨时为False，不占用CPU槽位
+        self.cpu_bound = cpu_bound
+        self.device = None  # 源文件所在的存储设备，提交到调度器时检测
+        self.submitted = 0.0  # 提交到调度器的时间（time.monotonic），用于统计排队等待
+
+
+class JobScheduler:
+    """批量任务调度器
+
+    固定数量的工作槽 + 队列：只有在有空闲槽位时才派发新任务，
+    因此同时运行的ffmpeg进程数不会超过 max_workers，与批量大小无关。
+    launch 回调负责真正启动任务，任务结束后必须调用 job_done(job)。
+    longest_first 为True时按媒体时长从长到短派发（时长未知的任务排在最后），
+    长任务先开始可以减少批量末尾只剩一两个长任务在跑的情况。
+
+    任务按源文件所在的存储设备（挂载点）分别排队，每个设备有自己的并发上限，
+    机械硬盘和网络共享不会同时被大量随机读取；device_limits 为 {挂载点: 上限}，
+    未指定的设备按类型取默认值（0 或 None 表示不单独限制）。
+    需要重新编码的任务（cpu_bound）另受 cpu_workers 限制，且不超过CPU核心数；
+    直接复制音轨的任务只占用读取槽位。
+    """
+
+    def __init__(self, launch, max_workers=None, longest_first=False, cpu_workers=None, device_limits=None):
+        self.launch = launch
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.cpu_workers = max(1, min(cpu_workers or self.max_workers, os.cpu_count() or 1))
+        self.longest_first = longest_first
+        self.device_limits = dict(device_limits or {})
+        # (挂载点, 是否需要CPU) -> 堆 [(排序键, 提交顺序, 任务)]；先进先出时排序键恒为0
+        self.queues = {}
+        self.devices = {}  # 挂载点 -> StorageDevice
+        self.device_running = {}  # 挂载点 -> 运行中的任务数
+        self.sequence = 0
+        self.pending = 0
+        self.running = 0
+        self.cpu_running = 0
+        self.paused = False
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        """加入队列，有空闲槽位时立即派发"""
+        if job.device is None:
+            job.device = device_for_path(job.video_path)
+        job.submitted = time.monotonic()
+        with self.lock:
+            self.devices.setdefault(job.device.mount, job.device)
+            priority = -job.duration if self.longest_first else 0
+            queue = self.queues.setdefault((job.device.mount, job.cpu_bound), [])
+            heapq.heappush(queue, (priority, self.sequence, job))
+            self.sequence += 1
+            self.pending += 1
+        self._dispatch()
+
+    def job_done(self, job):
+        """任务结束，释放槽位并派发下一个任务"""
+        with self.lock:
+            self.running = max(0, self.running - 1)
+            mount = job.device.mount
+            self.device_running[mount] = max(0, self.device_running.get(mount, 0) - 1)
+            if job.cpu_bound:
+                self.cpu_running = max(0, self.cpu_running - 1)
+        self._dispatch()
+
+    def clear(self):
+        """丢弃尚未派发的任务，返回被丢弃的任务列表"""
+        with self.lock:
+            jobs = self._pending_jobs()
+            self.queues.clear()
+            self.pending = 0
+        return jobs
+
+    def remove(self, index):
+        """从队列中移除任务编号为 index 的任务，返回被移除的任务列表"""
+        removed = []
+        with self.lock:
+            for key, queue in list(self.queues.items()):
+                kept = [entry for entry in queue if entry[2].index != index]
+                if len(kept) == len(queue):
+                    continue
+                removed += [entry[2] for entry in queue if entry[2].index == index]
+                heapq.heapify(kept)
+                self.queues[key] = kept
+            self.pending -= len(removed)
+        return removed
+
+    def pause(self):
+        """暂停派发新任务（运行中的任务不受影响）"""
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        """恢复派发"""
+        with self.lock:
+            self.paused = False
+        self._dispatch()
+
+    def device_limit(self, mount):
+        """设备的并发上限，None 表示不单独限制"""
+        if mount in self.device_limits:
+            return self.device_limits[mount] or None
+        device = self.devices.get(mount)
+        return device.default_jobs if device is not None else None
+
+    def set_device_limit(self, mount, limit):
+        """修改设备的并发上限（0 或 None 表示不限），立即按新上限派发"""
+        with self.lock:
+            self.device_limits[mount] = limit
+        self._dispatch()
+
+    def set_max_workers(self, max_workers):
+        """修改同时运行的任务数上限；减少时运行中的任务不受影响，结束后不再补上"""
+        with self.lock:
+            self.max_workers = max(1, max_workers)
+        self._dispatch()
+
+    def set_cpu_workers(self, cpu_workers):
+        """修改重新编码任务的并发上限"""
+        with self.lock:
+            self.cpu_workers = max(1, min(cpu_workers, os.cpu_count() or 1))
+        self._dispatch()
+
+    def device_stats(self):
+        """各设备的 (StorageDevice, 运行中任务数, 排队任务数)"""
+        with self.lock:
+            queued = {}
+            for (mount, _), queue in self.queues.items():
+                queued[mount] = queued.get(mount, 0) + len(queue)
+            return [(device, self.device_running.get(mount, 0), queued.get(mount, 0))
+                    for mount, device in self.devices.items()]
+
+    def load(self):
+        """(运行中任务数, 排队任务数)"""
+        with self.lock:
+            return self.running, self.pending
+
+    def upcoming(self, count):
+        """按派发顺序排在最前面的 count 个排队任务（不考虑槽位限制），用于提前准备输入文件"""
+        with self.lock:
+            heads = [_heap_smallest(queue, count) for queue in self.queues.values()]
+        entries = sorted((entry for head in heads for entry in head), key=lambda entry: entry[:2])
+        return [entry[2] for entry in entries[:count]]
+
+    def _pending_jobs(self):
+        return [entry[2] for queue in self.queues.values() for entry in queue]
+
+    def is_idle(self):
+        """队列为空且没有运行中的任务"""
+        with self.lock:
+            return self.running == 0 and not self.pending
+
+    def _dispatch(self):
+        # 在锁内只做出队，launch 在锁外调用，避免回调重入时死锁
+        while True:
+            with self.lock:
+                if self.paused or self.running >= self.max_workers or not self.pending:
+                    return
+                # 在当前可以派发的队列中，取排序最靠前的队首任务（设备数很少，逐个比较即可）
+                best = None
+                for (mount, cpu_bound), queue in self.queues.items():
+                    if not queue or (cpu_bound and self.cpu_running >= self.cpu_workers):
+                        continue
+                    limit = self.device_limit(mount)
+                    if limit and self.device_running.get(mount, 0) >= limit:
+                        continue
+                    if best is None or queue[0][:2] < best[0][:2]:
+                        best = queue
+                if best is None:
+                    return
+                job = heapq.heappop(best)[2]
+                self.pending -= 1
+                self.running += 1
+                self.device_running[job.device.mount] = self.device_running.get(job.device.mount, 0) + 1
+                if job.cpu_bound:
+                    self.cpu_running += 1
+            self.launch(job)
+
+
+class BatchRunner:
+    """无界面的批量转换循环
+
+    用普通线程执行 JobScheduler 派发的任务，run() 阻塞到全部任务结束；
+    图形界面不调用 run()，而是依次调用 start()、submit()、scan_finished()、finish()，并把回调转发为Qt信号。
+    converter_options 会原样传给 MediaConverter（ffmpeg_path、fast_mode 等）。
+    journal 为 batch_journal.BatchJournal 时记录每个任务的状态，用于中断后恢复；写入失败时停用日志，不影响转换。
+    使用输出缓冲区（converter_options 中的 spool）时，任务在输出写回输出目录后才记为完成。
+    converter_options 中的 staging（input_staging.StagingArea）会在每次派发后预读接下来的任务，
+    analyzer（audio_processing.LoudnessAnalyzer）同样提前分析接下来的任务。
+    metrics 为 conversion_metrics.MetricsRecorder 时记录每个任务的指标。
+    adaptive 为True时由 concurrency_control.ConcurrencyController 在 1 到 max_workers 之间自动调整并发数，
+    每次决定记入 metrics 并回调 on_concurrency(ConcurrencyDecision)。
+    submit() 可在批量进行中追加任务；同一文件在排队时不会重复加入，
+    正在转换时则等本次结束后再转换一次（文件在转换过程中被修改）。
+    其余回调均为可选：on_job_queued(job) 在任务进入队列时（包括重新转换），
+    on_job_started(job, converter) 在任务开始转换时，on_job_progress(job, 百分比, 已处理秒数, 速度倍率, 剩余秒数)
+    和 on_job_duration(job, 时长) 转发 MediaConverter 的同名回调，
+    on_job_committed(job, 是否写回成功) 在成功任务的输出全部到达最终位置后调用（总在 on_job_finished 之后）。
+    """
+
+    def __init__(self, max_workers=None, on_status=None, on_job_finished=None, longest_first=False,
+                 journal=None, cpu_workers=None, device_limits=None, metrics=None, adaptive=False,
+                 on_concurrency=None, on_job_queued=None, on_job_started=None, on_job_progress=None,
+                 on_job_duration=None, on_job_committed=None, **converter_options):
+        self.on_status = on_status or _noop
+        self.on_job_finished = on_job_finished or _noop
+        self.on_job_queued = on_job_queued or _noop
+        self.on_job_started = on_job_started or _noop
+        self.on_job_progress = on_job_progress or _noop
+        self.on_job_duration = on_job_duration or _noop
+        self.on_job_committed = on_job_committed or _noop
+        self.journal = journal
+        self.metrics = metrics
+        self.converter_options = converter_options
+        self.scheduler = JobScheduler(self._launch, max_workers, longest_first, cpu_workers, device_limits)
+        self.condition = threading.Condition()
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0  # 被取消而停止的任务数，不计入失败
+        self.converters = set()  # 运行中的转换，取消时逐个停止
+        self.active = {}  # 排队或转换中的源文件 -> 是否已开始转换
+        self.deferred = {}  # 转换中又被提交的源文件 -> 任务，本次结束后重新提交
+        self.dropped = set()  # 单独取消的运行中任务，日志中记为已取消，恢复时不再转换
+        self.launched = set()  # 已派发、尚未结束的源文件，其后台分析结果要保留到任务取走
+        self.cached_outputs = {}  # 排队中的源文件 -> 转换缓存是否已满足全部输出，每个任务只判断一次
+        self.uncommitted = 0  # 已成功、但输出仍在输出缓冲区中的任务数
+        self.finishing = False  # finish() 已调用，等最后一个输出写回后再结束任务日志
+        self.write_back_failed = False  # 有任务的输出没能写回，结束时日志保持未完成状态
+        self.cancel_requested = False
+        self.paused = False
+        self.on_concurrency = on_concurrency or _noop
+        self.controller = None
+        if adaptive:
+            from concurrency_control import ConcurrencyController
+            self.controller = ConcurrencyController(self.scheduler, self.throughput, on_decision=self._on_decision)
+
+    def throughput(self):
+        """运行中任务的实时倍速之和，即每秒转换的媒体秒数"""
+        with self.condition:
+            return sum(converter.speed for converter in self.converters)
+
+    def _on_decision(self, decision):
+        if self.metrics is not None:
+            self.metrics.record_concurrency(decision)
+        self.on_concurrency(decision)
+
+    def _journal(self, method, *args):
+        # 日志写入失败（如磁盘已满）时停用日志，本次批量只是无法中断后继续
+        if self.journal is None:
+            return
+        try:
+            getattr(self.journal, method)(*args)
+        except OSError as e:
+            self.on_status(f"任务日志写入失败，本次批量无法中断后继续: {str(e)}", LOG_WARNING)
+            self.journal.close()
+            self.journal = None
+
+    def set_cpu_workers(self, cpu_workers):
+        """修改重新编码任务的并发上限；自适应并发时作为其上限，由它在当前并发数和这个上限中取较小值"""
+        if self.controller is not None:
+            self.controller.set_cpu_limit(cpu_workers)
+        else:
+            self.scheduler.set_cpu_workers(cpu_workers)
+
+    def pause(self):
+        """暂停批量：不再派发新任务，并暂停运行中的ffmpeg"""
+        with self.condition:
+            self.paused = True
+            converters = list(self.converters)
+        self.scheduler.pause()
+        for converter in converters:
+            converter.pause()
+
+    def resume(self):
+        """继续暂停的批量"""
+        with self.condition:
+            self.paused = False
+            converters = list(self.converters)
+        for converter in converters:
+            converter.resume()
+        self.scheduler.resume()
+
+    def cancel(self):
+        """取消批量：丢弃排队的任务并停止运行中的ffmpeg，返回被丢弃的任务列表"""
+        with self.condition:
+            self.cancel_requested = True
+            converters = list(self.converters)
+        dropped = self.scheduler.clear()
+        with self.condition:
+            # 暂停时可能没有运行中的任务，清空队列后 wait() 就应返回
+            self.condition.notify_all()
+        for converter in converters:
+            converter.cancel()
+        # 停止后台响度分析，正在等待分析结果的任务随即结束
+        analyzer = self.converter_options.get("analyzer")
+        if analyzer is not None:
+            analyzer.close()
+        return dropped
+
+    def cancel_job(self, job):
+        """取消单个任务：还在排队时移出队列（不回调 on_job_finished），正在转换时停止其ffmpeg
+
+        返回从队列中移除的任务列表；被取消的文件在日志中记为已取消，恢复时不再转换。
+        """
+        removed = self.scheduler.remove(job.index)
+        with self.condition:
+            self.deferred.pop(job.video_path, None)
+            if removed:
+                self.active.pop(job.video_path, None)
+                self.cached_outputs.pop(job.video_path, None)
+                self.condition.notify_all()
+            converters = [converter for converter in self.converters if converter.video_path == job.video_path]
+            if converters:
+                self.dropped.add(job.video_path)
+        for removed_job in removed:
+            self._journal("cancelled", removed_job.video_path)
+        for converter in converters:
+            converter.cancel()
+        return removed
+
+    def wait(self):
+        """等待运行中的任务全部结束"""
+        with self.condition:
+            self.condition.wait_for(self.scheduler.is_idle)
+
+    def is_idle(self):
+        """队列为空且没有运行中的任务"""
+        return self.scheduler.is_idle()
+
+    def start(self):
+        """开始批量（run() 会自动调用）：自适应并发时开始定时调整"""
+        if self.controller is not None:
+            self.controller.start()
+
+    def scan_finished(self):
+        """全部输入都已提交：恢复时无需重新扫描（run() 会自动调用）"""
+        if not self.cancel_requested:
+            self._journal("scan_finished")
+
+    def finish(self):
+        """批量结束（run() 会自动调用）：停止自适应并发，关闭任务日志
+
+        还有输出在输出缓冲区中时，任务日志等它们全部写回后再结束（由缓冲区的写回线程完成），
+        写回之前程序中断时日志保持未完成状态，这些文件恢复时重新转换。
+        """
+        if self.controller is not None:
+            self.controller.stop()
+        with self.condition:
+            self.finishing = True
+            if self.uncommitted:
+                return
+        self._finish_journal()
+
+    def _finish_journal(self):
+        if self.cancel_requested or self.write_back_failed:
+            # 保留未完成状态，之后可以继续
+            self._journal("close")
+        else:
+            self._journal("finish")
+
+    def _committed(self, job, written):
+        # 输出已全部到达最终位置，此后恢复时才会跳过该文件；写回失败的文件保持运行状态，恢复时重新转换
+        if written:
+            self._journal("done", job.video_path)
+        with self.condition:
+            self.uncommitted -= 1
+            self.write_back_failed = self.write_back_failed or not written
+            finish = self.finishing and not self.uncommitted
+        self.on_job_committed(job, written)
+        if finish:
+            self._finish_journal()
+
+    def run(self, jobs, watch=None):
+        """执行全部任务，返回 (成功数, 失败数)；被取消的任务只计入 cancelled
+
+        watch 为 threading.Event 时（监视文件夹模式）提交完 jobs 后继续运行，
+        期间可以用 submit() 追加任务，直到 watch 被设置或批量被取消。
+        """
+        self.start()
+        for chunk in iter_chunks(jobs):
+            if self.cancel_requested:
+                break
+            self.submit(chunk)
+        self.scan_finished()
+        if watch is not None:
+            while not self.cancel_requested and not watch.wait(1.0):
+                pass
+        self.wait()
+        self.finish()
+        return self.succeeded, self.failed
+
+    def submit(self, jobs):
+        """追加任务（可在任意线程调用），返回实际加入队列的任务数"""
+        accepted = []
+        with self.condition:
+            if self.cancel_requested:
+                return 0
+            for job in jobs:
+                started = self.active.get(job.video_path)
+                if started is None:
+                    self.active[job.video_path] = False
+                    accepted.append(job)
+                elif started:
+                    self.deferred[job.video_path] = job
+        if accepted:
+            if self.scheduler.longest_first:
+                # 提交时空闲槽位会立即派发，先排序才能让最长的任务最先开始
+                accepted.sort(key=lambda job: -job.duration)
+            self._journal("queued", [job.video_path for job in accepted])
+            for job in accepted:
+                self.on_job_queued(job)
+                self.scheduler.submit(job)
+            self.prefetch()
+        return len(accepted)
+
+    def prefetch(self):
+        """把接下来要派发的任务交给暂存区提前复制、交给响度分析提前分析"""
+        staging = self.converter_options.get("staging")
+        if staging is not None:
+            staging.prefetch([job.video_path for job in self.scheduler.upcoming(staging.ahead)])
+        analyzer = self.converter_options.get("analyzer")
+        if analyzer is not None:
+            upcoming = {job.video_path: job for job in self.scheduler.upcoming(analyzer.ahead)}
+            with self.condition:
+                launched = list(self.launched)
+            # 转换缓存已能满足全部输出的任务不会解码源文件，不需要分析
+            analyzer.prefetch(upcoming, launched, lambda path: not self._outputs_cached(upcoming[path]))
+
+    def _outputs_cached(self, job):
+        """转换缓存是否已满足该任务的全部输出；结果记到任务派发为止，每次预读不再重新查询缓存"""
+        if self.converter_options.get("cache") is None or self.converter_options.get("tracks") is not None:
+            return False
+        with self.condition:
+            cached = self.cached_outputs.get(job.video_path)
+        if cached is None:
+            converter = MediaConverter(job.video_path, job.output_dir, job.conversion_type, job.quality,
+                                       outputs=job.outputs, **self.converter_options)
+            cached = converter.outputs_cached()
+            with self.condition:
+                if self.active.get(job.video_path) is False and job.video_path not in self.launched:
+                    self.cached_outputs[job.video_path] = cached
+        return cached
+
+    def _launch(self, job):
+        with self.condition:
+            self.launched.add(job.video_path)
+            # 转换时会重新查询缓存，判断结果只用于排队期间
+            self.cached_outputs.pop(job.video_path, None)
+        threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+        self.prefetch()
+
+    def _run_job(self, job):
+        started = time.monotonic()
+        self._journal("running", job.video_path)
+        converter = MediaConverter(job.video_path, job.output_dir, job.conversion_type, job.quality,
+                                   on_status=self.on_status,
+                                   on_progress=lambda *progress: self.on_job_progress(job, *progress),
+                                   on_duration=lambda duration: self.on_job_duration(job, duration),
+                                   outputs=job.outputs, **self.converter_options)
+        with self.condition:
+            self.converters.add(converter)
+            self.active[job.video_path] = True
+            if self.cancel_requested:
+                converter.cancel()
+            elif self.paused:
+                converter.pause()
+        self.on_job_started(job, converter)
+        success, message = converter.run()
+        with self.condition:
+            self.converters.discard(converter)
+            self.launched.discard(job.video_path)
+            dropped = job.video_path in self.dropped
+            self.dropped.discard(job.video_path)
+        if self.metrics is not None:
+            try:
+                self.metrics.record(job_metrics(converter, success, started - job.submitted,
+                                                time.monotonic() - started, self.scheduler.max_workers))
+            except OSError as e:
+                self.on_status(f"指标写入失败: {str(e)}", LOG_WARNING)
+        # 随批量一起被取消的任务在日志中保持运行状态，恢复时重新转换
+        if converter.cancelled:
+            if dropped:
+                self._journal("cancelled", job.video_path)
+        elif not success:
+            self._journal("failed", job.video_path, message)
+        committing = success and not converter.cancelled
+        with self.condition:
+            if committing:
+                self.uncommitted += 1
+            if converter.cancelled:
+                self.cancelled += 1
+            elif success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            again = None if self.cancel_requested else self.deferred.pop(job.video_path, None)
+            if again is None:
+                self.active.pop(job.video_path, None)
+            else:
+                self.active[job.video_path] = False
+        self.on_job_finished(job, success, message)
+        if committing:
+            converter.when_committed(lambda written: self._committed(job, written))
+
+        # 先提交重新转换的任务再释放槽位，wait() 不会在两者之间误判为空闲
+        if again is not None:
+            self._journal("queued", [again.video_path])
+            self.on_job_queued(again)
+            self.scheduler.submit(again)
+        self.scheduler.job_done(job)
+        # 没有新任务派发时（如批量末尾）也要丢弃本任务未取走的分析结果
+        self.prefetch()
+        with self.condition:
+            self.condition.notify_all()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - FFmpeg查找
+功能：依次检查指定的FFmpeg、项目自带的FFmpeg和系统PATH中的FFmpeg，
+      读取一次 -version、-encoders、-hwaccels 的输出作为能力档案（版本、可用编码器、硬件加速方式），
+      按 可执行文件路径+大小+修改时间 持久缓存，之后启动时不再运行ffmpeg
+说明：缓存为用户缓存目录下的JSON文件；不依赖Qt
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+from converter_core import BUNDLED_FFMPEG_DIR, OUTPUT_FORMATS, user_cache_dir
+
+# 能力档案的字段版本：增加字段后旧的缓存记录视为过期，重新读取
+PROFILE_VERSION = 1
+
+# FFmpeg的来源
+CONFIGURED, LOCAL, SYSTEM = "configured", "local", "system"
+SOURCE_NAMES = {CONFIGURED: "指定的FFmpeg", LOCAL: "本地FFmpeg", SYSTEM: "系统FFmpeg"}
+
+EXE_SUFFIX = ".exe" if sys.platform == "win32" else ""
+
+
+def default_profile_path():
+    """默认的能力档案缓存路径"""
+    return os.path.join(user_cache_dir(), "ffmpeg_profiles.json")
+
+
+class FFmpegProfile:
+    """一个FFmpeg可执行文件的能力档案"""
+
+    __slots__ = ("ffmpeg_path", "ffprobe_path", "source", "version", "encoders", "hwaccels", "size", "mtime_ns")
+
+    def __init__(self, ffmpeg_path, ffprobe_path, source, version, encoders=(), hwaccels=(), size=0, mtime_ns=0):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.source = source
+        self.version = version  # -version 输出的第一行
+        self.encoders = set(encoders)
+        self.hwaccels = list(hwaccels)
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def source_name(self):
+        return SOURCE_NAMES.get(self.source, self.source)
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def supports(self, fmt):
+        """能否编码输出格式 fmt；没有读到编码器列表时视为支持"""
+        return not self.encoders or self.has_encoder(OUTPUT_FORMATS[fmt][0])
+
+    def describe(self):
+        """版本和硬件加速的简短说明"""
+        version = self.version.split(" Copyright")[0]
+        return version + (f"，硬件加速: {', '.join(self.hwaccels)}" if self.hwaccels else "")
+
+    def to_dict(self):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values["encoders"] = sorted(self.encoders)
+        values["version_key"] = PROFILE_VERSION
+        return values
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{name: values[name] for name in cls.__slots__ if name in values})
+
+
+def _run(args):
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def parse_encoders(text):
+    """解析 -encoders 的输出，返回编码器名称列表"""
+    encoders = []
+    started = False
+    for line in text.splitlines():
+        if not started:
+            # 说明部分以一行 " ------" 结束
+            started = line.strip().startswith("---")
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            encoders.append(parts[1])
+    return encoders
+
+
+def parse_hwaccels(text):
+    """解析 -hwaccels 的输出，返回硬件加速方式列表"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return [line for line in lines if not line.endswith(":")]
+
+
+def probe_profile(ffmpeg_path, ffprobe_path, source):
+    """运行ffmpeg读取能力档案，不可用时返回None"""
+    version = _run([ffmpeg_path, "-version"])
+    if not version:
+        return None
+    encoders = _run([ffmpeg_path, "-hide_banner", "-encoders"]) or ""
+    hwaccels = _run([ffmpeg_path, "-hide_banner", "-hwaccels"]) or ""
+    st = os.stat(ffmpeg_path)
+    return FFmpegProfile(ffmpeg_path, ffprobe_path, source, version.splitlines()[0].strip(),
+                         parse_encoders(encoders), parse_hwaccels(hwaccels), st.st_size, st.st_mtime_ns)
+
+
+def resolve_binary(path):
+    """把命令名或路径解析为可执行文件的绝对路径，找不到返回None"""
+    if not path:
+        return None
+    if os.path.dirname(path):
+        return os.path.abspath(path) if os.path.isfile(path) else None
+    found = shutil.which(path)
+    return os.path.abspath(found) if found else None
+
+
+def sibling_ffprobe(ffmpeg_path):
+    """与ffmpeg同目录的ffprobe，没有时使用PATH中的ffprobe"""
+    directory = os.path.dirname(ffmpeg_path)
+    suffix = os.path.splitext(ffmpeg_path)[1]
+    candidate = os.path.join(directory, "ffprobe" + suffix)
+    if os.path.isfile(candidate):
+        return candidate
+    return resolve_binary("ffprobe" + EXE_SUFFIX) or "ffprobe"
+
+
+def candidate_binaries(configured=None):
+    """按优先级列出候选的 (ffmpeg路径, 来源)：指定的路径、项目自带的FFmpeg、系统PATH"""
+    candidates = []
+    if configured:
+        candidates.append((configured, CONFIGURED))
+    candidates.append((os.path.join(BUNDLED_FFMPEG_DIR, "ffmpeg" + EXE_SUFFIX), LOCAL))
+    candidates.append(("ffmpeg" + EXE_SUFFIX, SYSTEM))
+    return candidates
+
+
+class ProfileStore:
+    """能力档案的持久缓存，同时记住用户指定的FFmpeg路径
+
+    档案以可执行文件的绝对路径为键，文件大小或修改时间变化（如升级了ffmpeg）后自动失效。
+    可在多个线程中使用。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_profile_path()
+        self.lock = threading.Lock()
+        self.data = None
+
+    def _load(self):
+        # 需持有锁
+        if self.data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
+            if not isinstance(self.data, dict):
+                self.data = {}
+            self.data.setdefault("profiles", {})
+        return self.data
+
+    def _save(self):
+        # 需持有锁；先写临时文件再改名，其他进程不会读到写了一半的内容
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def get(self, ffmpeg_path):
+        """缓存的能力档案，不存在或可执行文件已变化返回None"""
+        try:
+            st = os.stat(ffmpeg_path)
+        except OSError:
+            return None
+        with self.lock:
+            values = self._load()["profiles"].get(ffmpeg_path)
+        if (not values or values.get("version_key") != PROFILE_VERSION or
+                values.get("size") != st.st_size or values.get("mtime_ns") != st.st_mtime_ns):
+            return None
+        return FFmpegProfile.from_dict(values)
+
+    def put(self, profile):
+        with self.lock:
+            self._load()["profiles"][profile.ffmpeg_path] = profile.to_dict()
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    @property
+    def configured(self):
+        """用户指定的FFmpeg路径"""
+        with self.lock:
+            return self._load().get("configured") or None
+
+    @configured.setter
+    def configured(self, path):
+        with self.lock:
+            self._load()["configured"] = path
+            try:
+                self._save()
+            except OSError:
+                pass
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    """进程内共用的能力档案缓存"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ProfileStore()
+        return _default_store
+
+
+def profile_for(ffmpeg_path, ffprobe_path=None, source=CONFIGURED, store=None, refresh=False):
+    """读取某个ffmpeg的能力档案：优先使用缓存，refresh 为True时重新运行ffmpeg；不可用时返回None"""
+    store = store or default_store()
+    resolved = resolve_binary(ffmpeg_path)
+    if resolved is None:
+        return None
+    profile = None if refresh else store.get(resolved)
+    if profile is None:
+        profile = probe_profile(resolved, ffprobe_path or sibling_ffprobe(resolved), source)
+        if profile is None:
+            return None
+        store.put(profile)
+    elif ffprobe_path:
+        profile.ffprobe_path = ffprobe_path
+    profile.source = source
+    return profile
+
+
+def discover_ffmpeg(configured=None, store=None, refresh=False):
+    """依次检查候选的FFmpeg，返回第一个可用的能力档案，都不可用时返回None
+
+    configured 为空时使用缓存中记住的用户指定路径。缓存命中时不启动任何子进程。
+    """
+    store = store or default_store()
+    for ffmpeg_path, source in candidate_binaries(configured or store.configured):
+        profile = profile_for(ffmpeg_path, source=source, store=store, refresh=refresh)
+        if profile is not None:
+            return profile
+    return None
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 文件夹监视
+功能：监视批量目录，发现新加入或内容有变化的视频文件，等文件大小稳定（写入完成）后报告，
+      供批量转换增量加入队列
+说明：Linux 使用 inotify（通过ctypes调用libc），其他系统或inotify不可用时定时扫描目录；不依赖Qt
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from converter_core import LOG_INFO, LOG_WARNING, iter_video_files, wanted_subdir, wanted_video_file
+
+# 文件大小和修改时间保持不变多少秒后才视为写入完成
+DEFAULT_SETTLE_SECONDS = 5.0
+
+# 定时扫描模式下两次扫描的间隔（秒）
+DEFAULT_POLL_INTERVAL = 2.0
+
+# 有等待稳定的文件时检查的间隔（秒），也是 inotify 模式下检查是否需要停止的间隔
+CHECK_INTERVAL = 0.5
+
+INOTIFY, POLLING = "inotify", "polling"
+
+# inotify 事件位，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """inotify 文件描述符的最小封装"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise _errno_error()
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise _errno_error(path)
+        return wd
+
+    def remove_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回 [(wd, mask, 文件名)]"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _errno_error(path=None):
+    code = ctypes.get_errno()
+    return OSError(code, os.strerror(code), path)
+
+
+def _signature(path):
+    """(大小, 修改时间)，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class FolderWatcher:
+    """监视一个或多个目录中的视频文件
+
+    start() 启动监视线程，线程先记录目录中已有的文件（完成后设置 ready），之后新出现或内容变化的文件
+    在大小和修改时间连续 settle 秒不变后通过 on_files(路径列表) 报告（在监视线程中调用）。
+    handled 为调用方已经处理（如已在文件列表中）的文件集合；指定时，目录中已有的其他文件也会报告：
+    修改时间早于 settle 秒前的立即报告，其余等待稳定。为None时已有的文件只记录不报告。
+    include / exclude / max_depth 与 iter_video_files 相同，报告的路径与扫描得到的路径形式一致。
+    """
+
+    def __init__(self, directories, on_files, include=None, exclude=None, max_depth=None,
+                 settle=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL, handled=None,
+                 use_inotify=True, on_status=None):
+        self.directories = list(directories)
+        self.on_files = on_files
+        self.on_status = on_status or (lambda text, level: None)
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_depth = max_depth
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.handled = handled
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.mode = None
+        self.known = {}  # 路径 -> 已报告（或启动时已存在）时的 (大小, 修改时间)
+        self.pending = {}  # 路径 -> [大小, 修改时间, 最近一次变化的时间]，等待写入完成
+        self.inotify = None
+        self.watches = {}  # inotify 监视描述符 -> (目录, 所属的顶层目录, 相对路径, 深度)
+        self.watched_dirs = {}  # 目录 -> 监视描述符
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """启动监视线程"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _start_watching(self):
+        """添加inotify监视并记录已有文件：先添加监视再扫描，扫描期间的变化不会漏掉"""
+        if self.use_inotify:
+            try:
+                self.inotify = _Inotify()
+                for directory in self.directories:
+                    self._watch_tree(directory, directory, "", 0)
+            except (OSError, AttributeError) as e:
+                self._fall_back(e)
+        self.mode = INOTIFY if self.inotify is not None else POLLING
+        try:
+            ready = self._scan(initial=True)
+        finally:
+            self.ready.set()
+        if ready and not self.stop_event.is_set():
+            self.on_files(ready)
+
+    def stop(self):
+        """停止监视（等待中的文件不再报告）"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _fall_back(self, error):
+        """inotify 不可用（如监视数量超过 fs.inotify.max_user_watches）时改为定时扫描"""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        self.watches.clear()
+        self.watched_dirs.clear()
+        self.mode = POLLING
+        self.on_status(f"无法使用inotify监视文件夹（{error}），改为每 {self.poll_interval:g} 秒扫描一次",
+                       LOG_WARNING)
+
+    def _run(self):
+        self._start_watching()
+        next_scan = time.monotonic() + self.poll_interval
+        while not self.stop_event.is_set():
+            timeout = CHECK_INTERVAL if self.pending else self.poll_interval
+            if self.inotify is not None:
+                try:
+                    self._handle_events(self.inotify.read(CHECK_INTERVAL))
+                except OSError as e:
+                    self._fall_back(e)
+            else:
+                if self.stop_event.wait(min(timeout, max(0.0, next_scan - time.monotonic()))):
+                    break
+                if time.monotonic() >= next_scan:
+                    self._scan()
+                    next_scan = time.monotonic() + self.poll_interval
+            if self.stop_event.is_set():
+                break
+            ready = self._check_pending()
+            if ready:
+                self.on_files(ready)
+
+    def _scan(self, initial=False):
+        """扫描全部目录：启动时记录已有文件，之后把新出现或变化的文件加入等待列表"""
+        seen = set()
+        ready = []
+        cutoff = time.time_ns() - int(self.settle * 1e9)
+        for directory in self.directories:
+            for path in iter_video_files(directory, self.include, self.exclude, self.max_depth, self.stop_event):
+                seen.add(path)
+                signature = _signature(path)
+                if signature is None:
+                    continue
+                if initial and (self.handled is None or path in self.handled):
+                    self.known[path] = signature
+                elif initial and signature[1] <= cutoff:
+                    self.known[path] = signature
+                    ready.append(path)
+                else:
+                    self._changed(path, signature)
+        if not initial and not self.stop_event.is_set():
+            # 已删除的文件之后重新出现时按新文件处理
+            for path in [path for path in self.known if path not in seen]:
+                del self.known[path]
+        return ready
+
+    def _changed(self, path, signature=None):
+        """文件可能有变化：与已报告的状态不同时开始（或重新开始）等待稳定"""
+        signature = signature or _signature(path)
+        if signature is None:
+            self._forget(path)
+            return
+        if self.known.get(path) == signature:
+            self.pending.pop(path, None)
+            return
+        state = self.pending.get(path)
+        if state is None or (state[0], state[1]) != signature:
+            self.pending[path] = [signature[0], signature[1], time.monotonic()]
+
+    def _forget(self, path):
+        self.known.pop(path, None)
+        self.pending.pop(path, None)
+
+    def _check_pending(self):
+        """返回已稳定 settle 秒的文件"""
+        now = time.monotonic()
+        ready = []
+        for path, state in list(self.pending.items()):
+            signature = _signature(path)
+            if signature is None:
+                self._forget(path)
+            elif (state[0], state[1]) != signature:
+                self.pending[path] = [signature[0], signature[1], now]
+            elif now - state[2] >= self.settle and signature[0] > 0:
+                del self.pending[path]
+                self.known[path] = signature
+                ready.append(path)
+        return sorted(ready)
+
+    def _watch_tree(self, path, root, rel_dir, depth, scan_files=False):
+        """为目录及其需要扫描的子目录添加监视，不进入符号链接目录
+
+        scan_files 为True时（新出现的目录）其中已有的视频文件按新文件处理。
+        """
+        stack = [(path, rel_dir, depth)]
+        while stack:
+            current, rel, level = stack.pop()
+            try:
+                wd = self.inotify.add_watch(current)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise
+            self.watches[wd] = (current, root, rel, level)
+            self.watched_dirs[current] = wd
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        child_rel = f"{rel}/{entry.name}" if rel else entry.name
+                        try:
+                            is_dir = entry.is_dir()
+                            if is_dir and entry.is_symlink():
+                                continue
+                        except OSError:
+                            continue
+                        if not is_dir:
+                            if scan_files and wanted_video_file(child_rel, self.include, self.exclude):
+                                self._changed(entry.path)
+                            continue
+                        if wanted_subdir(child_rel, level + 1, self.exclude, self.max_depth):
+                            stack.append((entry.path, child_rel, level + 1))
+            except OSError:
+                continue
+
+    def _unwatch_tree(self, path):
+        """目录被删除或移走：停止监视并忘记其中的文件"""
+        prefix = path + os.sep
+        for directory in [d for d in self.watched_dirs if d == path or d.startswith(prefix)]:
+            wd = self.watched_dirs.pop(directory)
+            self.watches.pop(wd, None)
+            self.inotify.remove_watch(wd)
+        for table in (self.known, self.pending):
+            for file_path in [p for p in table if p.startswith(prefix)]:
+                del table[file_path]
+
+    def _handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，可能漏掉了变化：重新扫描一遍
+                self.on_status("文件夹变化过多，重新扫描目录", LOG_INFO)
+                self._scan()
+                continue
+            if mask & IN_IGNORED:
+                watch = self.watches.pop(wd, None)
+                if watch is not None and self.watched_dirs.get(watch[0]) == wd:
+                    del self.watched_dirs[watch[0]]
+                continue
+            watch = self.watches.get(wd)
+            if watch is None or not name:
+                continue
+            directory, root, rel_dir, depth = watch
+            path = os.path.join(directory, name)
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if mask & IN_ISDIR:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._unwatch_tree(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO) and wanted_subdir(rel_path, depth + 1, self.exclude,
+                                                                        self.max_depth):
+                    # 新目录（如整个文件夹移入）：添加监视后扫描其中已有的文件
+                    self._watch_tree(path, root, rel_path, depth + 1, scan_files=True)
+                continue
+            if not wanted_video_file(rel_path, self.include, self.exclude):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget(path)
+            else:
+                self._changed(path)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 输入暂存区
+功能：批量转换网络存储上的文件时，提前用大块顺序读取把接下来的几个输入复制到本地临时目录，
+      ffmpeg 从本地副本读取，避免通过网络大量小块随机读取；输出先写在本地，完成后整块写回
+说明：暂存区有总大小上限，超出时按最近最少使用淘汰未在使用的副本；不依赖Qt
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, deque
+
+from converter_core import PARTIAL_SUFFIX
+from storage_devices import NETWORK, device_for_path
+
+# 默认暂存区大小上限（字节）和提前复制的任务数
+DEFAULT_STAGING_BUDGET = 10 * 1024 ** 3
+DEFAULT_STAGING_AHEAD = 4
+
+# 复制时每次读写的块大小：网络存储上大块顺序读取的吞吐远高于ffmpeg的小块读取
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+COPYING, READY, FAILED = range(3)
+
+
+class _StagedFile:
+    """暂存区中的一个输入副本"""
+
+    __slots__ = ("local_path", "size", "mtime", "state", "pins")
+
+    def __init__(self, local_path, size, mtime):
+        self.local_path = local_path
+        self.size = size
+        self.mtime = mtime
+        self.state = COPYING
+        self.pins = 0  # 正在使用该副本的任务数，大于0时不会被淘汰
+
+
+def copy_file(source, destination, block_size=COPY_BLOCK_SIZE, stop=None):
+    """用大块顺序读写复制文件内容；stop() 返回True时中止复制"""
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(source, "rb", buffering=0) as src, open(destination, "wb", buffering=0) as dst:
+        while True:
+            if stop is not None and stop():
+                raise InterruptedError("复制已中止")
+            count = src.readinto(buffer)
+            if not count:
+                break
+            dst.write(view[:count])
+
+
+class StagingArea:
+    """本地输入暂存区
+
+    prefetch(路径列表) 指定接下来要转换的文件，后台线程依次复制其中前 ahead 个；
+    任务开始时 acquire() 返回可供ffmpeg读取的路径（暂存副本，或无法暂存时的原路径），
+    结束后 release()。只暂存位于 kinds 类型设备上的文件，默认只有网络存储。
+    输出目录也在这样的设备上时，输出先写在 scratch_path()，完成后由 write_back() 整块写回。
+    """
+
+    def __init__(self, directory=None, budget=DEFAULT_STAGING_BUDGET, ahead=DEFAULT_STAGING_AHEAD,
+                 kinds=(NETWORK,)):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="staging-", dir=directory)
+        self.budget = budget
+        self.ahead = ahead
+        self.kinds = set(kinds)
+        self.entries = OrderedDict()  # 源路径 -> _StagedFile，按最近使用排序
+        self.used = 0
+        self.queue = deque()
+        self.sequence = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._copy_loop, daemon=True)
+        self.thread.start()
+
+    def should_stage(self, path):
+        """文件（或输出文件）是否位于需要暂存的设备上"""
+        return device_for_path(path).kind in self.kinds
+
+    def prefetch(self, paths):
+        """设置接下来要转换的文件，替换之前尚未开始复制的预读列表"""
+        wanted = []
+        for path in paths:
+            if len(wanted) >= self.ahead:
+                break
+            if self.should_stage(path):
+                wanted.append(path)
+        with self.condition:
+            self.queue = deque(path for path in wanted if path not in self.entries)
+            self.condition.notify_all()
+
+    def acquire(self, path):
+        """返回ffmpeg应读取的路径：正在复制时等待复制完成；无法暂存时返回原路径"""
+        if not self.should_stage(path):
+            return path
+        with self.condition:
+            entry = self.entries.get(path)
+            if entry is not None and entry.state == READY and not self._is_current(path, entry):
+                # 源文件在暂存后被修改过，丢弃旧副本
+                self._drop(path)
+                entry = None
+            copy_here = entry is None
+            if copy_here:
+                entry = self._reserve(path)
+                if entry is None:
+                    return path
+            entry.pins += 1
+            self.entries.move_to_end(path)
+        if copy_here:
+            self._copy(path, entry)
+        with self.condition:
+            self.condition.wait_for(lambda: entry.state != COPYING)
+            if entry.state == READY:
+                return entry.local_path
+            entry.pins -= 1
+        return path
+
+    def release(self, path):
+        """任务不再读取该文件，副本可以被淘汰"""
+        with self.condition:
+            entry = self.entries.get(path)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+
+    def scratch_path(self, output_path):
+        """输出文件在暂存区中的临时路径"""
+        with self.condition:
+            self.sequence += 1
+            sequence = self.sequence
+        return os.path.join(self.directory, f"out-{sequence}{os.path.splitext(output_path)[1]}")
+
+    def write_back(self, scratch_path, output_path):
+        """把本地写好的输出整块复制到目标位置：先写临时文件再重命名，最后删除本地文件"""
+        partial_path = output_path + PARTIAL_SUFFIX
+        try:
+            copy_file(scratch_path, partial_path)
+            os.replace(partial_path, output_path)
+        except OSError:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            os.remove(scratch_path)
+
+    def usage(self):
+        """(已暂存的文件数, 占用字节数)"""
+        with self.condition:
+            return len(self.entries), self.used
+
+    def close(self):
+        """停止预读并删除暂存目录"""
+        with self.condition:
+            self.closed = True
+            self.queue.clear()
+            self.condition.notify_all()
+        self.thread.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _copy_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or self.closed)
+                if self.closed:
+                    return
+                path = self.queue.popleft()
+                if path in self.entries:
+                    continue
+                entry = self._reserve(path)
+                if entry is None:
+                    continue
+            self._copy(path, entry)
+
+    def _reserve(self, path):
+        """为文件预留空间并登记副本（需持有锁），空间不足时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size > self.budget:
+            return None
+        # 按最近最少使用的顺序淘汰未在使用的副本
+        for old_path in list(self.entries):
+            if self.used + stat.st_size <= self.budget:
+                break
+            old = self.entries[old_path]
+            if old.pins == 0 and old.state == READY:
+                self._drop(old_path)
+        if self.used + stat.st_size > self.budget:
+            return None
+        self.sequence += 1
+        local_path = os.path.join(self.directory, f"in-{self.sequence}{os.path.splitext(path)[1]}")
+        entry = _StagedFile(local_path, stat.st_size, stat.st_mtime_ns)
+        self.entries[path] = entry
+        self.used += stat.st_size
+        return entry
+
+    def _drop(self, path):
+        entry = self.entries.pop(path)
+        self.used -= entry.size
+        try:
+            os.remove(entry.local_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _is_current(path, entry):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime
+
+    def _copy(self, path, entry):
+        try:
+            copy_file(path, entry.local_path, stop=lambda: self.closed)
+            state = READY
+        except OSError:
+            state = FAILED
+        with self.condition:
+            entry.state = state
+            if state == FAILED and self.entries.get(path) is entry:
+                self._drop(path)
+            self.condition.notify_all()
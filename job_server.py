@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 分布式批量
+功能：协调进程在SQLite中保存批量任务队列，通过HTTP（JSON）把任务租给多台主机上的工作进程；
+      工作进程定时发送心跳续租、转换完成后上报结果和指标，租约过期（工作进程崩溃或断网）的任务重新排队
+说明：只使用标准库；源文件和输出目录必须是各主机上路径相同的共享存储；不依赖Qt
+"""
+
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from converter_core import LOG_INFO, LOG_WARNING, BatchRunner, ConversionJob, user_cache_dir
+
+DEFAULT_PORT = 8765
+
+# 租约时长（秒）：工作进程每隔三分之一租约时长发送一次心跳，超过租约时长没有心跳的任务重新排队
+DEFAULT_LEASE_SECONDS = 60.0
+
+# 同一任务的租约过期这么多次后记为失败（可能是会让工作进程崩溃的文件）
+MAX_LEASE_ATTEMPTS = 3
+
+# 工作进程没有任务可做时，每隔这么多秒询问一次
+POLL_INTERVAL = 2.0
+
+# 工作进程在空闲槽位之外多租的任务数，让暂存区和响度分析可以提前准备下一个任务
+LEASE_AHEAD = 1
+
+# 任务状态
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+TOKEN_HEADER = "X-Job-Token"
+
+
+def default_server_db():
+    """默认的协调进程任务数据库路径"""
+    return os.path.join(user_cache_dir(), "job_server.sqlite3")
+
+
+def job_to_dict(job):
+    return {"id": job.index, "path": job.video_path, "output_dir": job.output_dir,
+            "conversion_type": job.conversion_type, "quality": job.quality, "duration": job.duration,
+            "outputs": job.outputs, "cpu_bound": job.cpu_bound}
+
+
+def job_from_dict(values):
+    outputs = [tuple(output) for output in values["outputs"]] if values.get("outputs") else None
+    return ConversionJob(values["id"], values["path"], values["output_dir"], values["conversion_type"],
+                         values["quality"], values.get("duration", 0.0), outputs, values.get("cpu_bound", True))
+
+
+class JobStore:
+    """协调进程的任务队列
+
+    jobs 表每个源文件一行（路径唯一），记录状态、租约和重试次数；meta 表保存批量编号和转换设置。
+    所有状态变化都在事务中完成，协调进程重启后可以从数据库继续。可在多个线程中使用。
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_server_db()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    job TEXT NOT NULL,
+                    priority REAL NOT NULL,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    lease TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    updated REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority, id)")
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_lease ON jobs (lease)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def start(self, settings, resume=False):
+        """开始批量：resume 为True且数据库中有上次的批量时沿用其任务和编号，否则清空旧任务。返回批量编号"""
+        with self.lock, self.conn:
+            batch = self._get_meta("batch") if resume else None
+            if batch is None:
+                batch = uuid.uuid4().hex
+                self.conn.execute("DELETE FROM jobs")
+            else:
+                # 上次的租约属于已经不存在的协调进程会话，全部重新排队
+                self.conn.execute("UPDATE jobs SET state = ?, worker = NULL, lease = NULL, lease_expires = NULL "
+                                  "WHERE state = ?", (QUEUED, LEASED))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('batch', ?)", (json.dumps(batch),))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)",
+                              (json.dumps(settings, ensure_ascii=False),))
+        return batch
+
+    def add(self, jobs, longest_first=False):
+        """加入任务（同一源文件已在队列中时忽略），返回新加入的数量"""
+        now = time.time()
+        rows = []
+        for job in jobs:
+            path = os.path.abspath(job.video_path)
+            values = job_to_dict(job)
+            values["path"] = path
+            rows.append((path, json.dumps(values, ensure_ascii=False),
+                         -job.duration if longest_first else 0.0, QUEUED, now))
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO jobs (path, job, priority, state, updated) "
+                                  "VALUES (?, ?, ?, ?, ?)", rows)
+            return self.conn.total_changes - before
+
+    def requeue(self, path):
+        """已完成或失败的源文件重新排队（监视文件夹时文件被修改）；租用中的任务不受影响"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET state = ?, attempts = 0, message = NULL, updated = ? "
+                              "WHERE path = ? AND state IN (?, ?)",
+                              (QUEUED, time.time(), os.path.abspath(path), DONE, FAILED))
+
+    def lease(self, worker, count, lease_seconds):
+        """为工作进程租用最多 count 个排队的任务，返回 [(租约, 任务字典)]"""
+        now = time.time()
+        leased = []
+        with self.lock, self.conn:
+            rows = self.conn.execute("SELECT id, job FROM jobs WHERE state = ? ORDER BY priority, id LIMIT ?",
+                                     (QUEUED, max(0, count))).fetchall()
+            for row_id, job in rows:
+                lease = uuid.uuid4().hex
+                self.conn.execute("UPDATE jobs SET state = ?, worker = ?, lease = ?, lease_expires = ?, "
+                                  "attempts = attempts + 1, updated = ? WHERE id = ?",
+                                  (LEASED, worker, lease, now + lease_seconds, now, row_id))
+                values = json.loads(job)
+                values["id"] = row_id
+                leased.append((lease, values))
+        return leased
+
+    def heartbeat(self, leases, lease_seconds):
+        """续租，返回已经失效（过期后被重新排队或已被其他工作进程完成）的租约"""
+        now = time.time()
+        lost = []
+        with self.lock, self.conn:
+            for lease in leases:
+                cursor = self.conn.execute("UPDATE jobs SET lease_expires = ?, updated = ? "
+                                           "WHERE lease = ? AND state = ?", (now + lease_seconds, now, lease, LEASED))
+                if cursor.rowcount == 0:
+                    lost.append(lease)
+        return lost
+
+    def complete(self, lease, success, message=""):
+        """记录任务结果，返回 (是否接受, 源文件路径)；租约已失效时不接受"""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT path FROM jobs WHERE lease = ? AND state = ?",
+                                    (lease, LEASED)).fetchone()
+            if row is None:
+                return False, None
+            self.conn.execute("UPDATE jobs SET state = ?, lease = NULL, lease_expires = NULL, message = ?, "
+                              "updated = ? WHERE lease = ?", (DONE if success else FAILED, message, time.time(), lease))
+        return True, row[0]
+
+    def expire(self):
+        """过期的租约重新排队，重试次数用完的记为失败；返回 [(源文件路径, 是否记为失败)]"""
+        now = time.time()
+        with self.lock, self.conn:
+            rows = self.conn.execute("SELECT id, path, attempts, worker FROM jobs WHERE state = ? AND lease_expires < ?",
+                                     (LEASED, now)).fetchall()
+            for row_id, _, attempts, worker in rows:
+                failed = attempts >= MAX_LEASE_ATTEMPTS
+                self.conn.execute("UPDATE jobs SET state = ?, worker = NULL, lease = NULL, lease_expires = NULL, "
+                                  "message = ?, updated = ? WHERE id = ?",
+                                  (FAILED if failed else QUEUED,
+                                   f"工作进程 {worker} 失去响应" + ("，已多次重试" if failed else ""), now, row_id))
+        return [(path, attempts >= MAX_LEASE_ATTEMPTS) for _, path, attempts, _ in rows]
+
+    def counts(self):
+        """各状态的任务数"""
+        with self.lock:
+            counts = dict.fromkeys((QUEUED, LEASED, DONE, FAILED), 0)
+            counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            return counts
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """协调进程的HTTP接口：请求和响应都是JSON"""
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, body):
+        coordinator = self.server.coordinator
+        if coordinator.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), coordinator.token):
+            self._reply(403, {"error": "令牌不正确"})
+            return
+        try:
+            status, response = coordinator.handle(self.command, self.path, body)
+        except (KeyError, TypeError, ValueError) as e:
+            status, response = 400, {"error": f"请求格式错误: {e}"}
+        self._reply(status, response)
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "请求不是有效的JSON"})
+            return
+        self._handle(body)
+
+    def log_message(self, format, *args):
+        # 每次心跳都会产生一行访问日志，不输出
+        pass
+
+
+class JobCoordinator:
+    """协调进程：保存任务队列并通过HTTP把任务租给工作进程
+
+    接口：GET /settings 返回批量编号和转换设置；POST /lease 租用任务；POST /heartbeat 续租；
+    POST /complete 上报结果和指标；GET /status 返回各状态的任务数和工作进程。
+    设置了 token 时每个请求都要在 X-Job-Token 头中带上相同的令牌。
+    submit() 可在批量进行中追加任务；finish_scan() 表示不再有新任务，之后全部任务结束时 wait() 返回。
+    on_job_finished(路径, 是否成功, 说明, 工作进程) 在每个结果上报或租约过期时调用，
+    metrics（conversion_metrics.MetricsRecorder）汇总工作进程上报的任务指标。
+    """
+
+    def __init__(self, store, settings, host="127.0.0.1", port=DEFAULT_PORT, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 token=None, resume=False, longest_first=False, metrics=None, on_status=None, on_job_finished=None):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.token = token
+        self.longest_first = longest_first
+        self.metrics = metrics
+        self.on_status = on_status or (lambda text, level: None)
+        self.on_job_finished = on_job_finished or (lambda path, success, message, worker: None)
+        self.batch = store.start(settings, resume)
+        self.settings = settings
+        self.workers = {}  # 工作进程名 -> 最后一次请求的时间
+        self.scan_complete = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+        self.threads = []
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host if host not in ('', '0.0.0.0') else socket.gethostname()}:{port}"
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.server.serve_forever, name="job-server", daemon=True),
+                        threading.Thread(target=self._expire_loop, name="job-expire", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+
+    def submit(self, jobs):
+        """追加任务，返回新加入的数量"""
+        added = self.store.add(jobs, self.longest_first)
+        with self.condition:
+            self.condition.notify_all()
+        return added
+
+    def requeue(self, path):
+        self.store.requeue(path)
+
+    def finish_scan(self):
+        with self.condition:
+            self.scan_complete = True
+            self.condition.notify_all()
+
+    def finished(self):
+        if not self.scan_complete:
+            return False
+        counts = self.store.counts()
+        return counts[QUEUED] == 0 and counts[LEASED] == 0
+
+    def wait(self, watch=None):
+        """等待全部任务结束（watch 为 threading.Event 时一直运行到它被设置），返回各状态的任务数"""
+        with self.condition:
+            while not self.stopped:
+                if watch is not None:
+                    if watch.is_set():
+                        break
+                elif self.finished():
+                    break
+                self.condition.wait(1.0)
+        # 让正在轮询的工作进程得知批量已结束后再关闭
+        time.sleep(POLL_INTERVAL * 2)
+        return self.store.counts()
+
+    def _expire_loop(self):
+        while True:
+            with self.condition:
+                if self.condition.wait_for(lambda: self.stopped, self.lease_seconds / 4):
+                    return
+            for path, failed in self.store.expire():
+                if failed:
+                    self.on_job_finished(path, False, "工作进程多次失去响应", None)
+                else:
+                    self.on_status(f"{os.path.basename(path)}: 租约过期，重新排队", LOG_WARNING)
+            with self.condition:
+                self.condition.notify_all()
+
+    def handle(self, method, path, body):
+        """处理一个请求，返回 (HTTP状态码, 响应)"""
+        worker = body.get("worker")
+        if worker:
+            with self.condition:
+                if worker not in self.workers:
+                    self.on_status(f"工作进程 {worker} 已连接", LOG_INFO)
+                self.workers[worker] = time.time()
+        if method == "GET" and path == "/settings":
+            return 200, {"batch": self.batch, "settings": self.settings, "lease_seconds": self.lease_seconds}
+        if method == "GET" and path == "/status":
+            with self.condition:
+                workers = {name: round(time.time() - seen, 1) for name, seen in self.workers.items()}
+            return 200, {"batch": self.batch, "counts": self.store.counts(), "workers": workers,
+                         "scan_complete": self.scan_complete}
+        if method != "POST":
+            return 404, {"error": f"未知的接口: {method} {path}"}
+        if path == "/lease":
+            leased = self.store.lease(worker, int(body["count"]), self.lease_seconds)
+            return 200, {"batch": self.batch, "jobs": [dict(job, lease=lease) for lease, job in leased],
+                         "finished": not leased and self.finished()}
+        if path == "/heartbeat":
+            return 200, {"lost": self.store.heartbeat(body["leases"], self.lease_seconds)}
+        if path == "/complete":
+            accepted, source = self.store.complete(body["lease"], bool(body["success"]), body.get("message", ""))
+            if accepted:
+                if self.metrics is not None and body.get("metrics"):
+                    from conversion_metrics import JobMetrics
+                    self.metrics.record(JobMetrics(**body["metrics"]))
+                self.on_job_finished(source, bool(body["success"]), body.get("message", ""), worker)
+                with self.condition:
+                    self.condition.notify_all()
+            return 200, {"accepted": accepted}
+        return 404, {"error": f"未知的接口: {method} {path}"}
+
+
+class JobClient:
+    """工作进程访问协调进程的HTTP客户端"""
+
+    def __init__(self, url, token=None, timeout=30.0):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, path, body=None):
+        """发送请求并返回响应；网络错误时抛出 OSError"""
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url + path, data=data, method="GET" if body is None else "POST",
+                                         headers={"Content-Type": "application/json"})
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read().decode("utf-8")).get("error", e.reason)
+            except ValueError:
+                error = e.reason
+            raise OSError(f"协调进程返回 {e.code}: {error}") from None
+        except ValueError as e:
+            raise OSError(f"协调进程的响应不是有效的JSON: {e}") from None
+
+    def settings(self):
+        return self.request("/settings")
+
+
+class JobWorker:
+    """工作进程：从协调进程租用任务交给 BatchRunner 执行
+
+    空闲槽位数（加上 LEASE_AHEAD）决定每次租用的任务数；每隔三分之一租约时长为运行中的任务发送心跳，
+    协调进程报告租约已失效的任务立即停止。结果和任务指标在转换结束后上报；使用输出缓冲区时，
+    成功的任务等输出写回输出目录后才上报，在此之前租约照常续期。协调进程返回 finished 且
+    本地没有任务时 run() 结束。runner_options 原样传给 BatchRunner；metrics 为本地的 MetricsRecorder（可选）。
+    """
+
+    def __init__(self, client, batch, lease_seconds, max_workers=None, name=None, metrics=None, on_status=None,
+                 on_job_finished=None, **runner_options):
+        self.client = client
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.local_metrics = metrics
+        self.on_status = on_status or (lambda text, level: None)
+        self.on_job_finished = on_job_finished or (lambda job, success, message: None)
+        self.runner = BatchRunner(max_workers, on_status=self.on_status, on_job_finished=self._job_finished,
+                                  on_job_committed=self._job_committed, metrics=self, **runner_options)
+        self.active = {}  # 租约 -> 任务
+        self.results = {}  # 源文件路径 -> JobMetrics，转换结束到上报之间暂存
+        self.committing = {}  # 源文件路径 -> (租约, 结果说明, JobMetrics)，成功但输出尚未写回的任务
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.stopping = False
+        self.condition = threading.Condition()
+
+    # BatchRunner 把任务指标交给这里，上报时一起发给协调进程
+    def record(self, metrics):
+        with self.condition:
+            self.results[metrics.path] = metrics
+        if self.local_metrics is not None:
+            self.local_metrics.record(metrics)
+
+    def record_concurrency(self, decision):
+        if self.local_metrics is not None:
+            self.local_metrics.record_concurrency(decision)
+
+    def run(self):
+        """运行到协调进程的批量结束或 stop() 被调用，返回上报的 (成功数, 失败数)"""
+        watch = threading.Event()
+        threads = [threading.Thread(target=self._lease_loop, args=(watch,), name="job-lease", daemon=True),
+                   threading.Thread(target=self._heartbeat_loop, args=(watch,), name="job-heartbeat", daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.runner.run([], watch)
+            return self.succeeded, self.failed
+        finally:
+            self.stop()
+            watch.set()
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        """不再租用新任务，已租用的任务照常完成"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+    def cancel(self):
+        """停止全部任务；租约在协调进程上过期后由其他工作进程重新转换"""
+        self.stop()
+        self.runner.cancel()
+
+    def _request(self, path, body):
+        body["worker"] = self.name
+        return self.client.request(path, body)
+
+    def _lease_loop(self, watch):
+        unreachable = False
+        while True:
+            with self.condition:
+                if self.stopping:
+                    break
+                free = self.runner.scheduler.max_workers + LEASE_AHEAD - len(self.active)
+            response = None
+            if free > 0:
+                try:
+                    response = self._request("/lease", {"count": free})
+                    if unreachable:
+                        self.on_status("已重新连接到协调进程", LOG_INFO)
+                    unreachable = False
+                except OSError as e:
+                    if not unreachable:
+                        self.on_status(f"无法连接协调进程，稍后重试: {str(e)}", LOG_WARNING)
+                    unreachable = True
+            if response is not None:
+                if response["batch"] != self.batch:
+                    self.on_status("协调进程已开始新的批量，完成当前任务后退出", LOG_WARNING)
+                    self.stop()
+                    break
+                jobs = []
+                for values in response["jobs"]:
+                    job = job_from_dict(values)
+                    jobs.append(job)
+                    with self.condition:
+                        self.active[values["lease"]] = job
+                if jobs:
+                    self.runner.submit(jobs)
+                    continue
+                with self.condition:
+                    if response["finished"] and not self.active:
+                        break
+            # 没有可租的任务或槽位已满：等到有任务结束或下一次轮询
+            with self.condition:
+                self.condition.wait(POLL_INTERVAL)
+        watch.set()
+
+    def _heartbeat_loop(self, watch):
+        while not watch.wait(self.lease_seconds / 3):
+            with self.condition:
+                leases = list(self.active)
+            if not leases:
+                continue
+            try:
+                lost = self._request("/heartbeat", {"leases": leases})["lost"]
+            except OSError as e:
+                self.on_status(f"心跳发送失败: {str(e)}", LOG_WARNING)
+                continue
+            for lease in lost:
+                with self.condition:
+                    job = self.active.pop(lease, None)
+                if job is not None:
+                    self.on_status(f"{os.path.basename(job.video_path)}: 租约已失效，停止转换", LOG_WARNING)
+                    self.runner.cancel_job(job)
+
+    def _job_finished(self, job, success, message):
+        with self.condition:
+            lease = next((lease for lease, active in self.active.items() if active is job), None)
+            metrics = self.results.pop(job.video_path, None)
+        if lease is None:
+            # 租约已失效，任务交给了其他工作进程，本地的结果（通常是已取消）不计入
+            return
+        if metrics is not None and metrics.outcome == "cancelled":
+            # 本机取消（如按 Ctrl+C）的任务不上报，租约过期后由协调进程重新排队
+            with self.condition:
+                self.cancelled += 1
+                self.active.pop(lease, None)
+                self.condition.notify_all()
+            self.on_job_finished(job, success, message)
+            return
+        if success:
+            # 输出可能还在本机的输出缓冲区中，写回输出目录后（_job_committed）再上报完成
+            with self.condition:
+                self.committing[job.video_path] = (lease, message, metrics)
+            return
+        self._complete(job, lease, success, message, metrics)
+
+    def _job_committed(self, job, written):
+        with self.condition:
+            lease, message, metrics = self.committing.pop(job.video_path, (None, None, None))
+            if lease is None or self.active.get(lease) is not job:
+                # 等待写回期间租约已失效
+                return
+        if not written:
+            message = "输出未能写回输出目录"
+        self._complete(job, lease, written, message, metrics)
+
+    def _complete(self, job, lease, success, message, metrics):
+        accepted = rejected = False
+        body = {"lease": lease, "success": success, "message": message,
+                "metrics": metrics.to_dict() if metrics is not None else None}
+        for attempt in range(3):
+            try:
+                accepted = self._request("/complete", body)["accepted"]
+                rejected = not accepted
+                if rejected:
+                    self.on_status(f"{os.path.basename(job.video_path)}: 租约已失效，结果未被采用", LOG_WARNING)
+                break
+            except OSError as e:
+                if attempt == 2:
+                    self.on_status(f"{os.path.basename(job.video_path)}: 结果上报失败，租约过期后将重新转换: "
+                                   f"{str(e)}", LOG_WARNING)
+                else:
+                    time.sleep(POLL_INTERVAL)
+        with self.condition:
+            if accepted:
+                if success:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+            self.active.pop(lease, None)
+            self.condition.notify_all()
+        if not rejected:
+            self.on_job_finished(job, success, message)
@@ -8,19 +8,43 @@
 
 import sys
 import os
-import subprocess
+import shutil
 import threading
-import json
-from datetime import datetime
+from array import array
+from collections import deque
 from pathlib import Path
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, 
-                             QProgressBar, QTextEdit, QComboBox, QCheckBox,
-                             QGroupBox, QMessageBox, QTabWidget, QListWidget,
-                             QListWidgetItem, QSplitter, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QMimeData
+                             QProgressBar, QComboBox, QCheckBox,
+                             QGroupBox, QMessageBox, QTabWidget, QTableView,
+                             QHeaderView, QSplitter, QFrame, QSpinBox, QDoubleSpinBox, QLineEdit, QMenu, QTableWidget,
+                             QTableWidgetItem, QGridLayout, QListView, QAbstractItemView)
+from PyQt5.QtCore import (Qt, QObject, QThread, pyqtSignal, QTimer, QMimeData, QAbstractTableModel,
+                          QAbstractListModel, QModelIndex)
 from PyQt5.QtGui import QFont, QIcon, QPixmap, QPalette, QColor, QDragEnterEvent, QDropEvent
 
+import audio_sidecars
+from audio_processing import (DEFAULT_SILENCE_DURATION, DEFAULT_SILENCE_THRESHOLD, DEFAULT_TARGET_I, DEFAULT_TARGET_LRA,
+                              DEFAULT_TARGET_TP, AudioProcessing, LoudnessAnalyzer)
+from batch_journal import CANCELLED, DONE, BatchJournal, load_journal
+from conversion_cache import ConversionCache
+from conversion_metrics import MetricsRecorder
+from ffmpeg_discovery import default_store, discover_ffmpeg
+from folder_watcher import DEFAULT_SETTLE_SECONDS, FolderWatcher
+from media_probe import MetadataCache, MetadataPrefetcher
+from converter_core import (LOG_ERROR, LOG_INFO, LOG_WARNING, STOP_TIMEOUT, VIDEO_EXTENSIONS, BatchRunner, ConversionJob,
+                            MediaConverter, OUTPUT_FORMATS, default_log_dir, format_eta, iter_chunks,
+                            iter_video_files, job_is_cpu_bound, parse_output_spec, parse_quality, parse_track_spec,
+                            unique_outputs, user_cache_dir)
+from input_staging import DEFAULT_STAGING_AHEAD, DEFAULT_STAGING_BUDGET, StagingArea
+from output_layout import COLLISION_NAMES, COLLISION_POLICIES, DEFAULT_TEMPLATE, TEMPLATE_FIELDS, OutputLayout
+from output_spool import OutputSpool
+from storage_devices import KIND_NAMES, ThroughputMeter, device_for_path, format_rate
+
+# 可附加的输出格式：(显示名称, 格式说明)，与主MP3输出在同一次解码中写出
+EXTRA_OUTPUTS = [("MP3 128k", "mp3:128k"), ("MP3 320k", "mp3:320k"), ("AAC", "aac"),
+                 ("Opus", "opus"), ("FLAC", "flac"), ("WAV", "wav")]
+
 class DraggableLabel(QLabel):
     """支持拖拽的标签组件"""
     
@@ -97,8 +121,7 @@ class DraggableLabel(QLabel):
                     self.file_selected_callback(file_path)
             else:
                 # 检查是否为视频文件
-                video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.rmvb', '.ts'}
-                if Path(file_path).suffix.lower() in video_extensions:
+                if Path(file_path).suffix.lower() in VIDEO_EXTENSIONS:
                     self.setText(file_path)
                     self.setStyleSheet("""
                         QLabel {
@@ -130,83 +153,446 @@ class DraggableLabel(QLabel):
         """)
 
 class ConversionWorker(QThread):
-    """转换工作线程"""
+    """转换工作线程，将 MediaConverter 的回调转发为Qt信号"""
     progress = pyqtSignal(int)
-    status = pyqtSignal(str)
+    stats = pyqtSignal(float, float, float)  # 已处理媒体秒数, 速度倍率, 预计剩余秒数
+    duration_known = pyqtSignal(float)
+    status = pyqtSignal(str, int)  # 消息, 级别（LOG_INFO / LOG_WARNING / LOG_ERROR）
     finished = pyqtSignal(bool, str)
     
-    def __init__(self, video_path, output_dir, conversion_type, quality="original", ffmpeg_path="ffmpeg"):
+    def __init__(self, video_path, output_dir, conversion_type, quality="original", ffmpeg_path="ffmpeg",
+                 ffprobe_path="ffprobe", fast_mode=True, cache=None, metadata_cache=None, outputs=None,
+                 segments=0, staging=None, log_dir=None, layout=None, spool=None, processing=None,
+                 analyzer=None, tracks=None, sidecars=None):
         super().__init__()
         self.video_path = video_path
-        self.output_dir = output_dir
-        self.conversion_type = conversion_type
-        self.quality = quality
-        self.ffmpeg_path = ffmpeg_path
+        self.converter = MediaConverter(video_path, output_dir, conversion_type, quality,
+                                        ffmpeg_path, ffprobe_path, fast_mode,
+                                        on_status=self.status.emit,
+                                        on_progress=self.on_progress,
+                                        on_duration=self.duration_known.emit,
+                                        cache=cache,
+                                        metadata_cache=metadata_cache,
+                                        outputs=outputs,
+                                        segments=segments,
+                                        staging=staging,
+                                        log_dir=log_dir,
+                                        layout=layout,
+                                        spool=spool,
+                                        processing=processing,
+                                        analyzer=analyzer,
+                                        tracks=tracks,
+                                        sidecars=sidecars)
         
     def run(self):
-        try:
-            if self.conversion_type == "mp3":
-                success = self.convert_to_mp3()
-            else:
-                self.finished.emit(False, "不支持的转换类型")
-                return
-                
-            if success:
-                self.finished.emit(True, "转换完成")
-            else:
-                self.finished.emit(False, "转换失败")
-        except Exception as e:
-            self.finished.emit(False, f"转换出错: {str(e)}")
+        success, message = self.converter.run()
+        self.finished.emit(success, message)
+        
+    def on_progress(self, percent, out_time, speed, eta):
+        self.progress.emit(percent)
+        self.stats.emit(out_time, speed, eta)
+
+
+class FileTableModel(QAbstractTableModel):
+    """批量文件列表模型
+
+    数据按列存放在紧凑数组中，不为每个文件创建条目对象；视图只对可见行调用 data()，
+    文件大小也在首次显示时才读取。状态和进度的更新先记录为脏行，
+    由定时器统一发出 dataChanged，避免大量任务同时刷新淹没事件循环。
+    """
+    
+    COLUMNS = ["文件", "大小", "时长", "音频编码", "状态", "进度"]
+    COL_PATH, COL_SIZE, COL_DURATION, COL_CODEC, COL_STATUS, COL_PROGRESS = range(6)
+    
+    (STATUS_WAITING, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED,
+     STATUS_PAUSED, STATUS_CANCELLED) = range(8)
+    STATUS_TEXT = ["待转换", "排队中", "转换中", "完成", "失败", "已跳过", "已暂停", "已取消"]
+    STATUS_COLORS = [None, QColor("#888888"), QColor("#1565c0"), QColor("#2e7d32"), QColor("#c62828"),
+                     QColor("#6d4c41"), QColor("#ef6c00"), QColor("#888888")]
+    
+    # 脏行刷新间隔（毫秒）
+    FLUSH_INTERVAL = 200
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.sizes = array('q')        # -1 表示尚未读取
+        self.durations = array('d')    # 0 表示未知
+        self.codec_ids = array('H')    # 指向 codec_names 的下标，0 表示未知
+        self.codec_names = [""]
+        self.bit_rates = array('L')    # 音频比特率，0 表示未知；用于判断能否直接复制音轨
+        self.statuses = array('B')
+        self.progresses = array('B')
+        self.dirty_rows = set()
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start()
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if column == self.COL_PATH:
+                return self.paths[row]
+            if column == self.COL_SIZE:
+                return self.format_size(self.file_size(row))
+            if column == self.COL_DURATION:
+                return format_eta(self.durations[row]) if self.durations[row] > 0 else ""
+            if column == self.COL_CODEC:
+                return self.codec_names[self.codec_ids[row]]
+            if column == self.COL_STATUS:
+                return self.STATUS_TEXT[self.statuses[row]]
+            if column == self.COL_PROGRESS:
+                return f"{self.progresses[row]}%" if self.statuses[row] != self.STATUS_WAITING else ""
+        elif role == Qt.ForegroundRole and column == self.COL_STATUS:
+            return self.STATUS_COLORS[self.statuses[row]]
+        elif role == Qt.ToolTipRole and column == self.COL_PATH:
+            return self.paths[row]
+        return None
+    
+    def file_size(self, row):
+        """文件大小，首次访问时读取"""
+        if self.sizes[row] < 0:
+            try:
+                self.sizes[row] = os.path.getsize(self.paths[row])
+            except OSError:
+                self.sizes[row] = 0
+        return self.sizes[row]
+    
+    @staticmethod
+    def format_size(size):
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024 or unit == "GB":
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+    
+    def clear(self):
+        """清空列表"""
+        self.beginResetModel()
+        self.paths = []
+        self.sizes = array('q')
+        self.durations = array('d')
+        self.codec_ids = array('H')
+        self.codec_names = [""]
+        self.bit_rates = array('L')
+        self.statuses = array('B')
+        self.progresses = array('B')
+        self.dirty_rows.clear()
+        self.endResetModel()
+        
+    def append_paths(self, paths):
+        """追加一批文件，返回第一行的行号"""
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        self.paths.extend(paths)
+        count = len(paths)
+        self.sizes.extend([-1] * count)
+        self.durations.extend([0.0] * count)
+        self.codec_ids.extend([0] * count)
+        self.bit_rates.extend([0] * count)
+        self.statuses.extend([self.STATUS_WAITING] * count)
+        self.progresses.extend([0] * count)
+        self.endInsertRows()
+        return first
+    
+    def path(self, row):
+        return self.paths[row]
+    
+    def set_status(self, row, status):
+        self.statuses[row] = status
+        if status == self.STATUS_DONE or status == self.STATUS_SKIPPED:
+            self.progresses[row] = 100
+        self.dirty_rows.add(row)
+        
+    def set_progress(self, row, percent):
+        self.progresses[row] = max(0, min(100, percent))
+        self.dirty_rows.add(row)
+        
+    def set_media_info(self, row, duration=None, codec=None, bit_rate=None):
+        """记录探测到的时长、音频编码和比特率"""
+        if duration:
+            self.durations[row] = duration
+        if bit_rate:
+            self.bit_rates[row] = bit_rate
+        if codec:
+            if codec not in self.codec_names:
+                self.codec_names.append(codec)
+            self.codec_ids[row] = self.codec_names.index(codec)
+        self.dirty_rows.add(row)
+        
+    def flush(self):
+        """把积累的脏行合并为一次 dataChanged"""
+        if not self.dirty_rows:
+            return
+        first, last = min(self.dirty_rows), max(self.dirty_rows)
+        self.dirty_rows.clear()
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.COLUMNS) - 1))
+
+
+class MetadataBridge(QObject):
+    """把预读线程中的媒体信息结果转发到界面线程"""
+    probed = pyqtSignal(int, object)  # 行号, 媒体信息
+
+
+class WatchBridge(QObject):
+    """把文件夹监视线程报告的文件转发到界面线程"""
+    files_ready = pyqtSignal(list)
+    status = pyqtSignal(str, int)
+
+
+class StatusBridge(QObject):
+    """把后台线程（如输出缓冲区的写回线程）的状态消息转发到界面线程"""
+    status = pyqtSignal(str, int)
+
+
+class BatchBridge(QObject):
+    """把 BatchRunner 工作线程中的回调转发到界面线程"""
+    queued = pyqtSignal(object)  # ConversionJob
+    started = pyqtSignal(object, object)  # ConversionJob, MediaConverter
+    progress = pyqtSignal(int, int, float, float)  # 行号, 百分比, 已处理媒体秒数, 速度倍率
+    duration_known = pyqtSignal(int, float)  # 行号, 时长
+    status = pyqtSignal(str, int)
+    finished = pyqtSignal(object, bool, str)  # ConversionJob, 是否成功, 消息
+    concurrency = pyqtSignal(object)  # ConcurrencyDecision
+
+
+class ScanWorker(QThread):
+    """后台扫描目录，按块发送找到的视频文件"""
+    files_found = pyqtSignal(list)
+    scan_finished = pyqtSignal(int, bool)  # 文件总数, 是否被取消
     
-    def convert_to_mp3(self):
-        """转换为MP3"""
+    def __init__(self, directory, include=None, exclude=None, max_depth=None):
+        super().__init__()
+        self.directory = directory
+        self.include = include
+        self.exclude = exclude
+        self.max_depth = max_depth
+        self.cancel_event = threading.Event()
+        
+    def cancel(self):
+        """请求停止扫描"""
+        self.cancel_event.set()
+        
+    def run(self):
+        count = 0
+        files = iter_video_files(self.directory, self.include, self.exclude, self.max_depth, self.cancel_event)
+        for chunk in iter_chunks(files):
+            count += len(chunk)
+            self.files_found.emit(chunk)
+        self.scan_finished.emit(count, self.cancel_event.is_set())
+
+
+class FFmpegCheckWorker(QThread):
+    """后台查找FFmpeg并读取能力档案；缓存命中时几乎立即完成"""
+    checked = pyqtSignal(object)  # ffmpeg_discovery.FFmpegProfile，找不到时为None
+    
+    def __init__(self, configured=None, refresh=False):
+        super().__init__()
+        self.configured = configured
+        self.refresh = refresh
+        
+    def run(self):
         try:
-            video_name = Path(self.video_path).stem
-            output_path = os.path.join(self.output_dir, f"{video_name}.mp3")
-            
-            # 构建ffmpeg命令，保持原音质
-            if self.quality == "original":
-                cmd = [
-                    self.ffmpeg_path, "-i", self.video_path,
-                    "-vn", "-acodec", "libmp3lame",
-                    "-q:a", "0",  # 使用最高质量
-                    "-y", output_path
-                ]
-            else:
-                # 指定比特率
-                bitrate_map = {"128k": "128k", "192k": "192k", "320k": "320k"}
-                bitrate = bitrate_map.get(self.quality, "192k")
-                cmd = [
-                    self.ffmpeg_path, "-i", self.video_path,
-                    "-vn", "-acodec", "libmp3lame",
-                    "-ab", bitrate,
-                    "-y", output_path
-                ]
-            
-            self.status.emit("正在转换MP3...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                self.status.emit("MP3转换完成")
-                return True
-            else:
-                self.status.emit(f"MP3转换失败: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            self.status.emit(f"MP3转换出错: {str(e)}")
-            return False
+            profile = discover_ffmpeg(self.configured, refresh=self.refresh)
+        except Exception:
+            profile = None
+        self.checked.emit(profile)
+
+
+class LogModel(QAbstractListModel):
+    """运行日志模型
+
+    环形缓冲区最多保存 MAX_LINES 行，超出后丢弃最早的行；append() 只把新行放入待处理列表，
+    由定时器合并后一次插入，大量任务同时输出时界面每秒最多刷新几次。
+    低于 min_level 的行不显示，但仍保留在缓冲区中，切换过滤级别后可以看到。
+    """
+    
+    MAX_LINES = 5000
+    # 合并插入的间隔（毫秒）
+    FLUSH_INTERVAL = 200
+    LEVEL_COLORS = [None, QColor("#ef6c00"), QColor("#c62828")]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = deque(maxlen=self.MAX_LINES)  # 全部级别的 (级别, 文本)
+        self.rows = []  # 当前显示的 (级别, 文本)
+        self.pending = []
+        self.min_level = LOG_INFO
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush)
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        level, text = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.ForegroundRole:
+            return self.LEVEL_COLORS[level]
+        return None
+    
+    def append(self, text, level=LOG_INFO):
+        # 列表视图按单行显示，多行消息合并为一行
+        self.pending.append((level, str(text).replace("\n", " ")))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+            
+    def flush(self):
+        """把待处理的行插入模型，超出上限时先移除最早的行"""
+        pending, self.pending = self.pending, []
+        self.entries.extend(pending)
+        visible = [entry for entry in pending if entry[0] >= self.min_level][-self.MAX_LINES:]
+        if not visible:
+            return
+        overflow = len(self.rows) + len(visible) - self.MAX_LINES
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            del self.rows[:overflow]
+            self.endRemoveRows()
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(visible) - 1)
+        self.rows.extend(visible)
+        self.endInsertRows()
+        
+    def set_min_level(self, level):
+        self.flush()
+        self.beginResetModel()
+        self.min_level = level
+        self.rows = [entry for entry in self.entries if entry[0] >= level]
+        self.endResetModel()
+        
+    def clear(self):
+        self.beginResetModel()
+        self.entries.clear()
+        self.rows = []
+        self.pending = []
+        self.endResetModel()
+        
+    def text(self, rows=None):
+        """显示中的日志文本（rows 为行号列表时只取这些行）"""
+        rows = range(len(self.rows)) if rows is None else rows
+        return "\n".join(self.rows[row][1] for row in rows)
+
+
+class LogView(QWidget):
+    """带级别过滤的日志视图，append()/clear() 与 QTextEdit 的用法相同"""
+    
+    LEVEL_FILTERS = ["全部", "警告和错误", "仅错误"]
     
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+        
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("日志:"))
+        self.level_combo = QComboBox()
+        self.level_combo.addItems(self.LEVEL_FILTERS)
+        self.level_combo.currentIndexChanged.connect(lambda index: self.model.set_min_level(index))
+        filter_layout.addWidget(self.level_combo)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+        
+        self.model = LogModel(self)
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.list_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        layout.addWidget(self.list_view)
+        
+        # 插入新行前在底部时，插入后继续滚动到底部
+        self.follow_tail = True
+        self.model.rowsAboutToBeInserted.connect(self.remember_scroll)
+        self.model.rowsInserted.connect(self.scroll_to_tail)
+        
+    def append(self, text, level=LOG_INFO):
+        self.model.append(text, level)
+        
+    def clear(self):
+        self.model.clear()
+        
+    def remember_scroll(self):
+        scroll_bar = self.list_view.verticalScrollBar()
+        self.follow_tail = scroll_bar.value() >= scroll_bar.maximum()
+        
+    def scroll_to_tail(self):
+        if self.follow_tail:
+            self.list_view.scrollToBottom()
+            
+    def show_context_menu(self, pos):
+        menu = QMenu(self)
+        selected = sorted(index.row() for index in self.list_view.selectionModel().selectedRows())
+        copy_selected = menu.addAction("复制选中的行")
+        copy_selected.setEnabled(bool(selected))
+        copy_all = menu.addAction("复制全部")
+        action = menu.exec_(self.list_view.viewport().mapToGlobal(pos))
+        if action == copy_selected:
+            QApplication.clipboard().setText(self.model.text(selected))
+        elif action == copy_all:
+            QApplication.clipboard().setText(self.model.text())
 
 
 class VideoConverterApp(QMainWindow):
     """主应用程序窗口"""
     
+    # 批量进度条的刻度数（按媒体时长加权后换算为千分比）
+    BATCH_PROGRESS_SCALE = 1000
+    
     def __init__(self):
         super().__init__()
         self.init_ui()
-        self.conversion_workers = []
+        self.conversion_workers = []  # 单文件转换线程
+        self.batch_runner = None
+        self.batch_bridge = None
+        self.batch_jobs = {}  # 排队或转换中的批量任务：行号 -> ConversionJob
+        self.batch_converters = {}  # 转换中的批量任务：行号 -> MediaConverter
+        self.batch_active = False
+        self.batch_cancel_requested = False
+        self.scan_worker = None
+        self.conversion_cache = None
+        self.metadata_cache = None
+        self.metadata_prefetcher = None
+        self.metadata_bridge = None
+        self.batch_staging = None
+        self.batch_metrics = None
+        self.batch_skip_paths = set()  # 恢复批量时重新扫描需要跳过的已完成和已取消的文件
+        self.batch_layout = None
+        self.batch_spool = None
+        self.batch_processing = None
+        self.batch_tracks = None
+        self.batch_analyzer = None
+        self.batch_sidecars = None
+        self.spool_bridge = None
+        self.spool_closers = []  # 正在把剩余输出写回的线程，关闭程序时等待它们结束
+        self.folder_watcher = None
+        self.watch_bridge = None
+        self.watch_rows = None  # 监视文件夹时：文件路径 -> 文件列表中的行号
+        self.ffmpeg_profile = None
+        self.ffmpeg_check_worker = None
+        # 在后台查找FFmpeg，窗口不必等待ffmpeg启动
         self.check_ffmpeg()
+        self.check_resumable_batch()
         
     def init_ui(self):
         """初始化用户界面"""
@@ -285,6 +671,9 @@ class VideoConverterApp(QMainWindow):
         # 批量处理标签页
         self.create_batch_tab(tab_widget)
         
+        # 统计标签页
+        self.create_statistics_tab(tab_widget)
+        
         # 设置标签页
         self.create_settings_tab(tab_widget)
         
@@ -342,17 +731,45 @@ class VideoConverterApp(QMainWindow):
         self.mp3_checkbox = QCheckBox("转换为MP3")
         self.mp3_checkbox.setChecked(True)
         type_layout.addWidget(self.mp3_checkbox)
+        self.fast_mode_checkbox = QCheckBox("快速模式（源音频已是MP3时直接复制音轨）")
+        self.fast_mode_checkbox.setChecked(True)
+        type_layout.addWidget(self.fast_mode_checkbox)
         type_layout.addStretch()
         options_layout.addLayout(type_layout)
         
+        # 附加输出格式
+        extra_layout, self.extra_output_checkboxes = self.create_extra_outputs()
+        options_layout.addLayout(extra_layout)
+        
+        # 长音频分段并行编码
+        segments_layout = QHBoxLayout()
+        segments_layout.addWidget(QLabel("分段并行编码:"))
+        self.segments_spin = QSpinBox()
+        self.segments_spin.setRange(1, max(64, (os.cpu_count() or 1) * 4))
+        self.segments_spin.setValue(1)
+        self.segments_spin.setSpecialValueText("关闭")
+        self.segments_spin.setSuffix(" 段")
+        self.segments_spin.setToolTip("把很长的音频按时间切成多段，用多个CPU核心同时编码后无缝拼接；"
+                                      "每段至少1分钟，只对MP3/AAC/Opus重新编码时生效")
+        segments_layout.addWidget(self.segments_spin)
+        segments_layout.addStretch()
+        options_layout.addLayout(segments_layout)
+        
         layout.addWidget(options_group)
         
         # 转换按钮
+        convert_buttons_layout = QHBoxLayout()
         self.convert_btn = QPushButton("开始转换")
         self.convert_btn.clicked.connect(self.start_conversion)
         self.convert_btn.setFont(QFont("Arial", 12, QFont.Bold))
         self.convert_btn.setMinimumHeight(50)
-        layout.addWidget(self.convert_btn)
+        convert_buttons_layout.addWidget(self.convert_btn, 1)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setMinimumHeight(50)
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_conversion)
+        convert_buttons_layout.addWidget(self.cancel_btn)
+        layout.addLayout(convert_buttons_layout)
         
         # 进度条
         self.progress_bar = QProgressBar()
@@ -360,13 +777,33 @@ class VideoConverterApp(QMainWindow):
         layout.addWidget(self.progress_bar)
         
         # 状态显示
-        self.status_text = QTextEdit()
+        self.status_text = LogView()
         self.status_text.setMaximumHeight(150)
-        self.status_text.setReadOnly(True)
         layout.addWidget(self.status_text)
         
         tab_widget.addTab(conversion_widget, "单文件转换")
         
+    def create_extra_outputs(self):
+        """创建附加输出格式的复选框，返回 (布局, [(复选框, 格式说明)])"""
+        layout = QHBoxLayout()
+        layout.addWidget(QLabel("同时输出:"))
+        checkboxes = []
+        for label, spec in EXTRA_OUTPUTS:
+            checkbox = QCheckBox(label)
+            checkbox.setToolTip("与MP3在同一次解码中写出，不重复读取和解码视频")
+            layout.addWidget(checkbox)
+            checkboxes.append((checkbox, spec))
+        layout.addStretch()
+        return layout, checkboxes
+        
+    def selected_outputs(self, mp3_checkbox, quality_combo, extra_checkboxes):
+        """收集选中的输出 (格式, 音质) 列表"""
+        outputs = []
+        if mp3_checkbox.isChecked():
+            outputs.append(("mp3", parse_quality(quality_combo.currentText())))
+        outputs.extend(parse_output_spec(spec) for checkbox, spec in extra_checkboxes if checkbox.isChecked())
+        return unique_outputs(outputs)
+        
     def create_batch_tab(self, tab_widget):
         """创建批量处理标签页"""
         batch_widget = QWidget()
@@ -387,10 +824,60 @@ class VideoConverterApp(QMainWindow):
         dir_layout.addWidget(select_dir_btn)
         batch_layout.addLayout(dir_layout)
         
+        # 扫描过滤条件
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("包含:"))
+        self.scan_include_edit = QLineEdit()
+        self.scan_include_edit.setPlaceholderText("通配符，分号分隔，如 *.mp4;课程*")
+        filter_layout.addWidget(self.scan_include_edit, 1)
+        filter_layout.addWidget(QLabel("排除:"))
+        self.scan_exclude_edit = QLineEdit()
+        self.scan_exclude_edit.setPlaceholderText("如 *sample*;backup")
+        filter_layout.addWidget(self.scan_exclude_edit, 1)
+        filter_layout.addWidget(QLabel("最大深度:"))
+        self.scan_depth_spin = QSpinBox()
+        self.scan_depth_spin.setRange(-1, 99)
+        self.scan_depth_spin.setValue(-1)
+        self.scan_depth_spin.setSpecialValueText("不限")
+        filter_layout.addWidget(self.scan_depth_spin)
+        self.stop_scan_btn = QPushButton("停止扫描")
+        self.stop_scan_btn.setEnabled(False)
+        self.stop_scan_btn.clicked.connect(self.stop_scan)
+        filter_layout.addWidget(self.stop_scan_btn)
+        batch_layout.addLayout(filter_layout)
+        
+        # 监视文件夹：批量转换开始后继续转换新加入的文件
+        watch_layout = QHBoxLayout()
+        self.watch_checkbox = QCheckBox("监视文件夹（自动转换新加入或被修改的文件）")
+        self.watch_checkbox.toggled.connect(self.on_watch_toggled)
+        watch_layout.addWidget(self.watch_checkbox)
+        watch_layout.addWidget(QLabel("写入完成判定:"))
+        self.watch_settle_spin = QSpinBox()
+        self.watch_settle_spin.setRange(1, 600)
+        self.watch_settle_spin.setValue(int(DEFAULT_SETTLE_SECONDS))
+        self.watch_settle_spin.setSuffix(" 秒大小不变")
+        watch_layout.addWidget(self.watch_settle_spin)
+        watch_layout.addStretch()
+        batch_layout.addLayout(watch_layout)
+        
         # 文件列表
-        self.file_list = QListWidget()
+        self.file_model = FileTableModel(self)
+        self.file_table = QTableView()
+        self.file_table.setModel(self.file_model)
+        self.file_table.setWordWrap(False)
+        self.file_table.setSelectionBehavior(QTableView.SelectRows)
+        self.file_table.verticalHeader().setVisible(False)
+        # 固定行高，视图无需逐行计算尺寸
+        self.file_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.file_table.verticalHeader().setDefaultSectionSize(22)
+        header = self.file_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(FileTableModel.COL_PATH, QHeaderView.Stretch)
+        # 右键菜单：暂停/继续/取消单个任务
+        self.file_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.file_table.customContextMenuRequested.connect(self.show_file_menu)
         batch_layout.addWidget(QLabel("视频文件列表:"))
-        batch_layout.addWidget(self.file_list)
+        batch_layout.addWidget(self.file_table)
         
         layout.addWidget(batch_group)
         
@@ -403,6 +890,12 @@ class VideoConverterApp(QMainWindow):
         self.batch_mp3_checkbox = QCheckBox("转换为MP3")
         self.batch_mp3_checkbox.setChecked(True)
         batch_type_layout.addWidget(self.batch_mp3_checkbox)
+        self.batch_fast_mode_checkbox = QCheckBox("快速模式（源音频已是MP3时直接复制音轨）")
+        self.batch_fast_mode_checkbox.setChecked(True)
+        batch_type_layout.addWidget(self.batch_fast_mode_checkbox)
+        self.batch_cache_checkbox = QCheckBox("跳过未变化的文件（转换缓存）")
+        self.batch_cache_checkbox.setChecked(True)
+        batch_type_layout.addWidget(self.batch_cache_checkbox)
         batch_type_layout.addStretch()
         batch_options_layout.addLayout(batch_type_layout)
         
@@ -415,28 +908,201 @@ class VideoConverterApp(QMainWindow):
         batch_mp3_layout.addStretch()
         batch_options_layout.addLayout(batch_mp3_layout)
         
+        # 附加输出格式
+        batch_extra_layout, self.batch_extra_output_checkboxes = self.create_extra_outputs()
+        batch_options_layout.addLayout(batch_extra_layout)
+        
+        # 输出位置
+        output_root_layout = QHBoxLayout()
+        output_root_layout.addWidget(QLabel("输出目录:"))
+        self.batch_output_edit = QLineEdit()
+        self.batch_output_edit.setPlaceholderText("留空则输出到视频所在目录")
+        output_root_layout.addWidget(self.batch_output_edit, 1)
+        select_output_btn = QPushButton("选择")
+        select_output_btn.clicked.connect(self.select_batch_output_directory)
+        output_root_layout.addWidget(select_output_btn)
+        self.batch_mirror_checkbox = QCheckBox("保留子目录结构")
+        self.batch_mirror_checkbox.setChecked(True)
+        output_root_layout.addWidget(self.batch_mirror_checkbox)
+        batch_options_layout.addLayout(output_root_layout)
+        
+        # 文件名模板和重名处理
+        naming_layout = QHBoxLayout()
+        naming_layout.addWidget(QLabel("文件名模板:"))
+        self.batch_template_edit = QLineEdit()
+        self.batch_template_edit.setPlaceholderText(DEFAULT_TEMPLATE)
+        self.batch_template_edit.setToolTip("不含扩展名，可包含 / 放入子目录。可用字段：\n" + "\n".join(
+            f"{{{field}}} {text}" for field, text in TEMPLATE_FIELDS.items()))
+        naming_layout.addWidget(self.batch_template_edit, 1)
+        naming_layout.addWidget(QLabel("文件已存在时:"))
+        self.batch_collision_combo = QComboBox()
+        self.batch_collision_combo.addItems([COLLISION_NAMES[policy] for policy in COLLISION_POLICIES])
+        naming_layout.addWidget(self.batch_collision_combo)
+        self.batch_spool_checkbox = QCheckBox("先写入本地缓冲区，再批量写回输出目录")
+        self.batch_spool_checkbox.setToolTip("输出先写到本地临时目录，累积后按顺序整块写回，"
+                                             "避免多个转换同时向慢速或网络存储零散写入小文件")
+        naming_layout.addWidget(self.batch_spool_checkbox)
+        batch_options_layout.addLayout(naming_layout)
+        
         layout.addWidget(batch_options_group)
         
         # 批量转换按钮
+        batch_buttons_layout = QHBoxLayout()
         self.batch_convert_btn = QPushButton("开始批量转换")
         self.batch_convert_btn.clicked.connect(self.start_batch_conversion)
         self.batch_convert_btn.setFont(QFont("Arial", 12, QFont.Bold))
         self.batch_convert_btn.setMinimumHeight(50)
-        layout.addWidget(self.batch_convert_btn)
+        batch_buttons_layout.addWidget(self.batch_convert_btn, 1)
+        # 上次批量未完成时显示，从任务日志继续
+        self.resume_batch_btn = QPushButton("继续上次批量")
+        self.resume_batch_btn.clicked.connect(self.resume_batch)
+        self.resume_batch_btn.setFont(QFont("Arial", 12, QFont.Bold))
+        self.resume_batch_btn.setMinimumHeight(50)
+        self.resume_batch_btn.setVisible(False)
+        batch_buttons_layout.addWidget(self.resume_batch_btn)
+        # 批量进行中的暂停/继续和取消
+        self.pause_batch_btn = QPushButton("暂停")
+        self.pause_batch_btn.setMinimumHeight(50)
+        self.pause_batch_btn.setEnabled(False)
+        self.pause_batch_btn.clicked.connect(self.toggle_batch_pause)
+        batch_buttons_layout.addWidget(self.pause_batch_btn)
+        self.cancel_batch_btn = QPushButton("取消批量")
+        self.cancel_batch_btn.setMinimumHeight(50)
+        self.cancel_batch_btn.setEnabled(False)
+        self.cancel_batch_btn.clicked.connect(self.cancel_batch)
+        batch_buttons_layout.addWidget(self.cancel_batch_btn)
+        layout.addLayout(batch_buttons_layout)
         
-        # 批量进度条
+        # 批量进度条，由定时器统一刷新
         self.batch_progress_bar = QProgressBar()
         self.batch_progress_bar.setVisible(False)
         layout.addWidget(self.batch_progress_bar)
+        self.batch_refresh_timer = QTimer(self)
+        self.batch_refresh_timer.setInterval(FileTableModel.FLUSH_INTERVAL)
+        self.batch_refresh_timer.timeout.connect(self.update_batch_progress)
         
         # 批量状态显示
-        self.batch_status_text = QTextEdit()
-        self.batch_status_text.setMaximumHeight(150)
-        self.batch_status_text.setReadOnly(True)
+        self.batch_status_text = LogView()
+        self.batch_status_text.setMaximumHeight(180)
         layout.addWidget(self.batch_status_text)
         
         tab_widget.addTab(batch_widget, "批量转换")
         
+    def create_statistics_tab(self, tab_widget):
+        """创建统计标签页：批量汇总指标和最近任务的明细"""
+        statistics_widget = QWidget()
+        layout = QVBoxLayout(statistics_widget)
+        
+        summary_group = QGroupBox("本次批量")
+        summary_layout = QGridLayout(summary_group)
+        self.summary_labels = {}
+        summary_items = [("jobs", "任务"), ("elapsed", "已用时间"), ("throughput", "吞吐量"),
+                         ("speed", "平均速度"), ("latency", "任务耗时 p50 / p95"), ("queue_wait", "排队等待 p50 / p95"),
+                         ("bytes", "读取 / 写出"), ("peak_rss", "FFmpeg峰值内存"), ("concurrency", "并发")]
+        for i, (key, title) in enumerate(summary_items):
+            summary_layout.addWidget(QLabel(f"{title}:"), i // 2, i % 2 * 2)
+            label = QLabel("-")
+            summary_layout.addWidget(label, i // 2, i % 2 * 2 + 1)
+            self.summary_labels[key] = label
+        layout.addWidget(summary_group)
+        
+        jobs_group = QGroupBox("最近任务")
+        jobs_layout = QVBoxLayout(jobs_group)
+        self.metrics_table = QTableWidget(0, 10)
+        self.metrics_table.setHorizontalHeaderLabels(["文件", "结果", "退出码", "排队", "读取信息", "转换",
+                                                      "倍速", "读取", "写出", "峰值内存"])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        jobs_layout.addWidget(self.metrics_table)
+        layout.addWidget(jobs_group)
+        
+        export_layout = QHBoxLayout()
+        export_jsonl_btn = QPushButton("导出JSONL")
+        export_jsonl_btn.clicked.connect(self.export_metrics_jsonl)
+        export_layout.addWidget(export_jsonl_btn)
+        export_prometheus_btn = QPushButton("导出Prometheus")
+        export_prometheus_btn.clicked.connect(self.export_metrics_prometheus)
+        export_layout.addWidget(export_prometheus_btn)
+        export_layout.addStretch()
+        layout.addLayout(export_layout)
+        
+        self.metrics_jsonl_path = os.path.join(user_cache_dir(), "batch_metrics.jsonl")
+        self.metrics_prometheus_path = os.path.join(user_cache_dir(), "video_converter.prom")
+        prometheus_hint = QLabel(f"转换过程中汇总指标会定期写入 {self.metrics_prometheus_path}，"
+                                 "可由 node_exporter 的 textfile 收集器读取")
+        prometheus_hint.setWordWrap(True)
+        prometheus_hint.setStyleSheet("color: #666666;")
+        layout.addWidget(prometheus_hint)
+        
+        self.statistics_refresh_timer = QTimer(self)
+        self.statistics_refresh_timer.setInterval(1000)
+        self.statistics_refresh_timer.timeout.connect(self.refresh_statistics)
+        
+        tab_widget.addTab(statistics_widget, "统计")
+        
+    def refresh_statistics(self):
+        """刷新统计页：汇总指标和最近任务"""
+        if self.batch_metrics is None:
+            return
+        summary = self.batch_metrics.summary()
+        format_size = FileTableModel.format_size
+        cancelled = f"，取消 {summary['cancelled']}" if summary["cancelled"] else ""
+        self.summary_labels["jobs"].setText(f"{summary['jobs']}（成功 {summary['succeeded']}，失败 {summary['failed']}{cancelled}）")
+        self.summary_labels["elapsed"].setText(format_eta(summary["elapsed"]))
+        self.summary_labels["throughput"].setText(f"{summary['media_hours_per_hour']:.2f} 媒体小时/小时")
+        self.summary_labels["speed"].setText(f"{summary['speed']:.1f}x 实时")
+        self.summary_labels["latency"].setText(f"{summary['latency_p50']:.1f}s / {summary['latency_p95']:.1f}s")
+        self.summary_labels["queue_wait"].setText(f"{summary['queue_wait_p50']:.1f}s / {summary['queue_wait_p95']:.1f}s")
+        self.summary_labels["bytes"].setText(f"{format_size(summary['bytes_in'])} / {format_size(summary['bytes_out'])}")
+        self.summary_labels["peak_rss"].setText(format_size(summary["peak_rss"]))
+        if summary["concurrency"]:
+            self.summary_labels["concurrency"].setText(f"{summary['concurrency']}: {summary['concurrency_reason']}")
+        else:
+            self.summary_labels["concurrency"].setText(str(self.batch_runner.scheduler.max_workers)
+                                                       if self.batch_runner is not None else "-")
+        
+        jobs = self.batch_metrics.recent_jobs()
+        self.metrics_table.setRowCount(len(jobs))
+        for row, metrics in enumerate(jobs):
+            values = [os.path.basename(metrics.path), metrics.outcome,
+                      "" if metrics.exit_code is None else str(metrics.exit_code),
+                      f"{metrics.queue_wait:.1f}s", f"{metrics.probe_time:.2f}s", f"{metrics.encode_time:.1f}s",
+                      f"{metrics.speed:.1f}x", format_size(metrics.bytes_in), format_size(metrics.bytes_out),
+                      format_size(metrics.peak_rss)]
+            for column, value in enumerate(values):
+                self.metrics_table.setItem(row, column, QTableWidgetItem(value))
+                
+    def on_concurrency_decision(self, decision):
+        """自适应并发调整并发数时写入批量日志（决定本身由 BatchRunner 记入指标）"""
+        if decision.changed:
+            self.batch_status_text.append(f"并发数 {decision.previous} → {decision.level}: {decision.reason}")
+            
+    def export_metrics_jsonl(self):
+        """导出本次批量每个任务的指标（JSON Lines）"""
+        if not os.path.exists(self.metrics_jsonl_path):
+            QMessageBox.information(self, "提示", "还没有批量转换的指标")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出JSONL", "metrics.jsonl", "JSON Lines (*.jsonl)")
+        if path:
+            try:
+                shutil.copyfile(self.metrics_jsonl_path, path)
+            except OSError as e:
+                QMessageBox.warning(self, "警告", f"导出失败: {str(e)}")
+                
+    def export_metrics_prometheus(self):
+        """导出本次批量的汇总指标（Prometheus 文本格式）"""
+        if self.batch_metrics is None:
+            QMessageBox.information(self, "提示", "还没有批量转换的指标")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出Prometheus", "video_converter.prom",
+                                              "Prometheus 文本 (*.prom)")
+        if path:
+            try:
+                self.batch_metrics.write_prometheus(path)
+            except OSError as e:
+                QMessageBox.warning(self, "警告", f"导出失败: {str(e)}")
+        
     def create_settings_tab(self, tab_widget):
         """创建设置标签页"""
         settings_widget = QWidget()
@@ -450,12 +1116,176 @@ class VideoConverterApp(QMainWindow):
         self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold;")
         ffmpeg_layout.addWidget(self.ffmpeg_status_label)
         
+        self.ffmpeg_detail_label = QLabel("")
+        self.ffmpeg_detail_label.setWordWrap(True)
+        self.ffmpeg_detail_label.setStyleSheet("padding: 0 10px; color: #666666;")
+        ffmpeg_layout.addWidget(self.ffmpeg_detail_label)
+        
+        ffmpeg_buttons_layout = QHBoxLayout()
         check_ffmpeg_btn = QPushButton("重新检查FFmpeg")
-        check_ffmpeg_btn.clicked.connect(self.check_ffmpeg)
-        ffmpeg_layout.addWidget(check_ffmpeg_btn)
+        check_ffmpeg_btn.setToolTip("重新运行ffmpeg读取版本、编码器和硬件加速信息（平时使用缓存的结果）")
+        check_ffmpeg_btn.clicked.connect(lambda: self.check_ffmpeg(refresh=True))
+        ffmpeg_buttons_layout.addWidget(check_ffmpeg_btn)
+        select_ffmpeg_btn = QPushButton("指定FFmpeg程序")
+        select_ffmpeg_btn.setToolTip("优先使用指定的ffmpeg，同目录下的ffprobe一起使用")
+        select_ffmpeg_btn.clicked.connect(self.select_ffmpeg)
+        ffmpeg_buttons_layout.addWidget(select_ffmpeg_btn)
+        ffmpeg_layout.addLayout(ffmpeg_buttons_layout)
         
         layout.addWidget(ffmpeg_group)
         
+        # 音频处理：单文件和批量转换都适用，重新编码时生效
+        processing_group = QGroupBox("音频处理")
+        processing_layout = QVBoxLayout(processing_group)
+        
+        loudnorm_layout = QHBoxLayout()
+        self.loudnorm_checkbox = QCheckBox("响度标准化（EBU R128 两遍）")
+        self.loudnorm_checkbox.setToolTip("第一遍测量响度，第二遍按测量值线性调整音量；测量结果按源文件缓存，"
+                                          "以其他格式或码率重新编码时不再分析。批量转换时会在其他任务编码的同时提前分析接下来的文件")
+        loudnorm_layout.addWidget(self.loudnorm_checkbox)
+        self.target_lufs_spin = self.create_level_spin(-70, -5, DEFAULT_TARGET_I, " LUFS")
+        loudnorm_layout.addWidget(QLabel("目标响度:"))
+        loudnorm_layout.addWidget(self.target_lufs_spin)
+        self.true_peak_spin = self.create_level_spin(-9, 0, DEFAULT_TARGET_TP, " dBTP")
+        loudnorm_layout.addWidget(QLabel("真峰值:"))
+        loudnorm_layout.addWidget(self.true_peak_spin)
+        self.lra_spin = self.create_level_spin(1, 50, DEFAULT_TARGET_LRA, " LU")
+        loudnorm_layout.addWidget(QLabel("响度范围:"))
+        loudnorm_layout.addWidget(self.lra_spin)
+        loudnorm_layout.addStretch()
+        processing_layout.addLayout(loudnorm_layout)
+        
+        silence_layout = QHBoxLayout()
+        self.trim_silence_checkbox = QCheckBox("裁剪静音")
+        self.trim_silence_checkbox.setToolTip("去掉开头的静音，并把较长的停顿（包括结尾）缩短到设定的时长")
+        silence_layout.addWidget(self.trim_silence_checkbox)
+        self.silence_threshold_spin = self.create_level_spin(-90, -20, DEFAULT_SILENCE_THRESHOLD, " dB")
+        silence_layout.addWidget(QLabel("静音电平:"))
+        silence_layout.addWidget(self.silence_threshold_spin)
+        self.silence_duration_spin = self.create_level_spin(0.1, 10, DEFAULT_SILENCE_DURATION, " 秒")
+        silence_layout.addWidget(QLabel("停顿最长:"))
+        silence_layout.addWidget(self.silence_duration_spin)
+        silence_layout.addStretch()
+        processing_layout.addLayout(silence_layout)
+        
+        processing_hint = QLabel("需要处理音频时不会直接复制音轨，也不会分段并行编码")
+        processing_hint.setStyleSheet("color: #666666;")
+        processing_layout.addWidget(processing_hint)
+        
+        tracks_layout = QHBoxLayout()
+        tracks_layout.addWidget(QLabel("按音轨输出:"))
+        self.tracks_edit = QLineEdit()
+        self.tracks_edit.setPlaceholderText("留空只转换默认音轨；all 为全部音轨，或如 1,3 / eng,jpn")
+        self.tracks_edit.setToolTip("多音轨视频（如多语言、解说音轨）的每个选中音轨分别输出一个文件，只读取一次源文件；\n"
+                                    "序号从1开始，也可以写语言代码。文件名加上音轨序号、语言和标题，"
+                                    "与源音轨编码相同的音轨在快速模式下直接复制")
+        tracks_layout.addWidget(self.tracks_edit, 1)
+        processing_layout.addLayout(tracks_layout)
+        
+        sidecars_layout = QHBoxLayout()
+        self.sidecars_checkbox = QCheckBox("生成波形和指纹附属文件")
+        self.sidecars_checkbox.setToolTip("转换时顺便解码一路单声道PCM，在输出文件旁写出波形峰值（audiowaveform JSON，"
+                                          "可直接用于 peaks.js / wavesurfer.js）和音频指纹，不再为此重新读取源文件")
+        sidecars_layout.addWidget(self.sidecars_checkbox)
+        self.skip_duplicates_checkbox = QCheckBox("跳过内容重复的文件")
+        self.skip_duplicates_checkbox.setToolTip("批量转换时，开头的音频指纹与本批量中已转换的文件相同的源文件"
+                                                 "（如以其他格式重新导出的同一段录音）读完开头就停止转换，不写输出")
+        sidecars_layout.addWidget(self.skip_duplicates_checkbox)
+        sidecars_layout.addStretch()
+        if not audio_sidecars.available():
+            for checkbox in (self.sidecars_checkbox, self.skip_duplicates_checkbox):
+                checkbox.setEnabled(False)
+                checkbox.setToolTip("需要安装NumPy（pip install numpy）")
+        processing_layout.addLayout(sidecars_layout)
+        layout.addWidget(processing_group)
+        
+        # 性能设置
+        perf_group = QGroupBox("性能")
+        perf_layout = QVBoxLayout(perf_group)
+        
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("并发转换任务数:"))
+        self.max_workers_spin = QSpinBox()
+        self.max_workers_spin.setRange(1, max(64, (os.cpu_count() or 1) * 4))
+        self.max_workers_spin.setValue(os.cpu_count() or 1)
+        self.max_workers_spin.setToolTip("同时运行的FFmpeg进程数量，默认为CPU核心数")
+        workers_layout.addWidget(self.max_workers_spin)
+        workers_layout.addWidget(QLabel("其中重新编码最多:"))
+        self.cpu_workers_spin = QSpinBox()
+        self.cpu_workers_spin.setRange(1, os.cpu_count() or 1)
+        self.cpu_workers_spin.setValue(os.cpu_count() or 1)
+        self.cpu_workers_spin.setToolTip("同时重新编码的任务数，不超过CPU核心数；直接复制音轨的任务只受存储设备的并发上限约束")
+        self.cpu_workers_spin.valueChanged.connect(self.on_cpu_workers_changed)
+        workers_layout.addWidget(self.cpu_workers_spin)
+        workers_layout.addStretch()
+        perf_layout.addLayout(workers_layout)
+        
+        self.adaptive_checkbox = QCheckBox("自适应并发（并发转换任务数作为上限）")
+        self.adaptive_checkbox.setToolTip("批量转换时根据CPU占用、iowait、内存压力和各任务的实时倍速自动增减同时运行的FFmpeg进程数，"
+                                          "使每秒转换的媒体时长最大；当前并发数和原因显示在统计页")
+        perf_layout.addWidget(self.adaptive_checkbox)
+        
+        order_layout = QHBoxLayout()
+        order_layout.addWidget(QLabel("任务顺序:"))
+        self.job_order_combo = QComboBox()
+        self.job_order_combo.addItems(["先进先出", "最长优先"])
+        self.job_order_combo.setToolTip("最长优先：按预读到的媒体时长从长到短转换，减少批量末尾的等待")
+        order_layout.addWidget(self.job_order_combo)
+        order_layout.addStretch()
+        perf_layout.addLayout(order_layout)
+        
+        self.prefetch_checkbox = QCheckBox("扫描时并行预读媒体信息（时长、音频编码等）")
+        self.prefetch_checkbox.setChecked(True)
+        perf_layout.addWidget(self.prefetch_checkbox)
+        
+        layout.addWidget(perf_group)
+        
+        # 存储设备：按源文件所在的设备分别限制并发，显示实时读取速度
+        device_group = QGroupBox("存储设备")
+        device_layout = QVBoxLayout(device_group)
+        device_hint = QLabel("批量转换按源文件所在的设备分组调度，机械硬盘和网络存储默认最多同时读取2个文件；"
+                             "扫描到新设备时自动加入列表")
+        device_hint.setWordWrap(True)
+        device_layout.addWidget(device_hint)
+        self.device_table = QTableWidget(0, 5)
+        self.device_table.setHorizontalHeaderLabels(["设备", "类型", "并发上限", "任务", "读取速度"])
+        self.device_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.device_table.verticalHeader().setVisible(False)
+        self.device_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.device_table.setMaximumHeight(160)
+        device_layout.addWidget(self.device_table)
+        
+        # 网络存储暂存：提前把接下来的输入复制到本地，ffmpeg从本地读取
+        staging_layout = QHBoxLayout()
+        self.staging_checkbox = QCheckBox("网络存储上的文件先复制到本地再转换")
+        self.staging_checkbox.setToolTip("批量转换时用大块顺序读取提前复制接下来的几个文件，"
+                                         "输出在本地写完后再整块写回，避免通过网络大量小块读取")
+        staging_layout.addWidget(self.staging_checkbox)
+        staging_layout.addWidget(QLabel("暂存区上限:"))
+        self.staging_size_spin = QSpinBox()
+        self.staging_size_spin.setRange(1, 1024)
+        self.staging_size_spin.setValue(DEFAULT_STAGING_BUDGET // 1024 ** 3)
+        self.staging_size_spin.setSuffix(" GB")
+        staging_layout.addWidget(self.staging_size_spin)
+        staging_layout.addWidget(QLabel("提前复制:"))
+        self.staging_ahead_spin = QSpinBox()
+        self.staging_ahead_spin.setRange(1, 32)
+        self.staging_ahead_spin.setValue(DEFAULT_STAGING_AHEAD)
+        self.staging_ahead_spin.setSuffix(" 个文件")
+        staging_layout.addWidget(self.staging_ahead_spin)
+        staging_layout.addStretch()
+        device_layout.addLayout(staging_layout)
+        self.staging_usage_label = QLabel("")
+        device_layout.addWidget(self.staging_usage_label)
+        layout.addWidget(device_group)
+        self.device_rows = {}  # 挂载点 -> 表格行号
+        self.device_limits = {}  # 用户修改过的设备并发上限
+        self.device_finished_bytes = {}  # 挂载点 -> 本次批量中已结束任务读取的字节数
+        self.device_throughput = ThroughputMeter()
+        self.device_refresh_timer = QTimer(self)
+        self.device_refresh_timer.setInterval(1000)
+        self.device_refresh_timer.timeout.connect(self.refresh_device_table)
+        
         # 关于信息
         about_group = QGroupBox("关于")
         about_layout = QVBoxLayout(about_group)
@@ -479,6 +1309,53 @@ class VideoConverterApp(QMainWindow):
         
         tab_widget.addTab(settings_widget, "设置")
         
+    @staticmethod
+    def create_level_spin(minimum, maximum, value, suffix):
+        """音频处理参数的数值框"""
+        spin = QDoubleSpinBox()
+        spin.setRange(minimum, maximum)
+        spin.setDecimals(1)
+        spin.setSingleStep(0.5)
+        spin.setValue(value)
+        spin.setSuffix(suffix)
+        return spin
+        
+    def audio_processing(self):
+        """按设置页的选项创建音频处理设置"""
+        return AudioProcessing(self.loudnorm_checkbox.isChecked(), self.target_lufs_spin.value(),
+                               self.true_peak_spin.value(), self.lra_spin.value(),
+                               self.trim_silence_checkbox.isChecked(), self.silence_threshold_spin.value(),
+                               self.silence_duration_spin.value())
+        
+    def audio_sidecars(self, tracks):
+        """按设置页的选项创建附属文件设置；未启用或按音轨输出时返回None"""
+        waveform = self.sidecars_checkbox.isChecked()
+        skip_duplicates = self.skip_duplicates_checkbox.isChecked()
+        if not (waveform or skip_duplicates) or not audio_sidecars.available():
+            return None
+        if tracks is not None:
+            QMessageBox.information(self, "提示", "按音轨输出时不生成附属文件，也不检查重复内容")
+            return None
+        return audio_sidecars.AudioSidecars(waveform, waveform, skip_duplicates)
+        
+    def selected_tracks(self):
+        """设置页选择的音轨（见 parse_track_spec）；格式错误时提示并返回False"""
+        try:
+            return parse_track_spec(self.tracks_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return False
+        
+    def set_audio_processing(self, processing):
+        """把音频处理设置显示到设置页（从任务日志恢复时）"""
+        self.loudnorm_checkbox.setChecked(processing.loudnorm)
+        self.target_lufs_spin.setValue(processing.target_i)
+        self.true_peak_spin.setValue(processing.target_tp)
+        self.lra_spin.setValue(processing.target_lra)
+        self.trim_silence_checkbox.setChecked(processing.trim_silence)
+        self.silence_threshold_spin.setValue(processing.silence_threshold)
+        self.silence_duration_spin.setValue(processing.silence_duration)
+        
     def select_video_file(self, file_path=None):
         """选择视频文件"""
         if file_path is None:
@@ -499,6 +1376,12 @@ class VideoConverterApp(QMainWindow):
         if dir_path:
             self.output_path_label.setText(dir_path)
             
+    def select_batch_output_directory(self):
+        """选择批量转换的输出目录"""
+        dir_path = QFileDialog.getExistingDirectory(self, "选择输出目录")
+        if dir_path:
+            self.batch_output_edit.setText(dir_path)
+            
     def select_batch_directory(self, dir_path=None):
         """选择批量处理目录"""
         if dir_path is None:
@@ -506,6 +1389,9 @@ class VideoConverterApp(QMainWindow):
             dir_path = QFileDialog.getExistingDirectory(self, "选择视频目录")
         
         if dir_path:
+            if self.batch_active:
+                QMessageBox.warning(self, "警告", "批量转换进行中，请等待完成后再选择目录")
+                return
             # 检查是否为目录
             if os.path.isdir(dir_path):
                 self.batch_dir_label.setText(dir_path)
@@ -514,16 +1400,183 @@ class VideoConverterApp(QMainWindow):
                 QMessageBox.warning(self, "警告", "请选择文件夹！")
             
     def load_video_files(self, directory):
-        """加载目录中的视频文件"""
-        self.file_list.clear()
-        video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.rmvb', '.ts'}
-        
-        for file_path in Path(directory).rglob('*'):
-            if file_path.suffix.lower() in video_extensions:
-                item = QListWidgetItem(str(file_path))
-                self.file_list.addItem(item)
-                
-        self.batch_status_text.append(f"找到 {self.file_list.count()} 个视频文件")
+        """在后台线程中扫描目录，找到的视频文件分块加入列表"""
+        self.stop_scan()
+        self.file_model.clear()
+        
+        include = [p.strip() for p in self.scan_include_edit.text().split(";") if p.strip()]
+        exclude = [p.strip() for p in self.scan_exclude_edit.text().split(";") if p.strip()]
+        max_depth = self.scan_depth_spin.value() if self.scan_depth_spin.value() >= 0 else None
+        
+        self.stop_metadata_prefetch()
+        if self.prefetch_checkbox.isChecked():
+            self.metadata_bridge = MetadataBridge(self)
+            self.metadata_bridge.probed.connect(self.on_metadata_probed)
+            self.metadata_prefetcher = MetadataPrefetcher(getattr(self, 'ffprobe_path', 'ffprobe'),
+                                                          self.get_metadata_cache(),
+                                                          on_result=lambda row, path, info, bridge=self.metadata_bridge:
+                                                          bridge.probed.emit(row, info))
+        
+        self.scan_worker = ScanWorker(directory, include, exclude, max_depth)
+        self.scan_worker.files_found.connect(self.on_scan_files_found)
+        self.scan_worker.scan_finished.connect(self.on_scan_finished)
+        self.stop_scan_btn.setEnabled(True)
+        self.batch_status_text.append(f"正在扫描: {directory}")
+        self.scan_worker.start()
+        
+    def stop_scan(self):
+        """取消正在进行的目录扫描"""
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+            self.scan_worker.wait()
+            
+    def on_scan_files_found(self, paths):
+        """扫描线程找到一批视频文件"""
+        if self.sender() is not self.scan_worker:
+            # 已被取消的旧扫描残留在事件队列中的结果
+            return
+        if self.batch_skip_paths:
+            paths = [path for path in paths if path not in self.batch_skip_paths]
+            if not paths:
+                return
+        if self.watch_rows is not None:
+            # 监视线程可能已经报告过扫描到的文件
+            paths = [path for path in paths if path not in self.watch_rows]
+            if not paths:
+                return
+        first_row = self.file_model.append_paths(paths)
+        if self.watch_rows is not None:
+            self.watch_rows.update(zip(paths, range(first_row, first_row + len(paths))))
+        self.register_devices(paths)
+        if self.metadata_prefetcher is not None:
+            self.metadata_prefetcher.submit(enumerate(paths, first_row))
+        # 批量转换已开始时，新扫描到的文件直接进入调度队列
+        if self.batch_active:
+            self.submit_batch_files(first_row, paths)
+            
+    def stop_metadata_prefetch(self):
+        """停止当前的媒体信息预读"""
+        if self.metadata_prefetcher is not None:
+            self.metadata_prefetcher.cancel()
+            self.metadata_prefetcher.shutdown(wait=False)
+            self.metadata_prefetcher = None
+        if self.metadata_bridge is not None:
+            self.metadata_bridge.probed.disconnect()
+            self.metadata_bridge.deleteLater()
+            self.metadata_bridge = None
+            
+    def get_metadata_cache(self):
+        """按需打开媒体信息缓存，打开失败时每次直接调用ffprobe"""
+        if self.metadata_cache is None:
+            try:
+                self.metadata_cache = MetadataCache()
+            except Exception as e:
+                self.batch_status_text.append(f"媒体信息缓存不可用: {str(e)}", LOG_WARNING)
+        return self.metadata_cache
+        
+    def register_devices(self, paths):
+        """把文件所在的存储设备加入设置页的设备列表（每个目录只检测一次）"""
+        for path in {os.path.dirname(path): path for path in paths}.values():
+            device = device_for_path(path)
+            if device.mount in self.device_rows:
+                continue
+            row = self.device_table.rowCount()
+            self.device_table.insertRow(row)
+            self.device_rows[device.mount] = row
+            self.device_table.setItem(row, 0, QTableWidgetItem(device.mount))
+            self.device_table.setItem(row, 1, QTableWidgetItem(KIND_NAMES[device.kind]))
+            limit_spin = QSpinBox()
+            limit_spin.setRange(0, 64)
+            limit_spin.setSpecialValueText("不限")
+            limit_spin.setValue(self.device_limits.get(device.mount, device.default_jobs or 0))
+            limit_spin.valueChanged.connect(lambda value, mount=device.mount: self.set_device_limit(mount, value))
+            self.device_table.setCellWidget(row, 2, limit_spin)
+            self.device_table.setItem(row, 3, QTableWidgetItem(""))
+            self.device_table.setItem(row, 4, QTableWidgetItem(""))
+            
+    def set_device_limit(self, mount, limit):
+        """修改设备的并发上限，转换中立即生效"""
+        self.device_limits[mount] = limit
+        if self.batch_active:
+            self.batch_runner.scheduler.set_device_limit(mount, limit)
+            
+    def on_cpu_workers_changed(self, value):
+        if self.batch_active:
+            self.batch_runner.set_cpu_workers(value)
+            
+    def refresh_device_table(self):
+        """刷新各设备的任务数和读取速度（按运行中任务的进度估算已读取的字节数）"""
+        if self.batch_runner is None:
+            return
+        reading = {}
+        for row in self.batch_converters:
+            mount = self.batch_jobs[row].device.mount
+            done = self.file_model.file_size(row) * self.file_model.progresses[row] // 100
+            reading[mount] = reading.get(mount, 0) + done
+        for device, running, queued in self.batch_runner.scheduler.device_stats():
+            row = self.device_rows.get(device.mount)
+            if row is None:
+                continue
+            total = self.device_finished_bytes.get(device.mount, 0) + reading.get(device.mount, 0)
+            self.device_throughput.update(device.mount, total)
+            self.device_table.item(row, 3).setText(f"运行 {running} / 排队 {queued}")
+            self.device_table.item(row, 4).setText(format_rate(self.device_throughput.rate(device.mount)))
+        if self.batch_staging is not None:
+            count, used = self.batch_staging.usage()
+            self.staging_usage_label.setText(f"本地暂存区: {count} 个文件，{used / 1024 ** 2:.1f} MB")
+            
+    def close_spool(self, wait=False):
+        """批量结束后在后台把输出缓冲区中剩余的输出写回输出目录（wait为True时等待写回完成）"""
+        if self.batch_spool is not None:
+            count, size = self.batch_spool.usage()
+            if count:
+                self.batch_status_text.append(f"正在把缓冲区中剩余的 {count} 个输出写回输出目录"
+                                              f"（{size / 1024 ** 2:.1f} MB）")
+            closer = threading.Thread(target=self.batch_spool.close, daemon=True)
+            closer.start()
+            self.spool_closers.append(closer)
+            self.batch_spool = None
+        self.spool_closers = [closer for closer in self.spool_closers if closer.is_alive()]
+        if wait:
+            for closer in self.spool_closers:
+                closer.join()
+            self.spool_closers = []
+            
+    def close_analyzer(self):
+        """停止后台响度分析；等待分析结果的任务随即自行分析或结束"""
+        if self.batch_analyzer is not None:
+            self.batch_analyzer.close()
+            self.batch_analyzer = None
+            
+    def close_staging(self):
+        """批量结束后删除本地暂存区"""
+        if self.batch_staging is not None:
+            self.batch_staging.close()
+            self.batch_staging = None
+            self.staging_usage_label.setText("")
+            
+    def on_metadata_probed(self, row, info):
+        """预读到一个文件的媒体信息"""
+        if row < self.file_model.rowCount():
+            self.file_model.set_media_info(row, info.get("duration"), info.get("audio_codec"), info.get("bit_rate"))
+            
+    def on_scan_finished(self, count, cancelled):
+        """目录扫描结束"""
+        worker = self.sender()
+        worker.wait()
+        worker.deleteLater()
+        if worker is not self.scan_worker:
+            return
+        self.scan_worker = None
+        self.stop_scan_btn.setEnabled(False)
+        self.batch_skip_paths = set()
+        if self.batch_active:
+            self.batch_runner.scan_finished()
+        if cancelled:
+            self.batch_status_text.append(f"扫描已停止，找到 {count} 个视频文件")
+        else:
+            self.batch_status_text.append(f"找到 {count} 个视频文件")
+        self.check_batch_finished()
         
     def start_conversion(self):
         """开始转换"""
@@ -534,159 +1587,704 @@ class VideoConverterApp(QMainWindow):
         video_path = self.video_path_label.text()
         output_dir = self.output_path_label.text() if self.output_path_label.text() != "使用原视频目录" else os.path.dirname(video_path)
         
-        # 检查转换类型
-        conversion_types = []
-        if self.mp3_checkbox.isChecked():
-            conversion_types.append("mp3")
-            
-        if not conversion_types:
-            QMessageBox.warning(self, "警告", "请选择转换为MP3")
+        # 检查输出格式
+        outputs = self.selected_outputs(self.mp3_checkbox, self.mp3_quality_combo, self.extra_output_checkboxes)
+        if not outputs:
+            QMessageBox.warning(self, "警告", "请至少选择一种输出格式")
+            return
+        tracks = self.selected_tracks()
+        if tracks is False:
             return
-            
-        # 获取MP3质量
-        quality = self.mp3_quality_combo.currentText()
-        if quality == "原视频音质":
-            quality = "original"
-        else:
-            quality = quality.replace("k", "k")
             
         # 开始转换
         self.convert_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
         self.progress_bar.setVisible(True)
-        self.progress_bar.setMaximum(len(conversion_types))
+        self.progress_bar.setMaximum(100)
         self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
         
         self.status_text.clear()
         self.status_text.append(f"开始转换: {os.path.basename(video_path)}")
         
-        # 创建转换线程
-        for i, conv_type in enumerate(conversion_types):
-            worker = ConversionWorker(video_path, output_dir, conv_type, quality, 
-                                    getattr(self, 'ffmpeg_path', 'ffmpeg'))
-            worker.progress.connect(lambda val, idx=i: self.progress_bar.setValue(idx + 1))
-            worker.status.connect(self.status_text.append)
-            worker.finished.connect(lambda success, msg, idx=i: self.on_conversion_finished(success, msg, idx))
-            
-            self.conversion_workers.append(worker)
-            worker.start()
+        # 创建转换线程：所有输出格式在同一次ffmpeg调用中完成
+        fmt, quality = outputs[0]
+        processing = self.audio_processing()
+        if processing.enabled:
+            self.status_text.append(f"音频处理: {processing.describe()}")
+        # 单个文件没有可比较的其他文件，只生成附属文件
+        sidecars = self.audio_sidecars(tracks) if self.sidecars_checkbox.isChecked() else None
+        if sidecars is not None:
+            sidecars.skip_duplicates = False
+        worker = ConversionWorker(video_path, output_dir, fmt, quality,
+                                getattr(self, 'ffmpeg_path', 'ffmpeg'),
+                                getattr(self, 'ffprobe_path', 'ffprobe'),
+                                self.fast_mode_checkbox.isChecked(),
+                                # 响度分析的测量结果保存在元数据缓存中
+                                metadata_cache=self.get_metadata_cache() if processing.loudnorm else None,
+                                outputs=outputs,
+                                segments=self.segments_spin.value(),
+                                log_dir=default_log_dir(),
+                                processing=processing,
+                                tracks=tracks,
+                                sidecars=sidecars)
+        worker.progress.connect(self.progress_bar.setValue)
+        worker.stats.connect(self.on_conversion_stats)
+        worker.status.connect(self.status_text.append)
+        worker.finished.connect(lambda success, msg, w=worker: self.on_conversion_finished(success, msg, w))
+        
+        self.conversion_workers.append(worker)
+        worker.start()
             
     def start_batch_conversion(self):
         """开始批量转换"""
-        if self.file_list.count() == 0 or "拖拽文件夹到这里" in self.batch_dir_label.text():
+        if (self.file_model.rowCount() == 0 and self.scan_worker is None) or "拖拽文件夹到这里" in self.batch_dir_label.text():
             QMessageBox.warning(self, "警告", "请先选择包含视频文件的目录")
             return
             
-        # 检查转换类型
-        conversion_types = []
-        if self.batch_mp3_checkbox.isChecked():
-            conversion_types.append("mp3")
-            
-        if not conversion_types:
-            QMessageBox.warning(self, "警告", "请选择转换为MP3")
+        # 检查输出格式
+        outputs = self.selected_outputs(self.batch_mp3_checkbox, self.batch_mp3_quality_combo,
+                                        self.batch_extra_output_checkboxes)
+        if not outputs:
+            QMessageBox.warning(self, "警告", "请至少选择一种输出格式")
+            return
+        self.begin_batch(outputs)
+        
+    def begin_batch(self, outputs, done_paths=(), cancelled_paths=()):
+        """开始批量转换：文件列表中已有的文件和仍在扫描的文件全部进入调度队列
+        
+        done_paths、cancelled_paths 为从任务日志恢复时已完成和已取消的文件，会写回新的任务日志。
+        """
+        try:
+            self.batch_layout = OutputLayout(self.batch_output_edit.text().strip() or None,
+                                             self.batch_template_edit.text(),
+                                             COLLISION_POLICIES[self.batch_collision_combo.currentIndex()],
+                                             [self.batch_dir_label.text()], self.batch_mirror_checkbox.isChecked())
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        tracks = self.selected_tracks()
+        if tracks is False:
             return
-            
-        # 获取MP3质量
-        quality = self.batch_mp3_quality_combo.currentText()
-        if quality == "原视频音质":
-            quality = "original"
-        else:
-            quality = quality.replace("k", "k")
-            
-        # 开始批量转换
         self.batch_convert_btn.setEnabled(False)
+        self.resume_batch_btn.setVisible(False)
+        self.pause_batch_btn.setEnabled(True)
+        self.cancel_batch_btn.setEnabled(True)
         self.batch_progress_bar.setVisible(True)
-        self.batch_progress_bar.setMaximum(self.file_list.count() * len(conversion_types))
+        self.batch_progress_bar.setMaximum(self.BATCH_PROGRESS_SCALE)
         self.batch_progress_bar.setValue(0)
+        self.batch_progress_bar.setFormat("%p%")
+        self.batch_active = True
+        self.batch_outputs = outputs
+        self.batch_processing = self.audio_processing()
+        self.batch_tracks = tracks
+        # 指纹索引只在本次批量内比较
+        self.batch_sidecars = self.audio_sidecars(tracks)
+        self.batch_total = 0
+        self.batch_completed = 0
+        self.batch_failed = 0
+        self.batch_cancelled = 0
+        self.batch_paused = False
+        self.batch_cancel_requested = False
+        # 按媒体时长加权的进度统计：只保存聚合值和运行中任务，内存与批量大小无关
+        self.batch_known_duration = 0.0
+        self.batch_known_count = 0
+        self.batch_finished_seconds = 0.0
+        self.batch_finished_unknown = 0
+        self.batch_running = {}
+        self.batch_refresh_timer.start()
+        self.device_finished_bytes = {}
+        self.device_throughput.clear()
+        self.device_refresh_timer.start()
         
         self.batch_status_text.clear()
         self.batch_status_text.append("开始批量转换...")
         
-        # 创建批量转换线程
-        for i in range(self.file_list.count()):
-            item = self.file_list.item(i)
-            video_path = item.text()
-            output_dir = os.path.dirname(video_path)
-            
-            for j, conv_type in enumerate(conversion_types):
-                worker = ConversionWorker(video_path, output_dir, conv_type, quality,
-                                        getattr(self, 'ffmpeg_path', 'ffmpeg'))
-                worker.progress.connect(lambda val, idx=i*len(conversion_types)+j: self.batch_progress_bar.setValue(idx + 1))
-                worker.status.connect(self.batch_status_text.append)
-                worker.finished.connect(lambda success, msg, idx=i*len(conversion_types)+j: self.on_batch_conversion_finished(success, msg, idx))
-                
-                self.conversion_workers.append(worker)
-                worker.start()
-                
-    def on_conversion_finished(self, success, message, index):
+        # 任务日志：记录每个文件的状态，程序中断后可以继续
+        journal = BatchJournal()
+        settings = {
+            "directory": self.batch_dir_label.text(),
+            "include": self.scan_include_edit.text(),
+            "exclude": self.scan_exclude_edit.text(),
+            "max_depth": self.scan_depth_spin.value(),
+            "outputs": outputs,
+            "fast_mode": self.batch_fast_mode_checkbox.isChecked(),
+            "use_cache": self.batch_cache_checkbox.isChecked(),
+            "output_root": self.batch_output_edit.text(),
+            "mirror": self.batch_mirror_checkbox.isChecked(),
+            "name_template": self.batch_template_edit.text(),
+            "collision": self.batch_layout.collision,
+            "processing": self.batch_processing.to_dict(),
+            "tracks": self.tracks_edit.text(),
+            "sidecars": self.sidecars_checkbox.isChecked(),
+            "skip_duplicates": self.skip_duplicates_checkbox.isChecked(),
+        }
+        try:
+            journal.start(settings, list(done_paths), list(cancelled_paths))
+        except OSError as e:
+            self.batch_status_text.append(f"任务日志写入失败，本次批量无法中断后继续: {str(e)}", LOG_WARNING)
+            journal.close()
+            journal = None
+        
+        if self.batch_metrics is not None:
+            self.batch_metrics.close()
+        try:
+            self.batch_metrics = MetricsRecorder(self.metrics_jsonl_path, self.metrics_prometheus_path, append=False)
+        except OSError as e:
+            self.batch_metrics = MetricsRecorder()
+            self.batch_status_text.append(f"指标文件无法写入，只在统计页显示: {str(e)}", LOG_WARNING)
+        self.statistics_refresh_timer.start()
+        if self.staging_checkbox.isChecked():
+            try:
+                self.batch_staging = StagingArea(budget=self.staging_size_spin.value() * 1024 ** 3,
+                                                 ahead=self.staging_ahead_spin.value())
+            except OSError as e:
+                self.batch_status_text.append(f"无法创建本地暂存区: {str(e)}", LOG_WARNING)
+        if self.batch_processing.loudnorm and tracks is None:
+            # 在调度器槽位之外提前分析接下来的任务，与其他任务的编码同时进行（只分析默认音轨，按音轨输出时由任务自己分析）
+            self.batch_analyzer = LoudnessAnalyzer(getattr(self, 'ffmpeg_path', 'ffmpeg'), self.batch_processing,
+                                                   self.get_metadata_cache())
+        if self.batch_spool_checkbox.isChecked():
+            self.spool_bridge = StatusBridge(self)
+            self.spool_bridge.status.connect(self.batch_status_text.append)
+            try:
+                self.batch_spool = OutputSpool(on_status=self.spool_bridge.status.emit)
+            except OSError as e:
+                self.batch_status_text.append(f"无法创建本地输出缓冲区，直接写入输出目录: {str(e)}", LOG_WARNING)
+        
+        # 批量循环由 BatchRunner 执行（与命令行相同），界面只把它的回调转发为Qt信号
+        bridge = self.batch_bridge = BatchBridge(self)
+        bridge.queued.connect(self.on_batch_job_queued)
+        bridge.started.connect(self.on_batch_job_started)
+        bridge.progress.connect(self.on_batch_progress)
+        bridge.duration_known.connect(self.on_batch_duration_known)
+        bridge.status.connect(self.batch_status_text.append)
+        bridge.finished.connect(self.on_batch_job_finished)
+        bridge.concurrency.connect(self.on_concurrency_decision)
+        self.batch_jobs = {}
+        self.batch_converters = {}
+        self.batch_runner = BatchRunner(
+            self.max_workers_spin.value(), on_status=bridge.status.emit, on_job_finished=bridge.finished.emit,
+            longest_first=self.job_order_combo.currentIndex() == 1, journal=journal,
+            cpu_workers=self.cpu_workers_spin.value(), device_limits=self.device_limits, metrics=self.batch_metrics,
+            adaptive=self.adaptive_checkbox.isChecked(), on_concurrency=bridge.concurrency.emit,
+            on_job_queued=bridge.queued.emit, on_job_started=bridge.started.emit,
+            on_job_progress=lambda job, percent, out_time, speed, eta: bridge.progress.emit(job.index, percent,
+                                                                                           out_time, speed),
+            on_job_duration=lambda job, duration: bridge.duration_known.emit(job.index, duration),
+            ffmpeg_path=getattr(self, 'ffmpeg_path', 'ffmpeg'), ffprobe_path=getattr(self, 'ffprobe_path', 'ffprobe'),
+            fast_mode=self.batch_fast_mode_checkbox.isChecked(),
+            cache=self.get_conversion_cache() if self.batch_cache_checkbox.isChecked() else None,
+            metadata_cache=self.get_metadata_cache(), staging=self.batch_staging, log_dir=default_log_dir(),
+            layout=self.batch_layout, spool=self.batch_spool, processing=self.batch_processing,
+            analyzer=self.batch_analyzer, tracks=tracks, sidecars=self.batch_sidecars)
+        if self.batch_runner.controller is not None:
+            self.batch_status_text.append(f"自适应并发：从 {self.batch_runner.controller.level} 个任务开始，"
+                                          f"最多 {self.batch_runner.controller.maximum} 个")
+        else:
+            self.batch_status_text.append(f"并发任务数: {self.batch_runner.scheduler.max_workers}"
+                                          f"（重新编码最多 {self.batch_runner.scheduler.cpu_workers}）")
+        if self.batch_processing.enabled:
+            self.batch_status_text.append(f"音频处理: {self.batch_processing.describe()}")
+        if self.batch_sidecars is not None:
+            self.batch_status_text.append(f"附属输出: {self.batch_sidecars.describe()}")
+        self.batch_runner.start()
+        self.submit_batch_files(0, list(self.file_model.paths))
+        if self.watch_checkbox.isChecked():
+            self.start_watch()
+        if self.scan_worker is not None:
+            self.batch_status_text.append("目录仍在扫描中，新找到的文件将陆续加入队列")
+        else:
+            self.batch_runner.scan_finished()
+        self.check_batch_finished()
+        
+    def start_watch(self):
+        """开始监视批量目录：目录中已有但不在列表里的文件（扫描结束后才加入的）也会被转换"""
+        directory = self.batch_dir_label.text()
+        if not os.path.isdir(directory):
+            return
+        include = [p.strip() for p in self.scan_include_edit.text().split(";") if p.strip()]
+        exclude = [p.strip() for p in self.scan_exclude_edit.text().split(";") if p.strip()]
+        max_depth = self.scan_depth_spin.value() if self.scan_depth_spin.value() >= 0 else None
+        self.watch_rows = {path: row for row, path in enumerate(self.file_model.paths)}
+        self.watch_bridge = WatchBridge(self)
+        self.watch_bridge.files_ready.connect(self.on_watch_files)
+        self.watch_bridge.status.connect(self.batch_status_text.append)
+        self.folder_watcher = FolderWatcher([directory], self.watch_bridge.files_ready.emit, include, exclude,
+                                            max_depth, self.watch_settle_spin.value(), handled=set(self.watch_rows),
+                                            on_status=self.watch_bridge.status.emit)
+        self.folder_watcher.start()
+        self.batch_status_text.append(f"正在监视文件夹: {directory}")
+        
+    def stop_watch(self):
+        """停止监视文件夹"""
+        if self.folder_watcher is None:
+            return
+        self.folder_watcher.stop()
+        self.folder_watcher = None
+        self.watch_bridge.files_ready.disconnect()
+        self.watch_bridge.status.disconnect()
+        self.watch_bridge.deleteLater()
+        self.watch_bridge = None
+        self.watch_rows = None
+        
+    def on_watch_toggled(self, checked):
+        """批量进行中切换监视：勾选时立即开始，取消勾选时停止，已在队列中的文件照常转换"""
+        if not self.batch_active or self.batch_cancel_requested:
+            return
+        if checked:
+            if self.folder_watcher is None:
+                self.start_watch()
+        elif self.folder_watcher is not None:
+            self.stop_watch()
+            self.batch_status_text.append("已停止监视文件夹")
+            self.check_batch_finished()
+            
+    def on_watch_files(self, paths):
+        """监视的文件夹中有文件写入完成：新文件加入列表和队列，已结束的文件重新转换
+
+        排队中的文件开始时读取的就是最新内容，转换中的文件由 BatchRunner 在本次结束后再转换一次。
+        """
+        if self.sender() is not self.watch_bridge or self.batch_cancel_requested:
+            return
+        new_paths = []
+        for path in paths:
+            row = self.watch_rows.get(path)
+            if row is None:
+                new_paths.append(path)
+                continue
+            if row not in self.batch_jobs:
+                self.batch_status_text.append(f"文件已修改，重新转换: {os.path.basename(path)}")
+            self.submit_batch_files(row, [path])
+        if not new_paths:
+            return
+        first_row = self.file_model.append_paths(new_paths)
+        self.watch_rows.update(zip(new_paths, range(first_row, first_row + len(new_paths))))
+        self.register_devices(new_paths)
+        if self.metadata_prefetcher is not None:
+            self.metadata_prefetcher.submit(enumerate(new_paths, first_row))
+        self.batch_status_text.append(f"监视文件夹：新加入 {len(new_paths)} 个文件")
+        self.submit_batch_files(first_row, new_paths)
+        
+    def check_resumable_batch(self):
+        """启动时检查上次批量是否未完成，是则显示“继续上次批量”按钮"""
+        state = load_journal()
+        if state is None or not state.resumable():
+            return
+        pending = len(state.pending_paths())
+        done = len(state.paths_in(DONE))
+        self.resume_batch_btn.setVisible(True)
+        self.resume_batch_btn.setToolTip(f"上次批量转换未完成：已完成 {done} 个，剩余 {pending} 个")
+        self.batch_status_text.append(
+            f"上次批量转换未完成（已完成 {done} 个，剩余 {pending} 个），可点击“继续上次批量”")
+        
+    def resume_batch(self):
+        """从任务日志继续上次未完成的批量转换，已完成和已取消的文件不再转换"""
+        if self.batch_active:
+            return
+        state = load_journal()
+        if state is None or not state.resumable():
+            self.resume_batch_btn.setVisible(False)
+            QMessageBox.information(self, "提示", "没有需要继续的批量转换")
+            return
+        
+        # 恢复上次的设置
+        settings = state.settings
+        self.batch_dir_label.setText(settings.get("directory", ""))
+        self.scan_include_edit.setText(settings.get("include", ""))
+        self.scan_exclude_edit.setText(settings.get("exclude", ""))
+        self.scan_depth_spin.setValue(settings.get("max_depth", -1))
+        self.batch_fast_mode_checkbox.setChecked(settings.get("fast_mode", True))
+        self.batch_cache_checkbox.setChecked(settings.get("use_cache", True))
+        self.batch_output_edit.setText(settings.get("output_root", ""))
+        self.batch_mirror_checkbox.setChecked(settings.get("mirror", True))
+        self.batch_template_edit.setText(settings.get("name_template", ""))
+        collision = settings.get("collision", COLLISION_POLICIES[0])
+        if collision in COLLISION_POLICIES:
+            self.batch_collision_combo.setCurrentIndex(COLLISION_POLICIES.index(collision))
+        self.set_audio_processing(AudioProcessing.from_dict(settings.get("processing", {})))
+        self.tracks_edit.setText(settings.get("tracks") or "")
+        self.sidecars_checkbox.setChecked(settings.get("sidecars", False))
+        self.skip_duplicates_checkbox.setChecked(settings.get("skip_duplicates", False))
+        outputs = [tuple(output) for output in settings.get("outputs", [("mp3", "original")])]
+        done_paths = state.paths_in(DONE)
+        cancelled_paths = state.paths_in(CANCELLED)
+        
+        if state.scan_complete:
+            # 文件列表已完整记录在日志中，只加入未完成的文件
+            self.stop_scan()
+            self.stop_metadata_prefetch()
+            self.file_model.clear()
+            self.file_model.append_paths(state.pending_paths())
+            self.register_devices(state.pending_paths())
+        else:
+            # 上次扫描未结束：重新扫描目录，跳过已完成和已取消的文件
+            self.batch_skip_paths = set(done_paths) | set(cancelled_paths)
+            self.load_video_files(settings.get("directory", ""))
+        self.begin_batch(outputs, done_paths, cancelled_paths)
+        self.batch_status_text.append(
+            f"从任务日志继续：跳过已完成的 {len(done_paths)} 个文件和已取消的 {len(cancelled_paths)} 个文件")
+        
+    def submit_batch_files(self, first_row, paths):
+        """为每个文件创建一个转换任务并提交给 BatchRunner，任务编号即文件列表中的行号
+
+        同一文件的全部输出格式属于同一个任务，只解码一次。
+        """
+        if self.batch_cancel_requested:
+            return
+        jobs = []
+        fmt, quality = self.batch_outputs[0]
+        fast_mode = self.batch_fast_mode_checkbox.isChecked()
+        for row, video_path in enumerate(paths, first_row):
+            # 已预读到音频编码、且全部输出都能直接复制音轨的任务只占用读取槽位
+            info = {"audio_codec": self.file_model.codec_names[self.file_model.codec_ids[row]],
+                    "bit_rate": self.file_model.bit_rates[row]}
+            cpu_bound = job_is_cpu_bound(info, self.batch_outputs, fast_mode, self.batch_processing, self.batch_tracks)
+            jobs.append(ConversionJob(row, video_path, self.batch_layout.output_dir(video_path), fmt, quality,
+                                      self.file_model.durations[row], self.batch_outputs, cpu_bound))
+        self.batch_runner.submit(jobs)
+        
+    def on_batch_job_queued(self, job):
+        """任务进入队列（包括转换中被修改、结束后重新转换的文件）"""
+        self.batch_jobs[job.index] = job
+        self.file_model.set_status(job.index, FileTableModel.STATUS_QUEUED)
+        self.batch_total += 1
+        # 预读到时长的任务在提交时就计入总时长
+        if job.duration > 0:
+            self.batch_known_duration += job.duration
+            self.batch_known_count += 1
+            
+    def on_batch_job_started(self, job, converter):
+        """任务开始转换，记下它的转换过程用于暂停和统计"""
+        self.batch_converters[job.index] = converter
+        self.file_model.set_status(job.index, FileTableModel.STATUS_PAUSED if converter.paused
+                                   else FileTableModel.STATUS_RUNNING)
+        
+    def get_conversion_cache(self):
+        """按需打开转换缓存，打开失败时不使用缓存"""
+        if self.conversion_cache is None:
+            try:
+                self.conversion_cache = ConversionCache()
+            except Exception as e:
+                self.batch_status_text.append(f"转换缓存不可用: {str(e)}", LOG_WARNING)
+                self.batch_cache_checkbox.setChecked(False)
+        return self.conversion_cache
+        
+    def on_conversion_stats(self, out_time, speed, eta):
+        """单文件转换的速度和剩余时间"""
+        if eta >= 0:
+            self.progress_bar.setFormat(f"%p%  速度 {speed:.1f}x  剩余 {format_eta(eta)}")
+            
+    def on_batch_duration_known(self, row, duration):
+        """记录任务的媒体时长，用于加权批量进度"""
+        job = self.batch_jobs.get(row)
+        if duration > 0 and job is not None and not job.duration:
+            self.batch_known_duration += duration
+            self.batch_known_count += 1
+        self.batch_running[row] = [duration, 0.0, 0.0]
+        self.file_model.set_media_info(row, duration=duration)
+        
+    def on_batch_progress(self, row, percent, out_time, speed):
+        """更新运行中任务的进度、已处理时长和速度，进度条由定时器统一刷新"""
+        self.file_model.set_progress(row, percent)
+        state = self.batch_running.get(row)
+        if state is not None:
+            state[1] = out_time
+            state[2] = speed
+            
+    def update_batch_progress(self):
+        """按总媒体时长（而不是文件数）计算批量进度"""
+        if not self.batch_total:
+            return
+        if self.batch_known_count and self.batch_known_duration > 0:
+            # 尚未探测到时长的任务按已知任务的平均时长估算
+            mean = self.batch_known_duration / self.batch_known_count
+            total = self.batch_known_duration + (self.batch_total - self.batch_known_count) * mean
+            done = self.batch_finished_seconds + self.batch_finished_unknown * mean
+            done += sum(min(out_time, duration or mean) for duration, out_time, _ in self.batch_running.values())
+        else:
+            total = self.batch_total
+            done = self.batch_completed
+        
+        self.batch_progress_bar.setValue(int(self.BATCH_PROGRESS_SCALE * min(1.0, done / total)))
+        speed = sum(state[2] for state in self.batch_running.values())
+        if speed > 0 and self.batch_known_count:
+            eta = (total - done) / speed
+            self.batch_progress_bar.setFormat(
+                f"%p%  ({self.batch_completed}/{self.batch_total})  速度 {speed:.1f}x  剩余约 {format_eta(eta)}")
+        else:
+            self.batch_progress_bar.setFormat(f"%p%  ({self.batch_completed}/{self.batch_total})")
+        
+    def on_conversion_finished(self, success, message, worker):
         """单个转换完成回调"""
-        self.status_text.append(message)
-        if index == len(self.conversion_workers) - 1:
-            self.convert_btn.setEnabled(True)
-            self.progress_bar.setVisible(False)
-            if success:
-                QMessageBox.information(self, "完成", "转换完成！")
-            else:
-                QMessageBox.warning(self, "警告", "部分转换失败，请查看日志")
+        self.status_text.append(message, LOG_INFO if success or worker.converter.cancelled else LOG_ERROR)
+        if worker in self.conversion_workers:
+            self.conversion_workers.remove(worker)
+        worker.wait()
+        worker.deleteLater()
+        self.convert_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.progress_bar.setVisible(False)
+        if worker.converter.cancelled:
+            return
+        if success:
+            QMessageBox.information(self, "完成", "转换完成！")
+        else:
+            QMessageBox.warning(self, "警告", "部分转换失败，请查看日志")
                 
-    def on_batch_conversion_finished(self, success, message, index):
-        """批量转换完成回调"""
-        self.batch_status_text.append(message)
-        if index == self.batch_progress_bar.maximum() - 1:
-            self.batch_convert_btn.setEnabled(True)
-            self.batch_progress_bar.setVisible(False)
-            if success:
-                QMessageBox.information(self, "完成", "批量转换完成！")
+    def cancel_conversion(self):
+        """取消单文件转换"""
+        for worker in self.conversion_workers:
+            worker.converter.cancel()
+        self.cancel_btn.setEnabled(False)
+        
+    def toggle_batch_pause(self):
+        """暂停或继续整个批量：暂停派发新任务，并暂停运行中的ffmpeg"""
+        if not self.batch_active:
+            return
+        self.batch_paused = not self.batch_paused
+        if self.batch_paused:
+            self.batch_runner.pause()
+            for row in self.batch_converters:
+                self.pause_job(row)
+            self.pause_batch_btn.setText("继续")
+            self.batch_status_text.append("批量转换已暂停")
+        else:
+            for row in self.batch_converters:
+                self.resume_job(row)
+            self.pause_batch_btn.setText("暂停")
+            self.batch_status_text.append("批量转换继续")
+            self.batch_runner.resume()
+            
+    def pause_job(self, row):
+        converter = self.batch_converters.get(row)
+        if converter is None:
+            return
+        converter.pause()
+        self.file_model.set_status(row, FileTableModel.STATUS_PAUSED)
+        if row in self.batch_running:
+            self.batch_running[row][2] = 0.0
+            
+    def resume_job(self, row):
+        converter = self.batch_converters.get(row)
+        if converter is None:
+            return
+        converter.resume()
+        self.file_model.set_status(row, FileTableModel.STATUS_RUNNING)
+        
+    def cancel_batch(self):
+        """取消整个批量：停止扫描，丢弃排队的任务，停止运行中的ffmpeg"""
+        if not self.batch_active:
+            return
+        self.batch_cancel_requested = True
+        self.pause_batch_btn.setEnabled(False)
+        self.cancel_batch_btn.setEnabled(False)
+        self.batch_status_text.append("正在取消批量转换...")
+        self.stop_scan()
+        self.stop_watch()
+        self.drop_batch_jobs(self.batch_runner.cancel())
+        self.check_batch_finished()
+        
+    def drop_batch_jobs(self, jobs):
+        """把未开始就被取消的任务计为已结束"""
+        for job in jobs:
+            self.batch_jobs.pop(job.index, None)
+            self.file_model.set_status(job.index, FileTableModel.STATUS_CANCELLED)
+            self.batch_completed += 1
+            self.batch_cancelled += 1
+            if job.duration > 0:
+                self.batch_finished_seconds += job.duration
             else:
-                QMessageBox.warning(self, "警告", "部分转换失败，请查看日志")
+                self.batch_finished_unknown += 1
                 
-    def check_ffmpeg(self):
-        """检查FFmpeg是否可用"""
-        # 首先尝试检测本地项目目录中的FFmpeg
-        local_ffmpeg_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                                        "ffmpeg-7.1-essentials_build", "bin", "ffmpeg.exe")
-        
-        if os.path.exists(local_ffmpeg_path):
-            # 使用本地FFmpeg
-            self.ffmpeg_path = local_ffmpeg_path
-            self.ffprobe_path = os.path.join(os.path.dirname(local_ffmpeg_path), "ffprobe.exe")
-            self.ffplay_path = os.path.join(os.path.dirname(local_ffmpeg_path), "ffplay.exe")
-            
-            try:
-                result = subprocess.run([local_ffmpeg_path, "-version"], capture_output=True, text=True)
-                if result.returncode == 0:
-                    self.ffmpeg_status_label.setText("✅ 本地FFmpeg 可用")
-                    self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold; color: green;")
-                    self.statusBar().showMessage("本地FFmpeg 检查通过")
-                    return
-            except Exception:
-                pass
-        
-        # 如果本地FFmpeg不可用，尝试系统PATH中的FFmpeg
-        try:
-            result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                self.ffmpeg_path = "ffmpeg"
-                self.ffprobe_path = "ffprobe"
-                self.ffplay_path = "ffplay"
-                self.ffmpeg_status_label.setText("✅ 系统FFmpeg 可用")
-                self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold; color: green;")
-                self.statusBar().showMessage("系统FFmpeg 检查通过")
+    def show_file_menu(self, pos):
+        """文件列表右键菜单：暂停/继续/取消单个任务"""
+        index = self.file_table.indexAt(pos)
+        if not index.isValid() or not self.batch_active:
+            return
+        row = index.row()
+        job = self.batch_jobs.get(row)
+        if job is None:
+            return
+        converter = self.batch_converters.get(row)
+        menu = QMenu(self)
+        if converter is not None:
+            if converter.paused:
+                menu.addAction("继续此任务", lambda: self.resume_job(row))
             else:
-                self.ffmpeg_status_label.setText("❌ FFmpeg 不可用")
-                self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold; color: red;")
-                self.statusBar().showMessage("FFmpeg 检查失败")
-        except FileNotFoundError:
+                menu.addAction("暂停此任务", lambda: self.pause_job(row))
+        menu.addAction("取消此任务", lambda: self.cancel_batch_job(job))
+        menu.exec_(self.file_table.viewport().mapToGlobal(pos))
+        
+    def cancel_batch_job(self, job):
+        """取消单个任务：尚未开始的移出队列，转换中的停止其ffmpeg（结束后照常回调）"""
+        if self.batch_active:
+            self.drop_batch_jobs(self.batch_runner.cancel_job(job))
+            self.check_batch_finished()
+            
+    def on_batch_job_finished(self, job, success, message):
+        """批量任务结束（指标和任务日志已由 BatchRunner 记录）"""
+        row = job.index
+        converter = self.batch_converters.pop(row)
+        self.batch_jobs.pop(row, None)
+        cancelled = converter.cancelled
+        self.batch_status_text.append(f"{os.path.basename(job.video_path)}: {message}",
+                                      LOG_INFO if success or cancelled else LOG_ERROR)
+        self.batch_completed += 1
+        if cancelled:
+            self.batch_cancelled += 1
+        elif not success:
+            self.batch_failed += 1
+        state = self.batch_running.pop(row, None)
+        if state is not None and state[0] > 0:
+            self.batch_finished_seconds += state[0]
+        else:
+            self.batch_finished_unknown += 1
+        
+        # 本任务从源设备读取的字节数：命中缓存的任务没有读取，未完成或因内容重复提前停止的任务按进度估算
+        size = self.file_model.file_size(row)
+        if success and converter.outcome in ("cached", "reused", "exists"):
+            size = 0
+        elif not success or converter.outcome == "duplicate":
+            size = size * self.file_model.progresses[row] // 100
+        mount = job.device.mount
+        self.device_finished_bytes[mount] = self.device_finished_bytes.get(mount, 0) + size
+        
+        if cancelled:
+            status = FileTableModel.STATUS_CANCELLED
+        elif not success:
+            status = FileTableModel.STATUS_FAILED
+        elif converter.outcome in ("cached", "exists", "duplicate"):
+            status = FileTableModel.STATUS_SKIPPED
+        else:
+            status = FileTableModel.STATUS_DONE
+        self.file_model.set_status(row, status)
+        self.file_model.set_media_info(row, codec=converter.audio_codec)
+        self.check_batch_finished()
+        
+    def check_batch_finished(self):
+        """扫描结束、所有任务完成且没有在监视文件夹时结束批量转换"""
+        if (not self.batch_active or self.scan_worker is not None or self.folder_watcher is not None
+                or self.batch_completed < self.batch_total):
+            return
+        self.batch_active = False
+        self.batch_runner.finish()
+        self.batch_refresh_timer.stop()
+        self.update_batch_progress()
+        self.device_refresh_timer.stop()
+        self.refresh_device_table()
+        self.close_staging()
+        self.close_analyzer()
+        self.close_spool()
+        self.batch_sidecars = None  # 释放本批量的指纹索引
+        self.batch_bridge.deleteLater()
+        self.batch_bridge = None
+        self.statistics_refresh_timer.stop()
+        self.refresh_statistics()
+        self.batch_metrics.close()
+        self.batch_convert_btn.setEnabled(True)
+        self.pause_batch_btn.setEnabled(False)
+        self.pause_batch_btn.setText("暂停")
+        self.cancel_batch_btn.setEnabled(False)
+        self.batch_progress_bar.setVisible(False)
+        if self.batch_cancelled:
+            self.batch_status_text.append(f"已取消 {self.batch_cancelled} 个文件")
+        if self.batch_cancel_requested:
+            QMessageBox.information(self, "提示", "批量转换已取消")
+        elif self.batch_total == 0:
+            QMessageBox.warning(self, "警告", "没有找到视频文件")
+        elif self.batch_failed == 0:
+            QMessageBox.information(self, "完成", "批量转换完成！")
+        else:
+            QMessageBox.warning(self, "警告", f"{self.batch_failed} 个文件转换失败，请查看日志")
+                
+    def check_ffmpeg(self, refresh=False, configured=None):
+        """在后台检查FFmpeg是否可用；refresh 为True时不使用缓存的能力档案"""
+        if self.ffmpeg_check_worker is not None:
+            return
+        self.ffmpeg_status_label.setText("检查中...")
+        self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold;")
+        self.ffmpeg_check_worker = FFmpegCheckWorker(configured, refresh)
+        self.ffmpeg_check_worker.checked.connect(self.on_ffmpeg_checked)
+        self.ffmpeg_check_worker.start()
+        
+    def on_ffmpeg_checked(self, profile):
+        """FFmpeg检查完成：记录路径，按可用的编码器启用输出格式"""
+        self.ffmpeg_check_worker.wait()
+        self.ffmpeg_check_worker.deleteLater()
+        self.ffmpeg_check_worker = None
+        self.ffmpeg_profile = profile
+        if profile is not None:
+            self.ffmpeg_path = profile.ffmpeg_path
+            self.ffprobe_path = profile.ffprobe_path
+            name = profile.source_name
+            self.ffmpeg_status_label.setText(f"✅ {name} 可用")
+            self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold; color: green;")
+            self.ffmpeg_detail_label.setText(f"{profile.ffmpeg_path}\n{profile.describe()}")
+            self.statusBar().showMessage(f"{name} 检查通过")
+        else:
             self.ffmpeg_status_label.setText("❌ FFmpeg 未安装")
             self.ffmpeg_status_label.setStyleSheet("padding: 10px; font-weight: bold; color: red;")
+            self.ffmpeg_detail_label.setText("")
             self.statusBar().showMessage("FFmpeg 未安装，请先安装 FFmpeg")
+        self.update_output_availability()
+        
+    def update_output_availability(self):
+        """禁用当前FFmpeg缺少编码器的输出格式"""
+        profile = self.ffmpeg_profile
+        for mp3_checkbox, extra_checkboxes in ((self.mp3_checkbox, self.extra_output_checkboxes),
+                                               (self.batch_mp3_checkbox, self.batch_extra_output_checkboxes)):
+            for checkbox, spec in [(mp3_checkbox, "mp3")] + extra_checkboxes:
+                fmt = parse_output_spec(spec)[0]
+                supported = profile is None or profile.supports(fmt)
+                default_tip = checkbox.property("defaultToolTip")
+                if default_tip is None:
+                    default_tip = checkbox.toolTip()
+                    checkbox.setProperty("defaultToolTip", default_tip)
+                checkbox.setEnabled(supported)
+                checkbox.setToolTip(default_tip if supported else f"当前FFmpeg没有 {OUTPUT_FORMATS[fmt][0]} 编码器")
+                if not supported:
+                    checkbox.setChecked(False)
+                    
+    def select_ffmpeg(self):
+        """指定优先使用的ffmpeg程序，记住选择并重新检查"""
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择ffmpeg程序")
+        if not file_path:
+            return
+        default_store().configured = file_path
+        self.check_ffmpeg(refresh=True, configured=file_path)
             
     def closeEvent(self, event):
         """关闭事件"""
-        # 停止所有转换线程
+        # 停止扫描和监视，丢弃排队中的任务，再让所有ffmpeg进程退出（先正常退出，超时后强制结束）
+        if self.ffmpeg_check_worker is not None:
+            self.ffmpeg_check_worker.wait()
+        self.stop_scan()
+        self.stop_watch()
+        self.stop_metadata_prefetch()
+        if self.batch_active:
+            self.batch_runner.cancel()
+        for worker in self.conversion_workers:
+            worker.converter.cancel()
+        self.close_analyzer()
         for worker in self.conversion_workers:
-            if worker.isRunning():
+            if not worker.wait(int((STOP_TIMEOUT + 2) * 1000)):
                 worker.terminate()
                 worker.wait()
+        if self.batch_active:
+            # 任务日志保留未完成状态，下次启动时可以继续
+            self.batch_runner.wait()
+            self.batch_runner.finish()
+        # 先写回输出缓冲区中已完成的输出，再关闭转换缓存（写回后才会记入缓存）
+        self.close_spool(wait=True)
+        if self.conversion_cache is not None:
+            self.conversion_cache.prune()
+            self.conversion_cache.close()
+        if self.metadata_cache is not None:
+            self.metadata_cache.close()
+        self.close_staging()
+        if self.batch_metrics is not None:
+            self.batch_metrics.close()
         event.accept()
 
 def main():
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 媒体信息
+功能：用ffprobe（JSON输出）读取时长、音频编码、比特率、声道、采样率和流数量，
+      并行预读整批文件，结果按 路径+大小+修改时间 持久缓存；
+      响度分析等耗时的测量结果也按同样方式缓存
+说明：SQLite存储，默认位于用户缓存目录；不依赖Qt
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import deque
+
+from converter_core import user_cache_dir
+
+# 媒体信息的字段版本：增加字段后旧的缓存记录视为过期，重新探测
+METADATA_VERSION = 3
+
+
+def default_metadata_path():
+    """默认元数据缓存路径"""
+    return os.path.join(user_cache_dir(), "metadata_cache.sqlite3")
+
+
+def probe_media(ffprobe_path, path):
+    """读取媒体信息，失败返回None
+
+    返回字典：duration、audio_codec、bit_rate、channels、sample_rate、
+    stream_count、audio_start（第一个音频流相对文件开头的起始时间）、
+    audio_time_base（第一个音频流的时间基，如 1/44100），以及所有音频流的列表 audio_streams。
+    """
+    try:
+        result = subprocess.run(
+            [ffprobe_path, "-v", "error", "-print_format", "json",
+             "-show_format", "-show_streams", path],
+            capture_output=True, text=True, encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout or "{}")
+    except ValueError:
+        return None
+
+    def to_number(value, kind=int):
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            return kind(0)
+
+    streams = data.get("streams", [])
+    audio_streams = []
+    for stream in streams:
+        if stream.get("codec_type") != "audio":
+            continue
+        tags = stream.get("tags", {})
+        audio_streams.append({
+            "index": to_number(stream.get("index")),
+            "codec": stream.get("codec_name", ""),
+            "bit_rate": to_number(stream.get("bit_rate")),
+            "channels": to_number(stream.get("channels")),
+            "sample_rate": to_number(stream.get("sample_rate")),
+            "start_time": to_number(stream.get("start_time"), float),
+            "time_base": stream.get("time_base", ""),
+            "language": tags.get("language", ""),
+            "title": tags.get("title", ""),
+        })
+
+    fmt = data.get("format", {})
+    first = audio_streams[0] if audio_streams else {}
+    return {
+        "duration": max(0.0, to_number(fmt.get("duration"), float)),
+        "audio_codec": first.get("codec", ""),
+        "bit_rate": first.get("bit_rate", 0),
+        "channels": first.get("channels", 0),
+        "sample_rate": first.get("sample_rate", 0),
+        "stream_count": to_number(fmt.get("nb_streams")) or len(streams),
+        "audio_start": max(0.0, first.get("start_time", 0.0) - to_number(fmt.get("start_time"), float)),
+        "audio_time_base": first.get("time_base", ""),
+        "audio_streams": audio_streams,
+        "version": METADATA_VERSION,
+    }
+
+
+class MetadataCache:
+    """媒体信息持久缓存，文件大小或修改时间变化后自动失效
+
+    analysis 表按 (路径, 分析设置) 保存耗时较长的测量结果（如 loudnorm 第一遍），同样随源文件变化失效。
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_metadata_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    info TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis (
+                    path TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (path, settings)
+                )""")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get(self, path):
+        """读取缓存的媒体信息，不存在或已过期返回None"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, info FROM metadata WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            info = json.loads(row[2])
+            if info.get("version") == METADATA_VERSION:
+                return info
+        return None
+
+    def put(self, path, info):
+        """写入媒体信息"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                              (path, st.st_size, st.st_mtime_ns, json.dumps(info), time.time()))
+
+    def get_analysis(self, path, settings):
+        """读取缓存的测量结果，不存在或源文件已变化返回None"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns, result FROM analysis WHERE path = ? AND settings = ?",
+                                    (path, settings)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def put_analysis(self, path, settings, result):
+        """写入测量结果"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?)",
+                              (path, settings, st.st_size, st.st_mtime_ns, json.dumps(result), time.time()))
+
+    def probe(self, ffprobe_path, path):
+        """先查缓存，未命中时调用ffprobe并写入缓存"""
+        info = self.get(path)
+        if info is None:
+            info = probe_media(ffprobe_path, path)
+            if info is not None:
+                try:
+                    self.put(path, info)
+                except (OSError, sqlite3.Error):
+                    pass
+        return info
+
+
+class MetadataPrefetcher:
+    """并行预读媒体信息
+
+    实际工作在ffprobe子进程中完成，这里用固定数量的线程从队列中取文件并发启动它们；
+    队列里只保存 (key, 路径)，不为每个文件创建 Future，内存与批量大小基本无关。
+    缓存命中的文件不会启动ffprobe。on_result(key, path, info) 在预读线程中回调。
+    """
+
+    def __init__(self, ffprobe_path, cache=None, max_workers=None, on_result=None):
+        self.ffprobe_path = ffprobe_path
+        self.cache = cache
+        self.on_result = on_result
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.threads = []
+        self.closing = False
+        self.cancelled = False
+
+    def submit(self, items):
+        """提交 (key, 路径) 列表，立即返回"""
+        with self.condition:
+            self.pending.extend(items)
+            while len(self.threads) < min(self.max_workers, len(self.pending)):
+                thread = threading.Thread(target=self._worker, name="ffprobe", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+            self.condition.notify_all()
+
+    def cancel(self):
+        """停止预读：丢弃尚未开始的文件"""
+        with self.condition:
+            self.cancelled = True
+            self.pending.clear()
+            self.condition.notify_all()
+
+    def shutdown(self, wait=True):
+        """处理完队列后结束预读线程"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        if wait:
+            for thread in list(self.threads):
+                thread.join()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.pending and not (self.closing or self.cancelled):
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                key, path = self.pending.popleft()
+            try:
+                if self.cache is not None:
+                    info = self.cache.probe(self.ffprobe_path, path)
+                else:
+                    info = probe_media(self.ffprobe_path, path)
+            except Exception:
+                # 缓存已关闭等异常只影响预读，转换时会重新探测
+                info = None
+            if info is not None and self.on_result is not None and not self.cancelled:
+                self.on_result(key, path, info)
+
+
+def prefetch_metadata(ffprobe_path, paths, cache=None, max_workers=None):
+    """并行读取一批文件的媒体信息，返回 {路径: 信息}（读取失败的文件不在结果中）"""
+    results = {}
+    lock = threading.Lock()
+
+    def on_result(key, path, info):
+        with lock:
+            results[path] = info
+
+    prefetcher = MetadataPrefetcher(ffprobe_path, cache, max_workers, on_result)
+    prefetcher.submit((path, path) for path in paths)
+    prefetcher.shutdown()
+    return results
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 输出布局
+功能：决定批量转换的输出位置：输出到指定根目录并保留源目录的子目录结构、按模板生成文件名，
+      以及输出文件重名时的处理方式（覆盖、跳过、自动编号）
+说明：不依赖Qt
+"""
+
+import os
+import re
+import string
+import threading
+from pathlib import Path
+
+OVERWRITE, SKIP, RENAME = "overwrite", "skip", "rename"
+COLLISION_POLICIES = (OVERWRITE, SKIP, RENAME)
+COLLISION_NAMES = {OVERWRITE: "覆盖", SKIP: "跳过已存在的文件", RENAME: "自动编号"}
+
+DEFAULT_TEMPLATE = "{name}"
+
+# 文件名模板可用的字段
+TEMPLATE_FIELDS = {
+    "name": "源文件名（不含扩展名）",
+    "ext": "源文件扩展名（不含点）",
+    "parent": "源文件所在目录名",
+    "format": "输出格式",
+    "quality": "输出音质",
+    "track": "音轨说明（序号-语言-标题，只在按音轨输出时有值）",
+}
+
+# Windows 文件名中不允许的字符
+_INVALID_CHARS = re.compile(r'[<>:"|?*\x00-\x1f]')
+
+
+def safe_file_name(text):
+    """把任意文本（如音轨标题）转换为可用作单个文件名的文本"""
+    return _INVALID_CHARS.sub("_", re.sub(r"[\\/]+", "_", text)).strip(" .")
+
+
+def parse_template(template):
+    """检查文件名模板，返回去掉首尾空白的模板；字段未知或格式错误时抛出ValueError"""
+    template = (template or "").strip() or DEFAULT_TEMPLATE
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"文件名模板格式错误: {template}（{e}）") from None
+    unknown = [field for field in fields if field not in TEMPLATE_FIELDS]
+    if unknown:
+        raise ValueError(f"文件名模板中有未知字段: {', '.join('{' + f + '}' for f in unknown)}"
+                         f"（可用: {', '.join('{' + f + '}' for f in TEMPLATE_FIELDS)}）")
+    if "name" not in fields:
+        raise ValueError("文件名模板必须包含 {name}，否则不同的源文件会得到相同的文件名")
+    return template
+
+
+class OutputLayout:
+    """批量转换的输出布局
+
+    root 为空时输出到视频所在目录；否则输出到 root 下，mirror 为True时保留视频相对于
+    source_roots 中所在目录的子目录结构。template 生成不含扩展名的文件名，可以包含 / 以放入子目录。
+    claim() 在写入前确定最终路径：本次批量中已被其他源文件占用的路径总是自动编号，
+    磁盘上已存在的文件按 collision 处理。可在多个转换线程中共用。
+    """
+
+    def __init__(self, root=None, template=DEFAULT_TEMPLATE, collision=OVERWRITE, source_roots=(), mirror=True):
+        if collision not in COLLISION_POLICIES:
+            raise ValueError(f"未知的重名处理方式: {collision}")
+        self.root = root
+        self.template = parse_template(template)
+        self.collision = collision
+        self.mirror = mirror
+        # 较长的目录排在前面，嵌套的源目录按最近的一个计算相对路径
+        self.source_roots = sorted((os.path.abspath(path) for path in source_roots), key=len, reverse=True)
+        # 本次批量已确定的输出路径 -> 源文件；只保存哈希值，内存占用很小
+        self.claims = {}
+        self.lock = threading.Lock()
+
+    def output_dir(self, video_path):
+        """视频对应的输出目录"""
+        if not self.root:
+            return os.path.dirname(os.path.abspath(video_path))
+        if not self.mirror:
+            return self.root
+        directory = os.path.dirname(os.path.abspath(video_path))
+        for source_root in self.source_roots:
+            if directory == source_root or directory.startswith(source_root.rstrip(os.sep) + os.sep):
+                return os.path.normpath(os.path.join(self.root, os.path.relpath(directory, source_root)))
+        return self.root
+
+    def file_name(self, video_path, fmt, quality, track=""):
+        """按模板生成的文件名（不含扩展名），路径分隔符统一为系统分隔符"""
+        path = Path(video_path)
+        name = self.template.format(name=path.stem, ext=path.suffix.lstrip("."), parent=path.parent.name,
+                                    format=fmt, quality=quality, track=track)
+        parts = []
+        for part in re.split(r"[\\/]+", name):
+            part = _INVALID_CHARS.sub("_", part).strip()
+            # 不允许通过 .. 写到输出目录之外
+            if part and part not in (".", ".."):
+                parts.append(part)
+        return os.path.join(*parts) if parts else path.stem
+
+    def claim(self, output_path, video_path, is_current=None):
+        """确定输出路径并登记为该源文件所有；collision 为 skip 且文件已存在时返回None
+
+        is_current(路径) 返回True表示磁盘上的该文件就是该源文件当前的输出（由转换缓存确认），不算重名，
+        这样自动编号的输出在重新运行时仍沿用原来的编号。
+        """
+        source = hash(os.path.normcase(os.path.abspath(video_path)))
+        base, ext = os.path.splitext(output_path)
+        with self.lock:
+            number = 1
+            path = output_path
+            while True:
+                key = hash(os.path.normcase(os.path.abspath(path)))
+                owner = self.claims.get(key)
+                if owner == source:
+                    # 同一源文件再次转换（如监视文件夹时文件被修改），沿用上次的路径
+                    return path
+                if owner is None:
+                    if self.collision == OVERWRITE or not os.path.exists(path):
+                        break
+                    if is_current is not None and is_current(path):
+                        break
+                    if self.collision == SKIP:
+                        return None
+                number += 1
+                path = f"{base} ({number}){ext}"
+            self.claims[key] = source
+            return path
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 输出缓冲区
+功能：转换输出先写到本地快速存储，累积到一定大小或时间后由一个后台线程按目标路径顺序
+      依次移动到输出目录，避免多个转换同时向慢速或读优化的存储写入大量零散的小文件
+说明：移动失败的文件保留在缓冲目录中并给出提示；不依赖Qt
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from converter_core import LOG_ERROR, LOG_INFO, PARTIAL_SUFFIX
+from input_staging import copy_file
+
+# 缓冲的输出累积到这么多字节时开始写回
+DEFAULT_FLUSH_BYTES = 256 * 1024 * 1024
+
+# 最早缓冲的输出等待超过这么多秒时开始写回（批量末尾或监视文件夹时不会无限等待）
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+
+class _SpooledOutput:
+    """一个等待写回的输出"""
+
+    __slots__ = ("local_path", "output_path", "size", "on_flushed", "on_failed")
+
+    def __init__(self, local_path, output_path, size, on_flushed, on_failed):
+        self.local_path = local_path
+        self.output_path = output_path
+        self.size = size
+        self.on_flushed = on_flushed
+        self.on_failed = on_failed
+
+
+class OutputSpool:
+    """本地输出缓冲区
+
+    scratch_path() 返回输出在本地的临时路径；转换完成后 commit() 把它交给后台线程，
+    累积 flush_bytes 字节或等待 flush_interval 秒后，按目标路径排序逐个写回
+    （同一文件系统内直接改名，否则整块复制到临时文件再改名），写回后调用 on_flushed()，写回失败时调用 on_failed()。
+    close() 写回全部剩余输出后删除缓冲目录。
+    """
+
+    def __init__(self, directory=None, flush_bytes=DEFAULT_FLUSH_BYTES, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 on_status=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="spool-", dir=directory)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.on_status = on_status or (lambda text, level: None)
+        self.pending = []
+        self.pending_bytes = 0
+        self.oldest = 0.0  # 最早一个等待写回的输出的提交时间
+        self.flushed = 0
+        self.failed = 0
+        self.sequence = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def scratch_path(self, output_path):
+        """输出在缓冲目录中的临时路径"""
+        with self.condition:
+            self.sequence += 1
+            sequence = self.sequence
+        return os.path.join(self.directory, f"out-{sequence}{os.path.splitext(output_path)[1]}")
+
+    def commit(self, local_path, output_path, on_flushed=None, on_failed=None):
+        """本地输出已写完，等待写回 output_path"""
+        entry = _SpooledOutput(local_path, output_path, os.path.getsize(local_path), on_flushed, on_failed)
+        with self.condition:
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending.append(entry)
+            self.pending_bytes += entry.size
+            self.condition.notify_all()
+
+    def usage(self):
+        """(等待写回的文件数, 字节数)"""
+        with self.condition:
+            return len(self.pending), self.pending_bytes
+
+    def close(self):
+        """写回剩余输出，停止后台线程；全部写回成功时删除缓冲目录"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        if self.failed:
+            self.on_status(f"{self.failed} 个输出未能写回，保留在 {self.directory}", LOG_ERROR)
+        else:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _due(self):
+        if not self.pending:
+            return False
+        return (self.closed or self.pending_bytes >= self.flush_bytes or
+                time.monotonic() - self.oldest >= self.flush_interval)
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                while not self._due():
+                    if self.closed:
+                        return
+                    timeout = self.flush_interval - (time.monotonic() - self.oldest) if self.pending else None
+                    self.condition.wait(timeout)
+                # 按目标路径排序：同一目录的文件连续写入
+                batch = sorted(self.pending, key=lambda entry: entry.output_path)
+                self.pending = []
+                self.pending_bytes = 0
+            started = time.monotonic()
+            total = 0
+            for entry in batch:
+                if self._write_back(entry):
+                    total += entry.size
+            if total:
+                elapsed = max(time.monotonic() - started, 1e-3)
+                self.on_status(f"已把 {len(batch)} 个输出写回输出目录（{total / 1024 ** 2:.1f} MB，"
+                               f"{total / 1024 ** 2 / elapsed:.1f} MB/s）", LOG_INFO)
+
+    def _write_back(self, entry):
+        partial_path = entry.output_path + PARTIAL_SUFFIX
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(entry.output_path)), exist_ok=True)
+            try:
+                os.replace(entry.local_path, entry.output_path)
+            except OSError:
+                # 跨文件系统：整块顺序复制到目标目录的临时文件，写完再改名
+                copy_file(entry.local_path, partial_path)
+                os.replace(partial_path, entry.output_path)
+                os.remove(entry.local_path)
+        except OSError as e:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            with self.condition:
+                self.failed += 1
+            self.on_status(f"{os.path.basename(entry.output_path)}: 写回输出目录失败: {str(e)}", LOG_ERROR)
+            if entry.on_failed is not None:
+                entry.on_failed()
+            return False
+        with self.condition:
+            self.flushed += 1
+        if entry.on_flushed is not None:
+            try:
+                entry.on_flushed()
+            except Exception as e:
+                # 回调只做记录（如写入转换缓存），失败不影响后续输出的写回
+                self.on_status(f"{os.path.basename(entry.output_path)}: 写回后的记录失败: {str(e)}", LOG_ERROR)
+        return True
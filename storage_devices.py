@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转音频工具 - 存储设备
+功能：识别文件所在的存储设备（挂载点）及其类型（本地磁盘、机械硬盘、网络存储），
+      统计每个设备的读取吞吐量，供批量调度按设备限制并发
+说明：Linux 读取 /proc/mounts 和 /sys/class/block，Windows 使用 GetDriveType；不依赖Qt
+"""
+
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+LOCAL = "local"
+ROTATIONAL = "rotational"
+NETWORK = "network"
+
+KIND_NAMES = {LOCAL: "本地磁盘", ROTATIONAL: "机械硬盘", NETWORK: "网络存储"}
+
+# 各类设备默认同时读取的任务数，None 表示不单独限制（只受CPU和总并发数限制）
+DEFAULT_DEVICE_JOBS = {LOCAL: None, ROTATIONAL: 2, NETWORK: 2}
+
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "sshfs", "9p", "afs",
+                       "ceph", "glusterfs", "fuse.glusterfs", "davfs", "fuse.rclone", "lustre"}
+
+
+class StorageDevice:
+    """一个存储设备：挂载点（Windows 为盘符或共享根目录）和类型"""
+
+    __slots__ = ("mount", "kind")
+
+    def __init__(self, mount, kind=LOCAL):
+        self.mount = mount
+        self.kind = kind
+
+    @property
+    def default_jobs(self):
+        return DEFAULT_DEVICE_JOBS[self.kind]
+
+    def __repr__(self):
+        return f"StorageDevice({self.mount!r}, {self.kind!r})"
+
+
+def device_for_path(path):
+    """文件所在的存储设备；同一目录下的文件只检测一次"""
+    return _device_for_directory(os.path.dirname(os.path.abspath(path)))
+
+
+@functools.lru_cache(maxsize=4096)
+def _device_for_directory(directory):
+    if sys.platform == "win32":
+        return _windows_device(directory)
+    mount = _mount_point(directory)
+    kind = _linux_kind(mount) if sys.platform.startswith("linux") else LOCAL
+    return StorageDevice(mount, kind)
+
+
+def _mount_point(path):
+    """向上查找路径所在的挂载点"""
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def _unescape_mount(field):
+    # /proc/mounts 中的空格等字符写作八进制转义，如 \040
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+
+@functools.lru_cache(maxsize=None)
+def _linux_mounts():
+    """挂载点 -> (设备, 文件系统类型)；同一挂载点被多次挂载时以最后一次为准"""
+    mounts = {}
+    try:
+        with open("/proc/mounts", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    mounts[_unescape_mount(fields[1])] = (fields[0], fields[2])
+    except OSError:
+        pass
+    return mounts
+
+
+def _linux_kind(mount):
+    source, fstype = _linux_mounts().get(mount, ("", ""))
+    if fstype in NETWORK_FILESYSTEMS or fstype.startswith("nfs") or source.startswith("//"):
+        return NETWORK
+    if source.startswith("/dev/"):
+        # 分区没有自己的 queue 目录，需要看所属的整块磁盘
+        block = os.path.realpath(os.path.join("/sys/class/block", os.path.basename(os.path.realpath(source))))
+        for directory in (block, os.path.dirname(block)):
+            try:
+                with open(os.path.join(directory, "queue", "rotational")) as f:
+                    return ROTATIONAL if f.read().strip() == "1" else LOCAL
+            except OSError:
+                continue
+    return LOCAL
+
+
+def _windows_device(directory):
+    drive = os.path.splitdrive(directory)[0]
+    if drive.startswith("\\\\"):
+        # UNC 路径（\\服务器\共享）
+        return StorageDevice(drive + "\\", NETWORK)
+    root = drive + "\\"
+    try:
+        import ctypes
+        # GetDriveType 返回 4 (DRIVE_REMOTE) 表示映射的网络驱动器
+        kind = NETWORK if ctypes.windll.kernel32.GetDriveTypeW(root) == 4 else LOCAL
+    except (ImportError, AttributeError, OSError):
+        kind = LOCAL
+    return StorageDevice(root, kind)
+
+
+class ThroughputMeter:
+    """按设备统计吞吐量
+
+    update() 记录设备累计读取的字节数，rate() 返回最近 window 秒内的平均速度（字节/秒）。
+    """
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.samples = {}  # 挂载点 -> deque[(时间, 累计字节数)]
+        self.lock = threading.Lock()
+
+    def update(self, mount, total_bytes, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            samples = self.samples.setdefault(mount, deque())
+            samples.append((now, total_bytes))
+            while len(samples) > 2 and now - samples[1][0] >= self.window:
+                samples.popleft()
+
+    def rate(self, mount):
+        with self.lock:
+            samples = self.samples.get(mount)
+            if not samples or len(samples) < 2:
+                return 0.0
+            (start, first), (end, last) = samples[0], samples[-1]
+        return max(0.0, (last - first) / (end - start)) if end > start else 0.0
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+
+def format_rate(bytes_per_second):
+    """把字节/秒格式化为 KB/s、MB/s"""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if bytes_per_second < 1024 or unit == "MB/s":
+            return f"{bytes_per_second:.0f} {unit}" if unit == "B/s" else f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024